@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Time importing the add-on modules and check nothing heavy is loaded at import
+
+Each sample imports every impl module in a fresh interpreter, without the stand in
+blender modules installed, so any module level use of bpy, gpu or blf fails the run.
+Creating the shader wrappers and fonts used at registration time is then checked to
+not touch the gpu or load font files until the first draw, eg:
+
+    python benchmarks/import_time.py --output import.json --max-ms 150
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_PYTHON_ROOT = os.path.join(os.path.dirname(_HERE), "python")
+
+# Modules that must not be imported by importing the add-on
+FORBIDDEN = ("bpy", "bpy_extras", "gpu", "gpu_extras", "blf", "mathutils")
+# Modules reported when imported, met_viewport_utils may pull these in itself
+WATCHED = ("numpy",)
+
+MODULES = (
+    "binding", "buffer", "cache", "compositor", "culling", "drawlist", "fcurve", "font", "frame",
+    "geometry", "lod", "markers", "offscreen", "picking", "pool", "profiling", "redraw", "regions", "sdf", "shader", "shaders",
+    "state", "uniforms", "viewport",
+)
+
+_SAMPLE = r"""
+import sys, time, json, importlib
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module("met_blender_viewport_utils.impl." + name)
+elapsed = time.perf_counter() - start
+loaded = sorted(name for name in {watched!r} if name in sys.modules)
+
+# Registration time work must not reach the gpu or blf
+import stubs
+stubs.install()
+from met_viewport_utils.constants import FontWeight
+from met_blender_viewport_utils.impl.font import GPUFont
+from met_blender_viewport_utils.impl.shaders import (
+    FlatColorShader, VertexColorShader, UniformColorShader, ImageShader, ImageUniformColorShader)
+font = GPUFont.lazy_from_props("Arial", weight=FontWeight.Normal)
+font.copy()
+shaders = [FlatColorShader(), VertexColorShader(), UniformColorShader(), ImageShader(), ImageUniformColorShader()]
+registration_calls = dict(stubs.CALLS)
+print(json.dumps({{"seconds": elapsed, "loaded": loaded, "registration_calls": registration_calls}}))
+"""
+
+
+def sample()->dict:
+    """ Import the add-on in a fresh interpreter
+
+    Returns:
+        dict: seconds, watched modules loaded and blender calls made while registering
+    """
+    code = _SAMPLE.format(paths=[_HERE, _PYTHON_ROOT], modules=MODULES, watched=FORBIDDEN + WATCHED)
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", code], check=True,
+                            capture_output=True, text=True)
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    # -X importtime reports cumulative microseconds per top level import on stderr
+    slowest = []
+    for line in output.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2][1:].rstrip()
+        if name and name.lstrip() == name:
+            slowest.append((int(parts[1]), name))
+    result["slowest"] = [{"module": name, "ms": micro / 1000.0} for micro, name in sorted(slowest, reverse=True)[:10]]
+    return result
+
+
+def main(argv=None)->int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--max-ms", type=float, help="fail if the median import time exceeds this")
+    parser.add_argument("--output", help="write results to this json file")
+    args = parser.parse_args(argv)
+
+    samples = [sample() for _ in range(max(args.samples, 1))]
+    times = [entry["seconds"] * 1000.0 for entry in samples]
+    last = samples[-1]
+    results = {
+        "import_ms": {
+            "median": statistics.median(times),
+            "min": min(times),
+            "max": max(times),
+        },
+        "loaded": last["loaded"],
+        "registration_calls": last["registration_calls"],
+        "slowest": last["slowest"],
+    }
+    print(f"import {results['import_ms']['median']:8.3f} ms (median of {len(times)})")
+    for entry in results["slowest"]:
+        print(f"  {entry['ms']:8.3f} ms  {entry['module']}")
+
+    ok = True
+    forbidden = [name for name in last["loaded"] if name in FORBIDDEN]
+    if forbidden:
+        print(f"FAIL imported at load time: {', '.join(forbidden)}")
+        ok = False
+    watched = [name for name in last["loaded"] if name in WATCHED]
+    if watched:
+        print(f"note imported at load time: {', '.join(watched)}")
+    if last["registration_calls"]:
+        print(f"FAIL blender calls while registering: {last['registration_calls']}")
+        ok = False
+    if args.max_ms is not None and results["import_ms"]["median"] > args.max_ms:
+        print(f"FAIL median import time above {args.max_ms:g} ms")
+        ok = False
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,460 @@
+#!/usr/bin/env python
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Headless benchmarks of the draw hot paths
+
+Runs against the stand in blender modules in stubs.py so timings can be compared between
+releases without a running blender, eg:
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stubs  # pylint: disable=wrong-import-position
+stubs.install()
+
+_PYTHON_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python")
+if os.path.isdir(_PYTHON_ROOT):
+    sys.path.insert(0, _PYTHON_ROOT)
+
+# pylint: disable=wrong-import-position
+import numpy as np
+from met_viewport_utils.constants import GPUShaderPrimitiveType, GPUShaderState, ItemState, Align
+from met_viewport_utils.shape.rect import Rect
+from met_viewport_utils.shape.generate import square2d
+from met_viewport_utils.items.hud_item import HudItem
+from met_viewport_utils.items.font_item import FontItem
+
+from met_blender_viewport_utils.impl.shaders import UniformColorShader, FlatColorShader, VertexColorShader
+from met_blender_viewport_utils.impl.lod import PolylineLOD
+from met_blender_viewport_utils.impl.culling import HudCuller
+from met_blender_viewport_utils.impl.sdf import SDFShapeShader
+from met_blender_viewport_utils.impl.markers import InstancedMarkerShader
+from met_blender_viewport_utils.impl.font import GPUFont
+from met_blender_viewport_utils.impl.viewport import BlenderViewport
+from met_blender_viewport_utils.impl.frame import GPUFrame
+from met_blender_viewport_utils.impl.compositor import HudCompositor
+from met_blender_viewport_utils.impl.geometry import GEOMETRY_CACHE
+from met_blender_viewport_utils.impl.profiling import PROFILER
+from met_blender_viewport_utils.impl.uniforms import FRAME_UNIFORMS
+
+
+class BoxItem(HudItem):
+    """ Filled rect, the typical HUD chrome item """
+    def __init__(self, shader:UniformColorShader):
+        super().__init__()
+        self._shader = shader
+
+    def screen_rect(self, viewport)->Rect:
+        return Rect(self.position, self.size)
+
+    def draw(self, viewport):
+        mesh = GEOMETRY_CACHE.get(square2d, self.screen_rect(viewport))
+        self._shader.draw({"pos": mesh.points}, indices=mesh.indices,
+                          batch_key=GEOMETRY_CACHE.batch_key(mesh))
+
+
+def _shader()->UniformColorShader:
+    shader = UniformColorShader()
+    shader.set_uniform("color", (1.0, 1.0, 1.0, 0.3))
+    shader.primitive_type = GPUShaderPrimitiveType.Tris
+    shader.state = GPUShaderState.UseAlpha
+    return shader
+
+
+def _font()->GPUFont:
+    font = GPUFont()
+    font.point_size = 16
+    font.align = Align.Center
+    font.color = "#FFFFFF"
+    font.shadow_color = "#000000"
+    return font
+
+
+def _grid(count:int, width:int, height:int, size:float=40.0)->np.ndarray:
+    """ Positions of count cells laid out over the region """
+    columns = max(int(np.sqrt(count * width / height)), 1)
+    index = np.arange(count)
+    return np.stack(((index % columns) * size * 1.25, (index // columns) * size * 1.25), axis=1)
+
+
+def measure(frames:int, frame)->dict:
+    """ Time frame(index) over a number of frames and average the stub call counters per frame
+
+    Returns:
+        dict
+    """
+    frame(-1)  # warm up caches, reported separately as the first frame
+    stubs.reset()
+    times = []
+    for index in range(frames):
+        start = time.perf_counter()
+        frame(index)
+        times.append(time.perf_counter() - start)
+    calls = stubs.CALLS
+    times_ms = sorted(value * 1000.0 for value in times)
+    return {
+        "frames": frames,
+        "frame_ms": {
+            "mean": statistics.fmean(times_ms),
+            "median": statistics.median(times_ms),
+            "min": times_ms[0],
+            "p95": times_ms[min(int(len(times_ms) * 0.95), len(times_ms) - 1)],
+            "max": times_ms[-1],
+        },
+        "per_frame": {
+            "batch_creations": calls["gpu.types.GPUBatch"] / frames,
+            "batches_converted": calls["gpu_extras.batch.batch_for_shader"] / frames,
+            "draw_calls": calls["gpu.types.GPUBatch.draw"] / frames,
+            "shader_binds": calls["gpu.types.GPUShader.bind"] / frames,
+            "blf_calls": stubs.blf_calls() / frames,
+            "state_changes": stubs.gpu_state_changes() / frames,
+            "uniform_uploads": stubs.uniform_uploads() / frames,
+            "block_uploads": (calls["gpu.types.GPUUniformBuf"] + calls["gpu.types.GPUUniformBuf.update"]) / frames,
+        },
+    }
+
+
+def bench_shader_static(args)->dict:
+    """ Same geometry every frame, exercises the batch cache """
+    shader = _shader()
+    positions = _grid(args.items, args.width, args.height)
+    meshes = [square2d(Rect(position, (40.0, 40.0))) for position in positions]
+
+    def frame(_):
+        with GPUFrame():
+            for mesh in meshes:
+                shader.draw({"pos": mesh.points}, indices=mesh.indices)
+    return measure(args.frames, frame)
+
+
+def bench_shader_animated(args)->dict:
+    """ Geometry moves every frame, exercises batch creation """
+    shader = _shader()
+    positions = _grid(args.items, args.width, args.height)
+
+    def frame(index):
+        offset = float(index + 1)
+        with GPUFrame():
+            for position in positions:
+                mesh = square2d(Rect(position + offset, (40.0, 40.0)))
+                shader.draw({"pos": mesh.points}, indices=mesh.indices)
+    return measure(args.frames, frame)
+
+
+def bench_shader_uniforms(args)->dict:
+    """ One wrapper per item sharing a color and the frame uniform block, exercises uniform diffing """
+    context = stubs.Context(args.width, args.height)
+    shaders = [_shader() for _ in range(args.items)]
+    for shader in shaders:
+        shader.bind_block(FRAME_UNIFORMS.name, FRAME_UNIFORMS)
+    positions = _grid(args.items, args.width, args.height)
+    meshes = [square2d(Rect(position, (40.0, 40.0))) for position in positions]
+
+    def frame(_):
+        viewport = BlenderViewport(context)
+        with GPUFrame(viewport=viewport):
+            for shader, mesh in zip(shaders, meshes):
+                shader.draw({"pos": mesh.points}, indices=mesh.indices)
+    return measure(args.frames, frame)
+
+
+def bench_sdf_shapes(args)->dict:
+    """ Rounded, bordered rects as signed distance quads, compare with shader_animated """
+    shader = SDFShapeShader()
+    positions = _grid(args.items, args.width, args.height)
+
+    def frame(index):
+        offset = float(index + 1)
+        rects = [Rect(position + offset, (40.0, 40.0)) for position in positions]
+        with GPUFrame():
+            shader.draw_rects(rects, radius=6.0, border=1.0, fill=(0.0, 0.0, 0.0, 0.5), border_color=(1.0, 1.0, 1.0, 1.0))
+    return measure(args.frames, frame)
+
+
+def bench_markers(args)->dict:
+    """ --points instanced markers with a shared shape, only the colors of a few change each frame """
+    context = stubs.Context(args.width, args.height)
+    markers = InstancedMarkerShader(square2d(Rect((-0.5, -0.5), (1.0, 1.0))))
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(-10.0, 10.0, (args.points, 3)).astype(np.float32)
+    colors = np.ones((args.points, 4), dtype=np.float32)
+
+    def frame(index):
+        colors[index % args.points] = (1.0, 0.5, 0.0, 1.0)
+        markers.set_instances(positions, scale=6.0, colors=colors)
+        with GPUFrame(viewport=BlenderViewport(context)):
+            markers.draw_markers()
+    return measure(args.frames, frame)
+
+
+def bench_polyline_lod(args)->dict:
+    """ A --points long path drawn through PolylineLOD while the view is still """
+    context = stubs.Context(args.width, args.height)
+    shader = FlatColorShader(polyline=True)
+    shader.primitive_type = GPUShaderPrimitiveType("LINE_STRIP")
+    lod = PolylineLOD()
+    t = np.linspace(0.0, 40.0 * np.pi, args.points)
+    positions = np.stack((np.cos(t) * t * 0.05, np.sin(t) * t * 0.05, t * 0.01), axis=1).astype(np.float32)
+    colors = np.ones((args.points, 4), dtype=np.float32)
+
+    def frame(_):
+        viewport = BlenderViewport(context)
+        indices = lod.simplify(viewport, positions)
+        with GPUFrame(viewport=viewport):
+            shader.draw({"pos": positions[indices], "color": colors[indices]})
+    result = measure(args.frames, frame)
+    result["per_frame"]["drawn_vertices"] = float(lod.output_vertices)
+    return result
+
+
+def bench_mesh_overlay(args)->dict:
+    """ A --points vertex mesh overlay that deforms every frame, contiguous float32 inputs skip conversion """
+    shader = VertexColorShader()
+    shader.primitive_type = GPUShaderPrimitiveType.Tris
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(-1.0, 1.0, (args.points, 3)).astype(np.float32)
+    colors = rng.uniform(0.0, 1.0, (args.points, 4)).astype(np.float32)
+    indices = np.arange(args.points - args.points % 3, dtype=np.uint32).reshape(-1, 3)
+
+    def frame(index):
+        positions[:, 2] = np.float32(index)
+        with GPUFrame(defer=False):
+            shader.draw({"pos": positions, "color": colors}, indices=indices, batch_key=index)
+    return measure(args.frames, frame)
+
+
+def bench_font_draw(args)->dict:
+    """ Many labels with a shared font """
+    font = _font()
+    positions = _grid(args.items, args.width, args.height)
+    labels = [f"Label {index}" for index in range(args.items)]
+
+    def frame(_):
+        with GPUFrame():
+            for label, position in zip(labels, positions):
+                font.draw(label, position)
+    return measure(args.frames, frame)
+
+
+def bench_font_bounds(args)->dict:
+    """ Layout measurement without drawing """
+    font = _font()
+    labels = [f"Label {index}" for index in range(args.items)]
+
+    def frame(_):
+        for label in labels:
+            font.bounds(label, (0.0, 0.0))
+    return measure(args.frames, frame)
+
+
+def bench_projection_scalar(args)->dict:
+    """ Per point projection through view3d_utils """
+    viewport = BlenderViewport(stubs.Context(args.width, args.height))
+    points = np.random.default_rng(0).uniform(-5.0, 5.0, (args.points, 3))
+
+    def frame(_):
+        for point in points:
+            viewport.world_to_screen(point)
+    return measure(max(args.frames // 10, 1), frame)
+
+
+def bench_projection_array(args)->dict:
+    """ Vectorised projection of the same points """
+    context = stubs.Context(args.width, args.height)
+    viewport = BlenderViewport(context)
+    points = np.random.default_rng(0).uniform(-5.0, 5.0, (args.points, 3))
+
+    def frame(_):
+        viewport.update(context)
+        viewport.world_to_screen_array(points)
+    return measure(args.frames, frame)
+
+
+def _hud(args):
+    shader = _shader()
+    font = _font()
+    root = HudItem()
+    root.size = np.array((args.width, args.height), dtype=np.float32)
+    for index, position in enumerate(_grid(args.items, args.width, args.height)):
+        if index % 2:
+            item = FontItem(f"Item {index}", font)
+        else:
+            item = BoxItem(shader)
+            item.size = np.array((40.0, 40.0), dtype=np.float32)
+        item.position = position
+        item.parent = root
+    return root
+
+
+def bench_hud_frame(args)->dict:
+    """ A HudOverlayOperator style draw callback over a synthetic item tree """
+    context = stubs.Context(args.width, args.height)
+    root = _hud(args)
+
+    def frame(_):
+        viewport = BlenderViewport(context)
+        with GPUFrame(viewport=viewport):
+            root.draw(viewport)
+            for item in root.iter_descendants(HudItem):
+                if item.state & ItemState.Visible:
+                    item.draw(viewport)
+    return measure(args.frames, frame)
+
+
+def bench_hud_culled(args)->dict:
+    """ hud_frame with the tree four times the region size, only items on screen are drawn """
+    context = stubs.Context(args.width, args.height)
+    root = _hud(argparse.Namespace(**dict(vars(args), width=args.width * 2, height=args.height * 2)))
+    culler = HudCuller()
+
+    def frame(_):
+        viewport = BlenderViewport(context)
+        with GPUFrame(viewport=viewport):
+            for item in culler.visible(viewport, root):
+                item.draw(viewport)
+    result = measure(args.frames, frame)
+    result["per_frame"]["items_drawn"] = float(culler.visited - culler.culled)
+    return result
+
+
+def bench_hud_composited(args)->dict:
+    """ The same item tree drawn through HudCompositor while only the view changes """
+    context = stubs.Context(args.width, args.height)
+    root = _hud(args)
+    compositor = HudCompositor()
+
+    def frame(_):
+        viewport = BlenderViewport(context)
+        items = [root, *(item for item in root.iter_descendants(HudItem) if item.state & ItemState.Visible)]
+        compositor.draw(viewport, items)
+    return measure(args.frames, frame)
+
+
+def bench_hud_quad_view(args)->dict:
+    """ hud_composited with the handler drawn alternately in two 3D areas of different sizes """
+    contexts = (stubs.Context(args.width, args.height), stubs.Context(args.width // 2, args.height))
+    root = _hud(args)
+    compositor = HudCompositor()
+
+    def frame(index):
+        context = contexts[index % len(contexts)]
+        context.activate()
+        viewport = BlenderViewport(context)
+        items = [root, *(item for item in root.iter_descendants(HudItem) if item.state & ItemState.Visible)]
+        compositor.draw(viewport, items)
+
+    frame(-2)  # warm up the second region as well
+    allocations = compositor.allocations
+    result = measure(args.frames, frame)
+    result["per_frame"]["offscreen_allocations"] = (compositor.allocations - allocations) / (args.frames + 1)
+    return result
+
+
+def bench_hud_profiled(args)->dict:
+    """ hud_frame with the profiler enabled, the difference is the instrumentation overhead """
+    PROFILER.enable(item_classes=(BoxItem, FontItem))
+    try:
+        context = stubs.Context(args.width, args.height)
+        root = _hud(args)
+
+        def frame(_):
+            with PROFILER.frame("hud"):
+                viewport = BlenderViewport(context)
+                with GPUFrame():
+                    root.draw(viewport)
+                    for item in root.iter_descendants(HudItem):
+                        if item.state & ItemState.Visible:
+                            item.draw(viewport)
+        return measure(args.frames, frame)
+    finally:
+        PROFILER.disable()
+        PROFILER.clear()
+
+
+BENCHMARKS = {
+    "shader_static": bench_shader_static,
+    "shader_animated": bench_shader_animated,
+    "shader_uniforms": bench_shader_uniforms,
+    "sdf_shapes": bench_sdf_shapes,
+    "markers": bench_markers,
+    "polyline_lod": bench_polyline_lod,
+    "mesh_overlay": bench_mesh_overlay,
+    "font_draw": bench_font_draw,
+    "font_bounds": bench_font_bounds,
+    "projection_scalar": bench_projection_scalar,
+    "projection_array": bench_projection_array,
+    "hud_frame": bench_hud_frame,
+    "hud_culled": bench_hud_culled,
+    "hud_composited": bench_hud_composited,
+    "hud_quad_view": bench_hud_quad_view,
+    "hud_profiled": bench_hud_profiled,
+}
+
+
+def compare(results:dict, baseline:dict, threshold:float)->bool:
+    """ Print mean frame time ratios against a baseline
+
+    Returns:
+        bool, True if no benchmark regressed past the threshold
+    """
+    passed = True
+    for name, result in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None:
+            continue
+        ratio = result["frame_ms"]["mean"] / max(previous["frame_ms"]["mean"], 1e-9)
+        regressed = ratio > threshold
+        passed = passed and not regressed
+        print(f"{name:<20} {ratio:6.2f}x{'  REGRESSED' if regressed else ''}")
+    return passed
+
+
+def main(argv=None)->int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200, help="HUD items, quads or labels per frame")
+    parser.add_argument("--points", type=int, default=10000, help="points to project per frame")
+    parser.add_argument("--frames", type=int, default=100, help="frames to time per benchmark")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument("--no-cost", action="store_true", help="do not spend the simulated cost of blender calls")
+    parser.add_argument("--output", help="write results to this json file")
+    parser.add_argument("--compare", help="baseline json file to compare mean frame times against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="ratio to the baseline that fails the run")
+    args = parser.parse_args(argv)
+
+    stubs.simulate(not args.no_cost)
+    results = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "simulated_cost": not args.no_cost,
+        "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "benchmarks": {},
+    }
+    for name in args.only or BENCHMARKS:
+        result = BENCHMARKS[name](args)
+        results["benchmarks"][name] = result
+        print(f"{name:<20} {result['frame_ms']['mean']:8.3f} ms/frame  " +
+              "  ".join(f"{key}={value:g}" for key, value in result["per_frame"].items()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        if not compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
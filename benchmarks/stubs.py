@@ -0,0 +1,583 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Stand in bpy, gpu, gpu_extras, blf and mathutils modules for running outside of blender
+
+Every call is counted and can spend a simulated cost so hot paths are measured
+relative to each other, the numbers are not comparable to a real GPU.
+"""
+import sys
+import time
+import types
+import contextlib
+from collections import Counter
+
+import numpy as np
+
+# Number of calls made to each stubbed function, by "module.function"
+CALLS = Counter()
+
+# Simulated cost in seconds of expensive calls, everything else is free
+COSTS = {
+    "gpu_extras.batch.batch_for_shader": 20e-6,
+    "gpu.types.GPUVertBuf": 5e-6,
+    "gpu.types.GPUVertBuf.attr_fill": 2e-6,
+    "gpu.types.GPUIndexBuf": 3e-6,
+    "gpu.types.GPUBatch.draw": 4e-6,
+    "gpu.types.GPUOffScreen": 50e-6,
+    "gpu.types.GPUShader.bind": 1e-6,
+    "blf.draw": 8e-6,
+    "blf.dimensions": 4e-6,
+    "blf.load": 200e-6,
+}
+
+_SIMULATE = True
+
+
+def simulate(enabled:bool):
+    """ Enable or disable spending the simulated cost of calls """
+    global _SIMULATE
+    _SIMULATE = enabled
+
+
+def reset():
+    """ Clear call counters """
+    CALLS.clear()
+
+
+def _call(name:str):
+    CALLS[name] += 1
+    cost = COSTS.get(name)
+    if cost and _SIMULATE:
+        end = time.perf_counter() + cost
+        while time.perf_counter() < end:
+            pass
+
+
+def _module(name:str, **attributes)->types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+
+# ---------------------------------------------------------------------------
+# mathutils
+
+class Vector(tuple):
+    def __new__(cls, values=(0.0, 0.0, 0.0)):
+        return super().__new__(cls, (float(value) for value in values))
+
+    @property
+    def x(self):
+        return self[0]
+
+    @property
+    def y(self):
+        return self[1]
+
+    @property
+    def z(self):
+        return self[2]
+
+
+class Matrix:
+    def __init__(self, rows=None):
+        self._array = np.identity(4) if rows is None else np.array(rows, dtype=np.float64)
+
+    @classmethod
+    def Identity(cls, size:int)->"Matrix":
+        return cls(np.identity(size))
+
+    def __array__(self, dtype=None, copy=None):
+        return self._array.astype(dtype) if dtype is not None else self._array
+
+    def __iter__(self):
+        return iter(tuple(row) for row in self._array)
+
+    def __len__(self):
+        return len(self._array)
+
+
+# ---------------------------------------------------------------------------
+# gpu
+
+_SHADER_ATTRIBUTES = {
+    "FLAT_COLOR": (("pos", "VEC3"), ("color", "VEC4")),
+    "SMOOTH_COLOR": (("pos", "VEC3"), ("color", "VEC4")),
+    "POLYLINE_FLAT_COLOR": (("pos", "VEC3"), ("color", "VEC4")),
+    "POLYLINE_SMOOTH_COLOR": (("pos", "VEC3"), ("color", "VEC4")),
+    "UNIFORM_COLOR": (("pos", "VEC3"),),
+    "POLYLINE_UNIFORM_COLOR": (("pos", "VEC3"),),
+    "IMAGE": (("pos", "VEC2"), ("texCoord", "VEC2")),
+    "IMAGE_COLOR": (("pos", "VEC2"), ("texCoord", "VEC2"), ("color", "VEC4")),
+}
+
+
+class GPUVertFormat:
+    def __init__(self, attributes=()):
+        _call("gpu.types.GPUVertFormat")
+        self.attributes = tuple(attributes)
+
+    def attr_add(self, id, comp_type, len, fetch_mode):  # pylint: disable=redefined-builtin
+        self.attributes += ((id, comp_type, len, fetch_mode),)
+
+
+class GPUShader:
+    def __init__(self, name:str="CUSTOM", attributes=(("pos", "VEC3"),)):
+        _call("gpu.types.GPUShader")
+        self.name = name
+        self._attributes = tuple(attributes)
+        self.uniforms = {}
+
+    def attrs_info_get(self):
+        return self._attributes
+
+    def format_calc(self)->GPUVertFormat:
+        return GPUVertFormat(self._attributes)
+
+    def bind(self):
+        _call("gpu.types.GPUShader.bind")
+
+    def uniform_from_name(self, name:str)->int:
+        return hash(name) & 0xFFFF
+
+    def _uniform(self, kind:str, name:str, value):
+        _call(f"gpu.types.GPUShader.{kind}")
+        self.uniforms[name] = value
+
+    def uniform_float(self, name, value):
+        self._uniform("uniform_float", name, value)
+
+    def uniform_int(self, name, value):
+        self._uniform("uniform_int", name, value)
+
+    def uniform_bool(self, name, value):
+        self._uniform("uniform_bool", name, value)
+
+    def uniform_sampler(self, name, value):
+        self._uniform("uniform_sampler", name, value)
+
+    def uniform_block(self, name, value):
+        self._uniform("uniform_block", name, value)
+
+
+class GPUShaderCreateInfo:
+    def __init__(self):
+        self.attributes = []
+
+    def vertex_in(self, slot, type, name):  # pylint: disable=redefined-builtin
+        self.attributes.append((name, type))
+
+    def __getattr__(self, name:str):
+        # Declarations the stand in does not need
+        return lambda *args, **kwargs: None
+
+
+class GPUStageInterfaceInfo:
+    def __init__(self, name:str):
+        self.name = name
+
+    def __getattr__(self, name:str):
+        return lambda *args, **kwargs: None
+
+
+class GPUVertBuf:
+    def __init__(self, format, len):  # pylint: disable=redefined-builtin
+        _call("gpu.types.GPUVertBuf")
+        self.format = format
+        self.len = len
+
+    def attr_fill(self, id, data):  # pylint: disable=redefined-builtin
+        _call("gpu.types.GPUVertBuf.attr_fill")
+
+
+class GPUIndexBuf:
+    def __init__(self, type, seq):  # pylint: disable=redefined-builtin
+        _call("gpu.types.GPUIndexBuf")
+        self.type = type
+        self.len = len(seq)
+
+
+class GPUBatch:
+    def __init__(self, type, buf, elem=None):  # pylint: disable=redefined-builtin
+        _call("gpu.types.GPUBatch")
+        self.type = type
+        self.buf = buf
+        self.elem = elem
+        self.program = None
+
+    def program_set(self, program):
+        self.program = program
+
+    def draw(self, program=None):
+        _call("gpu.types.GPUBatch.draw")
+
+    def draw_instanced(self, program, instance_start=0, instance_count=0):
+        _call("gpu.types.GPUBatch.draw")
+
+
+class GPUTexture:
+    def __init__(self, size, layers=0, is_cubemap=False, format="RGBA8", data=None):
+        _call("gpu.types.GPUTexture")
+        self.width, self.height = (size, size) if isinstance(size, int) else tuple(size)[:2]
+        self.format = format
+
+
+class Buffer:
+    def __init__(self, format, dimensions, data=None):  # pylint: disable=redefined-builtin
+        _call("gpu.types.Buffer")
+        self.format = format
+        self.dimensions = dimensions
+
+
+class GPUUniformBuf:
+    def __init__(self, data):
+        _call("gpu.types.GPUUniformBuf")
+
+    def update(self, data):
+        _call("gpu.types.GPUUniformBuf.update")
+
+
+class GPUFrameBuffer:
+    def clear(self, color=None, depth=None, stencil=None):
+        _call("gpu.types.GPUFrameBuffer.clear")
+
+
+class GPUOffScreen:
+    def __init__(self, width, height, format="RGBA8"):
+        _call("gpu.types.GPUOffScreen")
+        self.width = width
+        self.height = height
+        self.texture_color = GPUTexture((width, height), format=format)
+
+    @contextlib.contextmanager
+    def bind(self):
+        _call("gpu.types.GPUOffScreen.bind")
+        yield self
+
+    def free(self):
+        _call("gpu.types.GPUOffScreen.free")
+
+
+class _GPUState:
+    """ Module level gpu state, shared by the state functions """
+    def __init__(self):
+        self.values = {}
+
+    def reset(self):
+        self.values = {
+            "blend": "NONE",
+            "depth_test": "NONE",
+            "depth_mask": False,
+            "line_width": 1.0,
+            "point_size": 1.0,
+            "scissor": (0, 0, 1920, 1080),
+            "viewport": (0, 0, 1920, 1080),
+        }
+
+
+_STATE = _GPUState()
+_STATE.reset()
+
+
+def _getter(key:str):
+    def get():
+        _call(f"gpu.state.{key}_get")
+        return _STATE.values[key]
+    return get
+
+
+def _setter(key:str):
+    def set(*value):  # pylint: disable=redefined-builtin
+        _call(f"gpu.state.{key}_set")
+        _STATE.values[key] = value[0] if len(value) == 1 else tuple(value)
+    return set
+
+
+def _gpu_matrix_module()->types.ModuleType:
+    @contextlib.contextmanager
+    def push_pop():
+        _call("gpu.matrix.push")
+        yield
+
+    @contextlib.contextmanager
+    def push_pop_projection():
+        _call("gpu.matrix.push_projection")
+        yield
+
+    def load_matrix(matrix):
+        _call("gpu.matrix.load_matrix")
+
+    def load_projection_matrix(matrix):
+        _call("gpu.matrix.load_projection_matrix")
+
+    def get_model_view_matrix():
+        return Matrix.Identity(4)
+
+    def get_projection_matrix():
+        return Matrix.Identity(4)
+
+    return _module("gpu.matrix",
+                   push_pop=push_pop,
+                   push_pop_projection=push_pop_projection,
+                   load_matrix=load_matrix,
+                   load_projection_matrix=load_projection_matrix,
+                   get_model_view_matrix=get_model_view_matrix,
+                   get_projection_matrix=get_projection_matrix)
+
+
+def _from_builtin(name:str, config:str="DEFAULT")->GPUShader:
+    _call("gpu.shader.from_builtin")
+    return GPUShader(name, _SHADER_ATTRIBUTES.get(name, (("pos", "VEC3"),)))
+
+
+def _create_from_info(info:GPUShaderCreateInfo)->GPUShader:
+    _call("gpu.shader.create_from_info")
+    return GPUShader("CUSTOM", info.attributes)
+
+
+def batch_for_shader(shader:GPUShader, type:str, content:dict, indices=None)->GPUBatch:  # pylint: disable=redefined-builtin
+    """ Stand in for gpu_extras.batch.batch_for_shader, converts inputs like the real one does """
+    _call("gpu_extras.batch.batch_for_shader")
+    for data in content.values():
+        np.asarray(data, dtype=np.float32)
+    length = len(next(iter(content.values()))) if content else 0
+    buffer = GPUVertBuf(shader.format_calc(), length)
+    elem = GPUIndexBuf(type, indices) if indices is not None else None
+    return GPUBatch(type, buffer, elem)
+
+
+# ---------------------------------------------------------------------------
+# blf
+
+def _blf_module()->types.ModuleType:
+    fonts = {}
+
+    def _counted(name:str, result=None):
+        def function(*args, **kwargs):
+            _call(f"blf.{name}")
+            return result
+        return function
+
+    def load(path:str)->int:
+        _call("blf.load")
+        return fonts.setdefault(path, len(fonts) + 1)
+
+    def unload(path:str):
+        _call("blf.unload")
+        fonts.pop(path, None)
+
+    sizes = {}
+
+    def size(font_id:int, point_size:float, *args):
+        _call("blf.size")
+        sizes[font_id] = point_size
+
+    def dimensions(font_id:int, text:str):
+        _call("blf.dimensions")
+        point_size = sizes.get(font_id, 11)
+        return (len(text) * point_size * 0.55, point_size)
+
+    return _module("blf",
+                   ROTATION=1 << 0, CLIPPING=1 << 1, SHADOW=1 << 2, KERNING_DEFAULT=1 << 3,
+                   WORD_WRAP=1 << 4, MONOCHROME=1 << 5,
+                   load=load, unload=unload, size=size, dimensions=dimensions,
+                   draw=_counted("draw"), position=_counted("position"), color=_counted("color"),
+                   enable=_counted("enable"), disable=_counted("disable"),
+                   rotation=_counted("rotation"), shadow=_counted("shadow"),
+                   shadow_offset=_counted("shadow_offset"), clipping=_counted("clipping"))
+
+
+# ---------------------------------------------------------------------------
+# bpy
+
+class Region:
+    def __init__(self, width:int=1920, height:int=1080):
+        self.width = width
+        self.height = height
+        self.x = 0
+        self.y = 0
+
+    def as_pointer(self)->int:
+        return id(self)
+
+
+class RegionView3D:
+    """ Perspective view looking down -Z from (0, 0, 10) """
+    def __init__(self, width:int=1920, height:int=1080, lens:float=50.0):
+        aspect = width / height
+        focal = lens / 18.0
+        near, far = 0.1, 1000.0
+        projection = np.array((
+            (focal / aspect, 0.0, 0.0, 0.0),
+            (0.0, focal, 0.0, 0.0),
+            (0.0, 0.0, (far + near) / (near - far), 2.0 * far * near / (near - far)),
+            (0.0, 0.0, -1.0, 0.0)))
+        view = np.identity(4)
+        view[2, 3] = -10.0
+        self.view_matrix = Matrix(view)
+        self.window_matrix = Matrix(projection)
+        self.perspective_matrix = Matrix(projection @ view)
+        self.is_perspective = True
+        self.view_perspective = "PERSP"
+
+    def as_pointer(self)->int:
+        return id(self)
+
+
+def _region_2d_to_vector_3d(region, region_3d, coord):
+    inverse = np.linalg.inv(np.asarray(region_3d.perspective_matrix))
+    x = 2.0 * coord[0] / region.width - 1.0
+    y = 2.0 * coord[1] / region.height - 1.0
+    point = inverse @ np.array((x, y, -0.5, 1.0))
+    origin = np.linalg.inv(np.asarray(region_3d.view_matrix))[:3, 3]
+    direction = point[:3] / point[3] - origin
+    return Vector(direction / np.linalg.norm(direction))
+
+
+def _region_2d_to_origin_3d(region, region_3d, coord, clamp=None):
+    return Vector(np.linalg.inv(np.asarray(region_3d.view_matrix))[:3, 3])
+
+
+def _region_2d_to_location_3d(region, region_3d, coord, depth_location):
+    origin = np.asarray(_region_2d_to_origin_3d(region, region_3d, coord))
+    direction = np.asarray(_region_2d_to_vector_3d(region, region_3d, coord))
+    normal = np.linalg.inv(np.asarray(region_3d.view_matrix))[:3, 2]
+    factor = ((np.asarray(depth_location) - origin) @ normal) / (direction @ normal)
+    return Vector(origin + direction * factor)
+
+
+def _location_3d_to_region_2d(region, region_3d, coord, default=None):
+    clip = np.asarray(region_3d.perspective_matrix) @ np.array((coord[0], coord[1], coord[2], 1.0))
+    if clip[3] <= 0.0:
+        return default
+    return Vector((region.width / 2.0 * (1.0 + clip[0] / clip[3]),
+                   region.height / 2.0 * (1.0 + clip[1] / clip[3])))
+
+
+class _Namespace:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class Context(_Namespace):
+    """ Draw handler context for a single 3D viewport region """
+    def __init__(self, width:int=1920, height:int=1080):
+        region = Region(width, height)
+        super().__init__(
+            region=region,
+            area=_Namespace(type="VIEW_3D", tag_redraw=lambda: _call("bpy.types.Area.tag_redraw")),
+            space_data=_Namespace(region_3d=RegionView3D(width, height)),
+            preferences=_Namespace(system=_Namespace(dpi=72, pixel_size=1.0),
+                                   view=_Namespace(ui_scale=1.0)))
+        self.activate()
+
+    def activate(self):
+        """ Make this the region being drawn, as blender does before calling a draw handler in it """
+        _STATE.values["viewport"] = (0, 0, self.region.width, self.region.height)
+
+
+def _bpy_modules()->dict:
+    def persistent(function):
+        return function
+
+    handlers = _module("bpy.app.handlers",
+                       persistent=persistent,
+                       depsgraph_update_post=[],
+                       frame_change_post=[],
+                       load_post=[])
+    app = _module("bpy.app", handlers=handlers, version=(4, 0, 0))
+    bpy_types = _module("bpy.types",
+                        Operator=type("Operator", (), {}),
+                        Context=Context,
+                        Region=Region,
+                        RegionView3D=RegionView3D,
+                        Object=type("Object", (), {}),
+                        FCurve=type("FCurve", (), {}),
+                        Event=type("Event", (), {}),
+                        Scene=type("Scene", (), {}),
+                        SpaceView3D=type("SpaceView3D", (), {
+                            "draw_handler_add": staticmethod(lambda *args: object()),
+                            "draw_handler_remove": staticmethod(lambda *args: None),
+                        }))
+    utils = _module("bpy.utils",
+                    register_class=lambda cls: None,
+                    unregister_class=lambda cls: None)
+    bpy = _module("bpy", app=app, types=bpy_types, utils=utils, context=Context(),
+                  data=_Namespace(objects={}, cameras={}))
+    view3d_utils = _module("bpy_extras.view3d_utils",
+                           region_2d_to_vector_3d=_region_2d_to_vector_3d,
+                           region_2d_to_origin_3d=_region_2d_to_origin_3d,
+                           region_2d_to_location_3d=_region_2d_to_location_3d,
+                           location_3d_to_region_2d=_location_3d_to_region_2d)
+    return {
+        "bpy": bpy,
+        "bpy.app": app,
+        "bpy.app.handlers": handlers,
+        "bpy.types": bpy_types,
+        "bpy.utils": utils,
+        "bpy_extras": _module("bpy_extras", view3d_utils=view3d_utils),
+        "bpy_extras.view3d_utils": view3d_utils,
+    }
+
+
+def _gpu_modules()->dict:
+    state_keys = ("blend", "depth_test", "depth_mask", "line_width", "scissor", "viewport")
+    state = _module("gpu.state", **{f"{key}_get": _getter(key) for key in state_keys})
+    state.__dict__.update({f"{key}_set": _setter(key) for key in state_keys + ("point_size",)})
+    state.scissor_test_set = _setter("scissor_test")
+    state.active_framebuffer_get = lambda: GPUFrameBuffer()
+    gpu_types = _module("gpu.types",
+                        GPUShader=GPUShader,
+                        GPUVertFormat=GPUVertFormat,
+                        GPUVertBuf=GPUVertBuf,
+                        GPUIndexBuf=GPUIndexBuf,
+                        GPUBatch=GPUBatch,
+                        GPUTexture=GPUTexture,
+                        GPUUniformBuf=GPUUniformBuf,
+                        Buffer=Buffer,
+                        GPUShaderCreateInfo=GPUShaderCreateInfo,
+                        GPUStageInterfaceInfo=GPUStageInterfaceInfo,
+                        GPUOffScreen=GPUOffScreen,
+                        GPUFrameBuffer=GPUFrameBuffer)
+    shader = _module("gpu.shader", from_builtin=_from_builtin, create_from_info=_create_from_info)
+    matrix = _gpu_matrix_module()
+    gpu = _module("gpu", types=gpu_types, state=state, shader=shader, matrix=matrix)
+    batch = _module("gpu_extras.batch", batch_for_shader=batch_for_shader)
+    return {
+        "gpu": gpu,
+        "gpu.types": gpu_types,
+        "gpu.state": state,
+        "gpu.shader": shader,
+        "gpu.matrix": matrix,
+        "gpu_extras": _module("gpu_extras", batch=batch),
+        "gpu_extras.batch": batch,
+    }
+
+
+def install():
+    """ Register the stand in modules, must run before met_blender_viewport_utils is imported.
+    Modules that are already imported, eg when running inside blender, are left alone.
+    """
+    modules = {}
+    modules.update(_bpy_modules())
+    modules.update(_gpu_modules())
+    modules["blf"] = _blf_module()
+    modules["mathutils"] = _module("mathutils", Vector=Vector, Matrix=Matrix)
+    for name, module in modules.items():
+        sys.modules.setdefault(name, module)
+
+
+def gpu_state_changes()->int:
+    """ Number of gpu state setter calls made """
+    return sum(count for name, count in CALLS.items() if name.startswith("gpu.state.") and name.endswith("_set"))
+
+
+def uniform_uploads()->int:
+    """ Number of uniform values sent to shaders, excluding uniform blocks """
+    return sum(count for name, count in CALLS.items()
+               if name.startswith("gpu.types.GPUShader.uniform_") and name != "gpu.types.GPUShader.uniform_block")
+
+
+def blf_calls()->int:
+    """ Number of blf calls made, excluding loading fonts """
+    return sum(count for name, count in CALLS.items()
+               if name.startswith("blf.") and name not in ("blf.load", "blf.unload"))
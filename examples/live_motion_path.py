@@ -1 +1,121 @@
-# temporarily removed, will re-instate once this is updated to the refactored api
\ No newline at end of file
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+# pylint: disable=fixme, import-error
+from __future__ import annotations
+import bpy
+import numpy as np
+from met_viewport_utils.constants import GPUShaderPrimitiveType, GPUShaderState
+from met_viewport_utils.algorithm.color import parse_color
+from met_viewport_utils.shape.rect import Rect
+from met_viewport_utils.shape.generate import square2d
+
+from met_blender_viewport_utils.impl.fcurve import MotionPath
+from met_blender_viewport_utils.impl.shaders import FlatColorShader
+from met_blender_viewport_utils.impl.frame import GPUFrame
+from met_blender_viewport_utils.impl.markers import InstancedMarkerShader
+from met_blender_viewport_utils.impl.lod import PolylineLOD
+from met_blender_viewport_utils.impl.viewport import BlenderViewport
+
+
+PAST_COLOR = parse_color("#1E90FF", alpha=0.8)
+FUTURE_COLOR = parse_color("#FF8C00", alpha=0.8)
+FRAME_COLOR = parse_color("#FFFFFF", alpha=1.0)
+
+
+class LiveMotionPathOperator(bpy.types.Operator):
+    """Live Motion Path"""
+    bl_idname = "view3d.live_motion_path"
+    bl_label = "Live Motion Path"
+    _handle = None
+    _paths = {}
+
+    @classmethod
+    def _RemoveHandler(cls):
+        if cls._handle is not None:
+            bpy.types.SpaceView3D.draw_handler_remove(cls._handle, 'WINDOW')
+            cls._handle = None
+        if cls._on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+            bpy.app.handlers.depsgraph_update_post.remove(cls._on_depsgraph_update)
+        cls._paths = {}
+
+    @staticmethod
+    def _on_depsgraph_update(scene, depsgraph):
+        # Keys dragged in the graph editor do not redraw the 3D view by themselves
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+
+    def modal(self, context:bpy.types.Context, event:bpy.types.Event):
+        if event.type in {'ESC'}:
+            self._RemoveHandler()
+            context.area.tag_redraw()
+            return {'CANCELLED'}
+        return {'PASS_THROUGH'}
+
+    def invoke(self, context, event):
+        if context.area.type == 'VIEW_3D':
+            self._shader = FlatColorShader(polyline=True)
+            self._shader.primitive_type = GPUShaderPrimitiveType("LINE_STRIP")
+            self._shader.state = GPUShaderState.UseAlpha
+            self._point_shader = FlatColorShader()
+            self._point_shader.primitive_type = GPUShaderPrimitiveType("POINTS")
+            self._point_shader.state = GPUShaderState.UseAlpha
+            # Dense paths are drawn with only as many vertices as they need on screen
+            self._lod = PolylineLOD(tolerance=0.5)
+            # A diamond on every frame of the path, all drawn with one instanced call
+            self._markers = InstancedMarkerShader(square2d(Rect((-0.5, -0.5), (1.0, 1.0))))
+            bpy.app.handlers.depsgraph_update_post.append(self._on_depsgraph_update)
+            self.__class__._handle = bpy.types.SpaceView3D.draw_handler_add(
+                self.__class__.draw, (self, context), 'WINDOW', 'POST_VIEW')
+            context.window_manager.modal_handler_add(self)
+            return {'RUNNING_MODAL'}
+        else:
+            self.report({'WARNING'}, "View3D not found, cannot run operator")
+            return {'CANCELLED'}
+
+    def _path(self, obj:bpy.types.Object, scene:bpy.types.Scene)->MotionPath:
+        path = self._paths.get(obj.name)
+        if path is None or path.sampler.obj != obj:
+            path = MotionPath(obj, scene.frame_start, scene.frame_end)
+            self._paths[obj.name] = path
+        else:
+            path.set_range(scene.frame_start, scene.frame_end)
+        return path
+
+    def draw(self, context:bpy.types.Context):
+        obj = context.active_object
+        if obj is None or context.area.type != 'VIEW_3D':
+            return
+        scene = context.scene
+        path = self._path(obj, scene)
+        # Only frames around edited keys are evaluated again
+        positions = path.update().astype(np.float32)
+        if len(positions) < 2:
+            return
+
+        colors = np.where((path.frames <= scene.frame_current)[:, None], PAST_COLOR, FUTURE_COLOR).astype(np.float32)
+        region = context.region
+        viewport = BlenderViewport(context)
+        lod = self._lod.simplify(viewport, positions)
+        self._markers.set_instances(positions, scale=5.0, rotation=np.pi / 4, colors=colors)
+        with GPUFrame(defer=False, viewport=viewport):
+            self._shader.draw(
+                {"pos": positions[lod], "color": colors[lod]},
+                viewportSize=(region.width, region.height),
+                lineWidth=2.0)
+            self._markers.draw_markers()
+            current = np.clip(np.searchsorted(path.frames, scene.frame_current), 0, len(positions) - 1)
+            self._point_shader.draw(
+                {"pos": positions[current:current + 1], "color": np.array([FRAME_COLOR], dtype=np.float32)},
+                size=8.0)
+
+
+def register():
+    bpy.utils.register_class(LiveMotionPathOperator)
+
+
+def unregister():
+    bpy.utils.unregister_class(LiveMotionPathOperator)
+
+if __name__ == "__main__":
+    register()
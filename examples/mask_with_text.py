@@ -8,7 +8,7 @@ from met_viewport_utils.constants import (
     GPUShaderPrimitiveType, GPUShaderState, FontStyle, ItemState, InteractionFlags)
 from met_viewport_utils.shape.rect import Rect
 from met_viewport_utils.shape.margins import Margins
-from met_viewport_utils.shape.generate import border2d, square2d, arrow2d
+from met_viewport_utils.shape.generate import border2d, arrow2d
 from met_viewport_utils.algorithm.color import parse_color
 from met_viewport_utils.items.hud_item import HudItem
 from met_viewport_utils.items.font_item import FontItem
@@ -16,14 +16,34 @@ from met_viewport_utils.items.font_item import FontItem
 from met_blender_viewport_utils.impl.font import GPUFont
 from met_blender_viewport_utils.impl.viewport import BlenderViewport
 from met_blender_viewport_utils.impl.shaders import UniformColorShader
+from met_blender_viewport_utils.impl.sdf import SDFShapeShader
+from met_blender_viewport_utils.impl.compositor import HudCompositor
+from met_blender_viewport_utils.impl.culling import HudCuller
+from met_blender_viewport_utils.impl.binding import DataBindings
+from met_blender_viewport_utils.impl.redraw import RedrawTracker
+from met_blender_viewport_utils.impl.picking import HudPickIndex
+from met_blender_viewport_utils.impl.regions import RegionPartitions, region_key
+from met_blender_viewport_utils.impl.geometry import GEOMETRY_CACHE
+from met_blender_viewport_utils.impl.profiling import PROFILER, ProfilerStatsItem
 
     
-DEFAULT_FONT = GPUFont.from_props("Arial", weight=FontWeight.Normal)
+DEFAULT_FONT = GPUFont.lazy_from_props("Arial", weight=FontWeight.Normal)
 DEFAULT_FONT.point_size = 16
 DEFAULT_FONT.align = Align.Center
 DEFAULT_FONT.color = "#FFFFFF"
 DEFAULT_FONT.shadow_color = "#000000"
 
+# Show frame timings in the HUD, instrumentation is only installed when this is on
+PROFILE = False
+
+
+
+def rotated_arrow2d(box:Rect, heads:int, angle:float):
+    """ arrow2d rotated about its center, cached meshes are shared so rotate inside the generator """
+    arrow = arrow2d(box, heads=heads)
+    if angle:
+        arrow.rotate_by(angle)
+    return arrow
 
 
 class HudMaskItem(HudItem):
@@ -36,7 +56,11 @@ class HudMaskItem(HudItem):
         self._shader.primitive_type = GPUShaderPrimitiveType.Tris
         
         self._shader.state = GPUShaderState.UseAlpha
+        self._border = self._shader.dynamic_batch(capacity=16)
+        self._border_mesh = None
         self._handle:Align = None
+        self._edge_key = None
+        self._edge_cache = None
         self._handle_drag_start = np.array([0, 0])
         self._drag_margins = Margins()
         
@@ -45,6 +69,9 @@ class HudMaskItem(HudItem):
         self._handle_shader.primitive_type = GPUShaderPrimitiveType.Tris
         self._handle_shader.state = GPUShaderState.UseAlpha
         
+        # Handle bars are rounded and anti-aliased from a single quad
+        self._handle_bar_shader = SDFShapeShader()
+        
         self._edge_default_color = [1.0, 1.0, 1.0, 0.3]
         self._edge_active_color = parse_color("#1E90FF", alpha=0.5)
         self._edge_shader = UniformColorShader()
@@ -65,6 +92,9 @@ class HudMaskItem(HudItem):
         self._color = parse_color(color)
         self._shader.set_uniform("color", self._color)
         
+    def redraw_key(self):
+        return self._handle
+        
     def _get_drag_data(self):
         return Margins(*self.margins)
 
@@ -91,20 +121,44 @@ class HudMaskItem(HudItem):
     def screen_rect(self, viewport:BlenderViewport)->Rect:
         return Rect(self.position, self.size)
     
+    def _edge_bounds(self, viewport):
+        """ Outline, selection bounds and handle rects, only rebuilt when the layout changes """
+        key = (tuple(np.asarray(self.position).tolist()), tuple(np.asarray(self.size).tolist()), tuple(self.margins))
+        if key != self._edge_key:
+            outline = self.screen_rect(viewport).adjusted(self.margins)
+            # Give 10px selection radius
+            inner = outline.adjusted(Margins(5, 5, 5, 5))
+            outer = outline.adjusted(Margins(-5, -5, -5, -5))
+            handles = (
+                (Align.Left, Rect(outline.bottom_left(), [10, outline.height], Align.BottomCenter)),
+                (Align.Right, Rect(outline.bottom_right(), [10, outline.height], Align.BottomCenter)),
+                (Align.Top, Rect(outline.top_left(), [outline.width, 10], Align.LeftCenter)),
+                (Align.Bottom, Rect(outline.bottom_left(), [outline.width, 10], Align.LeftCenter)),
+            )
+            self._edge_key = key
+            self._edge_cache = (inner, outer, handles)
+        return self._edge_cache
+    
+    def pick_rects(self, viewport):
+        _, _, handles = self._edge_bounds(viewport)
+        return [rect for _, rect in handles]
+    
     def _is_under_mouse(self, viewport, local_position, screen_position)->bool:
-        outline = self.screen_rect(viewport).adjusted(self.margins)
-        # Give 10px selection radius
-        inner = outline.adjusted(Margins(5, 5, 5, 5))
+        inner, outer, _ = self._edge_bounds(viewport)
         if inner.contains(screen_position):
             return False
-        outer = outline.adjusted(Margins(-5, -5, -5, -5))
         return outer.contains(screen_position)
     
     def draw(self, viewport):
-        # TODO: Compute points if viewport and margins are different
+        # Meshes are only generated again when the rect or margins change
         rect = self.screen_rect(viewport)
-        mesh = border2d(rect, self.margins)
-        self._shader.draw({"pos": mesh.points}, indices=mesh.indices)
+        mesh = GEOMETRY_CACHE.get(border2d, rect, self.margins)
+        if mesh is not self._border_mesh:
+            # Dragging a margin only moves vertices, refill the existing buffer
+            self._border_mesh = mesh
+            self._border.update({"pos": mesh.points}, count=len(mesh.points))
+            self._border.set_indices(mesh.indices)
+        self._border.draw()
         
         if self._handle is not None:
             inner_rect = rect.adjusted(self.margins)
@@ -125,11 +179,11 @@ class HudMaskItem(HudItem):
                 return
             
             if self.state & ItemState.Dragging:
-                self._handle_shader.set_uniform("color", self._edge_active_color)
+                color = self._edge_active_color
             else:
-                self._handle_shader.set_uniform("color", self._edge_default_color)
-            mesh = square2d(box)
-            self._handle_shader.draw({"pos": mesh.points}, indices=mesh.indices)
+                color = self._edge_default_color
+            self._handle_shader.set_uniform("color", color)
+            self._handle_bar_shader.draw_rects([box], radius=box_width / 2, fill=color)
             
             if self.state & ItemState.Dragging:
                 center = inner_rect.center()
@@ -148,11 +202,11 @@ class HudMaskItem(HudItem):
                 
             arrow_size = np.array((50, 50), dtype=np.float32)
             box = Rect(handle_position, arrow_size, Align.Center)
-            arrow = arrow2d(box, heads=2)
-            if self._handle & (Align.Top|Align.Bottom):
-                arrow.rotate_by(90.0)
+            angle = 90.0 if self._handle & (Align.Top|Align.Bottom) else 0.0
+            arrow = GEOMETRY_CACHE.get(rotated_arrow2d, box, 2, angle)
                 
-            self._handle_shader.draw({"pos": arrow.points}, indices=arrow.indices)
+            self._handle_shader.draw({"pos": arrow.points}, indices=arrow.indices,
+                                     batch_key=GEOMETRY_CACHE.batch_key(arrow))
     
     def mouse_moved(self,
                     viewport,
@@ -162,26 +216,11 @@ class HudMaskItem(HudItem):
         result = super().mouse_moved(viewport, local_position, screen_position, modifier)
         if self.state & ItemState.Dragging:
             return result
-        outline = self.screen_rect(viewport).adjusted(self.margins)
-        left_bound = Rect(outline.bottom_left(), [10, outline.height], Align.BottomCenter)
-        if left_bound.contains(screen_position):
-            self._handle = Align.Left
-            return True
-        
-        right_bound = Rect(outline.bottom_right(), [10, outline.height], Align.BottomCenter)
-        if right_bound.contains(screen_position):
-            self._handle = Align.Right
-            return True
-        
-        top_bound = Rect(outline.top_left(), [outline.width, 10], Align.LeftCenter)
-        if top_bound.contains(screen_position):
-            self._handle = Align.Top
-            return True
-        
-        bottom_bound = Rect(outline.bottom_left(), [outline.width, 10], Align.LeftCenter)
-        if bottom_bound.contains(screen_position):
-            self._handle = Align.Bottom
-            return True
+        _, _, handles = self._edge_bounds(viewport)
+        for handle, bound in handles:
+            if bound.contains(screen_position):
+                self._handle = handle
+                return True
         
         self._handle = None
         return result
@@ -195,19 +234,71 @@ class HudOverlayOperator(bpy.types.Operator):
     bl_label = "HUD Overlay"
     _handle = None
     _root = None
+    _bindings = None
+    _event_viewport = None
+    _redraw_trackers = None
+    _redraw_pending = False
+    _pending_mouse = None
+    _pick_indices = None
+    _pick_trackers = None
+    _culler = None
+    _compositor = None
+    _hover_active = False
+    _pressed = False
     
     @classmethod
     def _RemoveHandler(cls):
         if cls._handle is not None:
             bpy.types.SpaceView3D.draw_handler_remove(cls._handle, 'WINDOW')
             cls._handle = None
+        if cls._bindings is not None:
+            cls._bindings.unregister_handlers()
+            cls._bindings = None
+        if PROFILER.enabled:
+            PROFILER.disable()
+        if cls._compositor is not None:
+            cls._compositor.free()
+            cls._compositor = None
+        cls._culler = None
+
+    def _items(self):
+        return [self._root, *self._root.iter_descendants(HudItem)]
+
+    def _viewport(self, context:bpy.types.Context)->BlenderViewport:
+        if self._event_viewport is None:
+            self._event_viewport = BlenderViewport(context)
+        else:
+            self._event_viewport.update(context)
+        # Lay the HUD out for the region under the mouse, the last drawn region may differ in size
+        self._root.size = np.array((context.region.width, context.region.height), dtype=np.float32)
+        return self._event_viewport
+
+    def _request_redraw(self, context:bpy.types.Context):
+        """ Only redraw if an item's hover, drag or visual state changed """
+        tracker = self._redraw_trackers.get(region_key(context.region))
+        if tracker.changed(self._items()):
+            self._redraw_pending = True
+            context.area.tag_redraw()
+
+    def _mouse_moved(self, viewport, mouse_pos, modifier):
+        """ Only walk the item tree when the mouse is over, or leaving, a pickable item """
+        hovered = self._pick_indices.get(viewport.region_key()).query(mouse_pos)
+        if hovered or self._hover_active or self._pressed:
+            self._root.mouse_moved(viewport, mouse_pos, mouse_pos, modifier)
+        self._hover_active = bool(hovered)
+
+    def _flush_mouse_move(self, viewport):
+        """ Apply a mouse move that was coalesced while waiting for a redraw of the region it happened in """
+        if self._pending_mouse is not None:
+            key, mouse_pos, modifier = self._pending_mouse
+            if key != viewport.region_key():
+                return
+            self._pending_mouse = None
+            self._mouse_moved(viewport, mouse_pos, modifier)
 
     def modal(self, context:bpy.types.Context, event:bpy.types.Event):
         is_hud_interaction = False
         if context.area.type == 'VIEW_3D':
-            viewport = BlenderViewport(context)
-            context.area.tag_redraw()
-            context.view_layer.update()
             modifier = KeyboardModifier.NoKeyboardModifier
             if event.ctrl:
                 modifier |= KeyboardModifier.Ctrl
@@ -218,19 +309,30 @@ class HudOverlayOperator(bpy.types.Operator):
 
             if event.type == 'MOUSEMOVE':
                 mouse_pos = np.array([event.mouse_region_x, event.mouse_region_y], dtype=np.float32)
-                self._root.mouse_moved(viewport, mouse_pos, mouse_pos, modifier)
+                if self._redraw_pending:
+                    # Moves faster than redraws are coalesced, the latest one is applied on draw
+                    self._pending_mouse = (region_key(context.region), mouse_pos, modifier)
+                    return {'PASS_THROUGH'}
+                self._mouse_moved(self._viewport(context), mouse_pos, modifier)
                     
             elif event.type == 'LEFTMOUSE':
+                viewport = self._viewport(context)
+                self._flush_mouse_move(viewport)
                 mouse_pos = np.array([event.mouse_region_x, event.mouse_region_y], dtype=np.float32)
                 if event.value == "PRESS":
                     # TODO: right clicks
                     is_hud_interaction = self._root.mouse_pressed(viewport, mouse_pos, mouse_pos, MouseButton.Left, modifier)
+                    self._pressed = bool(is_hud_interaction)
                 else:  # release
                     is_hud_interaction = self._root.mouse_released(viewport, mouse_pos, mouse_pos, MouseButton.Left, modifier)
+                    self._pressed = False
 
             elif event.type in {'ESC'}:
                 self._RemoveHandler()
+                context.area.tag_redraw()
                 return {'CANCELLED'}
+            
+            self._request_redraw(context)
         
         return {'RUNNING_MODAL'} if is_hud_interaction else {'PASS_THROUGH'}
 
@@ -238,19 +340,36 @@ class HudOverlayOperator(bpy.types.Operator):
         if context.area.type == 'VIEW_3D':
             args = (self, context)
             self._root = HudMaskItem()
+            # Every 3D view the handler draws in, eg a quad view, keeps its own
+            # redraw signatures and pick index so they do not invalidate each other
+            self._redraw_trackers = RegionPartitions(RedrawTracker)
+            self._pick_indices = RegionPartitions(HudPickIndex)
+            # The pick index has its own signatures, events consume the redraw tracker's changes first
+            self._pick_trackers = RegionPartitions(RedrawTracker)
+            self.__class__._compositor = HudCompositor()
+            # Items outside the region are neither drawn nor composited
+            self.__class__._culler = HudCuller()
             self._root.margins = Margins(100, 50, 100, 50)
-            item = FontItem("{scene.frame_current}", DEFAULT_FONT)
-            item.data["scene"] = context.scene
+            # Bound properties are read once per depsgraph update or frame change,
+            # not on every redraw
+            area = context.area
+            self.__class__._bindings = DataBindings(on_dirty=lambda items: area.tag_redraw())
+            text = "{scene.frame_current}"
+            item = FontItem(text, DEFAULT_FONT)
+            self._bindings.bind_format(item, text, scene=context.scene)
             item.align = Align.BottomCenter
             item.font.align = Align.TopCenter
             item.parent = self._root
             item = FontItem("SampleProject", DEFAULT_FONT)
+            # Static text, rasterise once and redraw from a texture
+            item.font.retained = True
             item.flags = InteractionFlags.Draggable
             item.align = Align.BottomLeft
             item.font.align = Align.TopLeft
             item.parent = self._root
-            item = FontItem("{camera.lens:.2f}mm", DEFAULT_FONT)
-            item.data["camera"] = bpy.data.cameras["Camera"]
+            text = "{camera.lens:.2f}mm"
+            item = FontItem(text, DEFAULT_FONT)
+            self._bindings.bind_format(item, text, camera=bpy.data.cameras["Camera"])
             item.align = Align.BottomRight
             item.font.align = Align.TopRight
             item.parent = self._root
@@ -264,6 +383,14 @@ class HudOverlayOperator(bpy.types.Operator):
             item.flags = InteractionFlags.Draggable
             item.parent = self._root
             
+            if PROFILE:
+                PROFILER.enable(item_classes=(HudMaskItem, FontItem))
+                item = ProfilerStatsItem(DEFAULT_FONT)
+                item.align = Align.TopRight
+                item.size = np.array((420, 120), dtype=np.float32)
+                item.parent = self._root
+
+            self._bindings.register_handlers()
             self.__class__._handle = bpy.types.SpaceView3D.draw_handler_add(
                 self.__class__.draw, args, 'WINDOW', 'POST_PIXEL')
 
@@ -275,13 +402,22 @@ class HudOverlayOperator(bpy.types.Operator):
     
 
     def draw(self, context:bpy.types.Context):
-        if context.area.type == 'VIEW_3D':
+        if context.area.type != 'VIEW_3D':
+            return
+        with PROFILER.frame("HudOverlayOperator.draw"):
             viewport = BlenderViewport(context)
+            self._flush_mouse_move(viewport)
             self._root.size = viewport.rect().size
-            self._root.draw(viewport)
-            for item in self._root.iter_descendants(HudItem):
-                if item.state & ItemState.Visible:
-                    item.draw(viewport)
+            # The HUD is kept in an offscreen texture, orbiting only composites it and
+            # changed or rebound items are re-rendered within their bounds
+            visible = self._culler.visible(viewport, self._root)
+            self._compositor.draw(viewport, visible, dirty=self._bindings.take_dirty())
+            # Record what was drawn so unchanged events do not redraw,
+            # and only re-index items whose layout changed
+            items = self._items()
+            key = viewport.region_key()
+            self._pick_indices.get(key).update(viewport, items, self._pick_trackers.get(key).changed(items))
+            self._redraw_pending = False
 
 def register():
     bpy.utils.register_class(HudOverlayOperator)
@@ -16,7 +16,17 @@ tools = []
 variants = []
 build_command = "python {root}/build.py {install}"
 
-tests = {}  # TODO
+# Tests and benchmarks are not installed, run rez-test from the source checkout
+tests = {
+    "unit": {
+        "command": "python -m pytest {root}/tests",
+        "requires": ["numpy", "pytest"],
+    },
+    "benchmark": {
+        "command": "python {root}/benchmarks/run.py --frames 20",
+        "requires": ["numpy"],
+    },
+}
 
 def commands():
     env.MET_BLENDER_VIEWPORT_UTILS_ROOT = "{this.root}"
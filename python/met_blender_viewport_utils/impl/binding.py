@@ -0,0 +1,304 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Snapshot table of blender properties that HUD items are bound to
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import re
+    import typing
+    import string
+    import logging
+    bpy = lazy_module("bpy")
+    handlers = lazy_module("bpy.app.handlers")
+    mathutils = lazy_module("mathutils")
+
+LOGGER = _ext.logging.getLogger("met_blender_viewport_utils.impl.binding")
+
+# Attribute part of a format field, "camera.data.lens" from "camera.data.lens[0]"
+_ATTRIBUTE_PATH = _ext.re.compile(r"^[A-Za-z_][\w.]*")
+
+
+class BoundSnapshot:
+    """ Plain attribute namespace holding the last snapshot of a bound object's properties.
+    Used in place of the live object so formatting does not touch RNA.
+    """
+    def __repr__(self)->str:
+        return f"BoundSnapshot({vars(self)})"
+
+
+def formatted_text(item, text:str)->str:
+    """ Text an item draws from a format string, its bound fields filled from item.data.
+    Text that is not bound, or fails to format, is returned unchanged.
+
+    Args:
+        item (HudItem): item holding the data
+        text (str): format string, eg "{scene.frame_current}"
+
+    Returns:
+        str
+    """
+    data = getattr(item, "data", None)
+    if not data or not any(isinstance(value, BoundSnapshot) for value in data.values()):
+        return text
+    try:
+        return text.format(**data)
+    except (KeyError, AttributeError, IndexError, ValueError, TypeError):
+        return text
+
+
+def _owner_key(owner)->int:
+    try:
+        return owner.as_pointer()
+    except (AttributeError, ReferenceError):
+        return id(owner)
+
+
+def _id_key(owner)->int:
+    """ Key of the ID an owner belongs to, as listed in depsgraph updates """
+    return _owner_key(getattr(owner, "id_data", None) or owner)
+
+
+def _updated_ids(depsgraph, scene=None)->_ext.typing.Optional[_ext.typing.Set[int]]:
+    """ Keys of the original IDs in a depsgraph's updates, None if unknown """
+    if depsgraph is None:
+        return None
+    ids = {_owner_key(getattr(update.id, "original", update.id)) for update in depsgraph.updates}
+    if scene is not None:
+        ids.add(_owner_key(getattr(scene, "original", scene)))
+    return ids
+
+
+def _detach(value):
+    """ Copy RNA arrays and math types so the snapshot does not reference blender data """
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return value
+    mathutils = _ext.mathutils
+    if isinstance(value, (mathutils.Vector, mathutils.Matrix, mathutils.Euler,
+                          mathutils.Quaternion, mathutils.Color)):
+        # Keep the type so bound text formats as it would from the live property
+        return value.copy()
+    try:
+        return tuple(value)
+    except TypeError:
+        return value
+
+
+def _read(owner, path:str):
+    value = owner
+    for name in path.split("."):
+        value = getattr(value, name)
+    return _detach(value)
+
+
+class DataBindings:
+    """ Flat table of blender properties HUD items depend on, refreshed from depsgraph and frame change handlers.
+
+    Items bind their data once, each property is read once per update no matter how many items use it,
+    and only items whose inputs actually changed are marked dirty. Handler updates only read the
+    properties of IDs listed in the depsgraph's updates, plus the scene on frame changes.
+
+    Args:
+        on_dirty(Callable): Optional callback run with the set of items that became dirty in an update
+
+    Properties:
+        updates(int): number of table refreshes
+        reads(int): number of property reads made by refreshes
+
+    Usage:
+        bindings = DataBindings(on_dirty=lambda items: area.tag_redraw())
+        bindings.bind_format(item, "{scene.frame_current}", scene=context.scene)
+        bindings.register_handlers()
+    """
+    def __init__(self, on_dirty:_ext.typing.Optional[_ext.typing.Callable[[_ext.typing.Set], None]]=None):
+        self.on_dirty = on_dirty
+        self.updates = 0
+        self.reads = 0
+        # (owner key, path) -> [owner, path, value, ID key]
+        self._fields:_ext.typing.Dict[_ext.typing.Tuple[int, str], list] = {}
+        # (owner key, path) -> [(snapshot, attribute path)]
+        self._targets:_ext.typing.Dict[_ext.typing.Tuple[int, str], list] = {}
+        # (owner key, path) -> {id(item): item}
+        self._dependents:_ext.typing.Dict[_ext.typing.Tuple[int, str], dict] = {}
+        # ID key -> {(owner key, path)} of the fields read from that ID
+        self._by_id:_ext.typing.Dict[int, _ext.typing.Set[_ext.typing.Tuple[int, str]]] = {}
+        self._dirty:_ext.typing.Dict[int, _ext.typing.Any] = {}
+        self._handler = None
+
+    def __len__(self)->int:
+        return len(self._fields)
+
+    def bind(self, item, name:str, owner, paths:_ext.typing.Iterable[str])->BoundSnapshot:
+        """ Bind properties of an owner to an item, item.data[name] is replaced by a snapshot
+
+        Args:
+            item (HudItem): item using the data
+            name (str): key in item.data
+            owner (bpy.types.ID): blender object to read from
+            paths (List[str]): dotted attribute paths relative to owner
+
+        Returns:
+            BoundSnapshot
+        """
+        snapshot = item.data.get(name)
+        if not isinstance(snapshot, BoundSnapshot):
+            snapshot = BoundSnapshot()
+            item.data[name] = snapshot
+        owner_key = _owner_key(owner)
+        for path in paths:
+            key = (owner_key, path)
+            if key not in self._fields:
+                value = _read(owner, path)
+                self.reads += 1
+                id_key = _id_key(owner)
+                self._fields[key] = [owner, path, value, id_key]
+                self._targets[key] = []
+                self._dependents[key] = {}
+                self._by_id.setdefault(id_key, set()).add(key)
+            self._targets[key].append(snapshot)
+            self._dependents[key][id(item)] = item
+            self._assign(snapshot, path, self._fields[key][2])
+        self._dirty[id(item)] = item
+        return snapshot
+
+    def bind_format(self, item, text:str, **owners)->_ext.typing.Dict[str, BoundSnapshot]:
+        """ Bind every field used by a format string, owners are matched by the first name in each field
+
+        Args:
+            item (HudItem): item using the data
+            text (str): format string, eg "{camera.lens:.2f}mm"
+            owners (Any): blender objects by field name, eg camera=bpy.data.cameras["Camera"]
+
+        Returns:
+            Dict[str, BoundSnapshot] snapshots by name
+        """
+        paths:_ext.typing.Dict[str, _ext.typing.List[str]] = {}
+        for _, field, _, _ in _ext.string.Formatter().parse(text):
+            if not field:
+                continue
+            match = _ATTRIBUTE_PATH.match(field)
+            if not match:
+                continue
+            name, _, path = match.group(0).partition(".")
+            if name not in owners:
+                LOGGER.warning("No owner given for bound field %r", field)
+                continue
+            if path:
+                paths.setdefault(name, []).append(path)
+        return {name: self.bind(item, name, owners[name], paths.get(name, [])) for name in owners}
+
+    def unbind(self, item):
+        """ Remove an item from the table, fields no other item uses are dropped
+
+        Args:
+            item (HudItem): item to remove
+        """
+        item_id = id(item)
+        self._dirty.pop(item_id, None)
+        for key in list(self._dependents):
+            dependents = self._dependents[key]
+            if dependents.pop(item_id, None) is None:
+                continue
+            snapshots = [snapshot for snapshot in item.data.values() if isinstance(snapshot, BoundSnapshot)]
+            self._targets[key] = [target for target in self._targets[key] if target not in snapshots]
+            if not dependents:
+                id_key = self._fields.pop(key)[3]
+                del self._targets[key]
+                del self._dependents[key]
+                fields = self._by_id.get(id_key)
+                if fields is not None:
+                    fields.discard(key)
+                    if not fields:
+                        del self._by_id[id_key]
+
+    @staticmethod
+    def _assign(snapshot:BoundSnapshot, path:str, value):
+        names = path.split(".")
+        target = snapshot
+        for name in names[:-1]:
+            child = getattr(target, name, None)
+            if not isinstance(child, BoundSnapshot):
+                child = BoundSnapshot()
+                setattr(target, name, child)
+            target = child
+        setattr(target, names[-1], value)
+
+    def update(self, updated_ids:_ext.typing.Optional[_ext.typing.Iterable[int]]=None)->_ext.typing.Set:
+        """ Read bound properties once and mark items whose inputs changed dirty
+
+        Args:
+            updated_ids (Iterable[int], optional): as_pointer() of the IDs that changed,
+                only their properties are read. None reads every property.
+
+        Returns:
+            Set of ids of items that became dirty
+        """
+        self.updates += 1
+        if updated_ids is None:
+            keys = self._fields.keys()
+        else:
+            keys = set()
+            for id_key in updated_ids:
+                keys.update(self._by_id.get(id_key, ()))
+        changed = {}
+        for key in keys:
+            field = self._fields[key]
+            owner, path, value, _ = field
+            try:
+                new_value = _read(owner, path)
+            except (AttributeError, ReferenceError):
+                # Owner was removed
+                new_value = None
+            self.reads += 1
+            if new_value == value:
+                continue
+            field[2] = new_value
+            for snapshot in self._targets[key]:
+                self._assign(snapshot, path, new_value)
+            changed.update(self._dependents[key])
+        self._dirty.update(changed)
+        if changed and self.on_dirty is not None:
+            self.on_dirty(set(changed.values()))
+        return set(changed)
+
+    def is_dirty(self, item)->bool:
+        """ Whether an item's bound inputs changed since it was last cleaned """
+        return id(item) in self._dirty
+
+    def take_dirty(self)->_ext.typing.List:
+        """ Get and clear the items whose inputs changed
+
+        Returns:
+            List[HudItem]
+        """
+        dirty, self._dirty = list(self._dirty.values()), {}
+        return dirty
+
+    def register_handlers(self):
+        """ Refresh the table after depsgraph updates and frame changes """
+        if self._handler is not None:
+            return
+
+        @_ext.handlers.persistent
+        def _on_update(scene=None, depsgraph=None):
+            self.update(_updated_ids(depsgraph))
+
+        @_ext.handlers.persistent
+        def _on_frame_change(scene=None, depsgraph=None):
+            # The frame itself is a scene property, which is not always listed as updated
+            self.update(_updated_ids(depsgraph, scene))
+
+        self._handler = (_on_update, _on_frame_change)
+        _ext.bpy.app.handlers.depsgraph_update_post.append(_on_update)
+        _ext.bpy.app.handlers.frame_change_post.append(_on_frame_change)
+
+    def unregister_handlers(self):
+        """ Remove the handlers added by register_handlers """
+        if self._handler is None:
+            return
+        for handlers, handler in zip(
+                (_ext.bpy.app.handlers.depsgraph_update_post, _ext.bpy.app.handlers.frame_change_post),
+                self._handler):
+            if handler in handlers:
+                handlers.remove(handler)
+        self._handler = None
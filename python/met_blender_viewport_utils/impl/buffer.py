@@ -0,0 +1,343 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Persistent vertex buffers that can be refilled without reallocating
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    gpu = lazy_module("gpu")
+    import typing
+    np = lazy_module("numpy")
+    from met_viewport_utils.constants import GPUShaderPrimitiveType, GPUShaderState
+
+# Number of components per shader attribute type
+_TYPE_COMPONENTS = {
+    "FLOAT": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4,
+    "INT": 1, "IVEC2": 2, "IVEC3": 3, "IVEC4": 4,
+    "UINT": 1, "UVEC2": 2, "UVEC3": 3, "UVEC4": 4,
+}
+
+# Number of indices per primitive for list primitives
+_PRIMITIVE_INDICES = {"POINTS": 1, "LINES": 2, "TRIS": 3}
+
+# List primitive drawn in place of each primitive when indexing the vertices in use
+_LIST_PRIMITIVES = {
+    "POINTS": "POINTS", "LINES": "LINES", "TRIS": "TRIS",
+    "LINE_STRIP": "LINES", "LINE_LOOP": "LINES", "TRI_STRIP": "TRIS", "TRI_FAN": "TRIS",
+}
+
+
+def sequence_indices(primitive:str, count:int)->_ext.typing.Tuple[str, _ext.np.ndarray]:
+    """ Indices drawing the first count vertices as they would be drawn without indices.
+    Index buffers only support list primitives, so strips, loops and fans are expanded.
+
+    Args:
+        primitive (str): primitive type, eg LINE_STRIP
+        count (int): number of vertices to draw
+
+    Returns:
+        Tuple[str, np.ndarray]: list primitive and uint32 indices, (N, indices per primitive) for lines and tris
+    """
+    np = _ext.np
+    list_primitive = _LIST_PRIMITIVES[primitive]
+    per_primitive = _PRIMITIVE_INDICES[list_primitive]
+    vertices = np.arange(count, dtype=np.uint32)
+    if primitive in ("LINE_STRIP", "LINE_LOOP"):
+        if count < 2:
+            return list_primitive, np.zeros((0, 2), dtype=np.uint32)
+        indices = np.stack((vertices[:-1], vertices[1:]), axis=1)
+        if primitive == "LINE_LOOP" and count > 2:
+            indices = np.concatenate((indices, np.array([[count - 1, 0]], dtype=np.uint32)))
+    elif primitive == "TRI_STRIP":
+        first = vertices[:max(count - 2, 0)]
+        indices = np.stack((first, first + 1, first + 2), axis=1)
+        # Keep the winding of every other triangle
+        indices[1::2, :2] = indices[1::2, 1::-1]
+    elif primitive == "TRI_FAN":
+        second = vertices[1:max(count - 1, 1)]
+        indices = np.stack((np.zeros_like(second), second, second + 1), axis=1)
+    elif per_primitive == 1:
+        indices = vertices
+    else:
+        indices = vertices[:count - count % per_primitive].reshape(-1, per_primitive)
+    return list_primitive, np.ascontiguousarray(indices)
+
+
+# id(shader) -> (shader, vertex format, attribute components, accepted array signatures)
+_FORMATS:_ext.typing.Dict[int, tuple] = {}
+
+
+def _shader_format(shader:_ext.gpu.types.GPUShader)->tuple:
+    entry = _FORMATS.get(id(shader))
+    if entry is None or entry[0] is not shader:
+        attributes = {name: _TYPE_COMPONENTS.get(attr_type, 4) for name, attr_type in shader.attrs_info_get()}
+        entry = (shader, shader.format_calc(), attributes, set())
+        _FORMATS[id(shader)] = entry
+    return entry
+
+
+def vertex_attributes(shader:_ext.gpu.types.GPUShader)->_ext.typing.Dict[str, int]:
+    """ Get the vertex inputs of a shader and their component counts, read once per shader
+
+    Args:
+        shader (gpu.types.GPUShader): shader to inspect
+
+    Returns:
+        Dict[str, int] attribute name to component count
+    """
+    return _shader_format(shader)[2]
+
+
+def vertex_format(shader:_ext.gpu.types.GPUShader)->_ext.gpu.types.GPUVertFormat:
+    """ Get the vertex format of a shader, calculated once per shader
+
+    Args:
+        shader (gpu.types.GPUShader): shader to inspect
+
+    Returns:
+        gpu.types.GPUVertFormat
+    """
+    return _shader_format(shader)[1]
+
+
+def contiguous_vertex_in(shader:_ext.gpu.types.GPUShader,
+                         vertex_in)->_ext.typing.Optional[_ext.typing.Dict[str, _ext.np.ndarray]]:
+    """ Views of vertex inputs that can fill a GPUVertBuf straight from their memory.
+
+    Accepts C contiguous float32 arrays or memoryviews shaped (N, components), or (N,) for single
+    component inputs. Each combination of names, dtypes and shapes is checked against the shader's
+    format once, after that only the signature is compared.
+
+    Args:
+        shader (gpu.types.GPUShader): shader the batch is for
+        vertex_in (Dict[str, Any]): vertex inputs
+
+    Returns:
+        Dict[str, np.ndarray], or None if the inputs need converting by batch_for_shader
+    """
+    np = _ext.np
+    _, _, attributes, accepted = _shader_format(shader)
+    arrays = {}
+    for name, value in vertex_in.items():
+        if isinstance(value, memoryview):
+            value = np.asarray(value)
+        elif not isinstance(value, np.ndarray):
+            return None
+        arrays[name] = value
+    signature = tuple((name, array.dtype.str, array.shape[1:], array.flags.c_contiguous)
+                      for name, array in arrays.items())
+    if signature in accepted:
+        return arrays
+    if len(arrays) != len(attributes) or len({len(array) for array in arrays.values()}) > 1:
+        return None
+    for name, array in arrays.items():
+        components = attributes.get(name)
+        if components is None or array.dtype != np.float32 or not array.flags.c_contiguous:
+            return None
+        if array.shape[1:] != (components,) and not (components == 1 and array.ndim == 1):
+            return None
+    accepted.add(signature)
+    return arrays
+
+
+def batch_from_arrays(shader:_ext.gpu.types.GPUShader,
+                      primitive:str,
+                      arrays:_ext.typing.Dict[str, _ext.np.ndarray],
+                      indices=None)->_ext.gpu.types.GPUBatch:
+    """ Build a batch from arrays returned by contiguous_vertex_in without converting them
+
+    Args:
+        shader (gpu.types.GPUShader): shader the batch is for
+        primitive (str): primitive type, eg TRIS
+        arrays (Dict[str, np.ndarray]): vertex inputs from contiguous_vertex_in
+        indices (Sequence[int], optional): index map, uint32 arrays are used as is
+
+    Returns:
+        gpu.types.GPUBatch
+    """
+    np = _ext.np
+    count = len(next(iter(arrays.values())))
+    vbo = _ext.gpu.types.GPUVertBuf(vertex_format(shader), count)
+    for name, array in arrays.items():
+        vbo.attr_fill(name, array)
+    if indices is None:
+        return _ext.gpu.types.GPUBatch(type=primitive, buf=vbo)
+    if not (isinstance(indices, np.ndarray) and indices.dtype == np.uint32 and indices.flags.c_contiguous):
+        indices = np.ascontiguousarray(indices, dtype=np.uint32)
+    per_primitive = _PRIMITIVE_INDICES.get(primitive)
+    if per_primitive and per_primitive > 1:
+        indices = indices.reshape(-1, per_primitive)
+    ibo = _ext.gpu.types.GPUIndexBuf(type=primitive, seq=indices)
+    return _ext.gpu.types.GPUBatch(type=primitive, buf=vbo, elem=ibo)
+
+
+class GPUDynamicBatch:
+    """ Vertex and index buffers held at a capacity, refilled in place as geometry changes
+
+    Only the attributes whose values changed are refilled, the vertex buffer is reallocated only
+    when the capacity is exceeded, growing geometrically. attr_fill always uploads the whole
+    attribute, so a changed attribute is uploaded at full capacity whatever range was written.
+
+    Unused capacity is never drawn. Without explicit indices the batch draws through an index
+    buffer covering the vertices in use, which is rebuilt when the count changes.
+    Index buffers cannot be refilled in blender so they are rebuilt only when the indices change.
+
+    Args:
+        shader(GPUShader): shader wrapper this batch draws with
+        primitive_type(GPUShaderPrimitiveType): primitive to draw, defaults to the shader primitive
+        capacity(int): initial vertex capacity
+        growth(float): capacity multiplier when the buffer needs to grow
+
+    Properties:
+        capacity(int): current vertex capacity
+        count(int): number of vertices in use
+        allocations(int): number of vertex buffer allocations made
+        fills(int): number of attribute uploads made
+
+    Usage:
+        path = shader.dynamic_batch(capacity=1024)
+        path.update({"pos": points})
+        path.update({"pos": dragged_points}, start=10)
+        path.draw()
+    """
+    def __init__(self, shader, primitive_type:_ext.GPUShaderPrimitiveType=None,
+                 capacity:int=64, growth:float=2.0):
+        self.shader = shader
+        self.primitive_type = primitive_type or shader.primitive_type
+        self.growth = max(growth, 1.1)
+        self.capacity = max(int(capacity), 1)
+        self.count = 0
+        self.allocations = 0
+        self.fills = 0
+        # Read from the shader on first use, so creating a batch does not compile its shader
+        self._attributes = None
+        self._data = None
+        self._dirty = set()
+        self._indices = None
+        self._vbo = None
+        self._ibo = None
+        self._ibo_primitive = None
+        self._batch = None
+
+    def _ensure_format(self):
+        if self._attributes is None:
+            self._attributes = vertex_attributes(self.shader.shader)
+            self._data = {name: _ext.np.zeros((self.capacity, components), dtype=_ext.np.float32)
+                          for name, components in self._attributes.items()}
+            self._dirty = set(self._attributes)
+
+    def _grow(self, required:int):
+        capacity = self.capacity
+        while capacity < required:
+            capacity = int(_ext.np.ceil(capacity * self.growth))
+        for name, data in self._data.items():
+            grown = _ext.np.zeros((capacity, data.shape[1]), dtype=_ext.np.float32)
+            grown[:self.count] = data[:self.count]
+            self._data[name] = grown
+        self.capacity = capacity
+        self._vbo = None
+        self._batch = None
+        self._dirty = set(self._attributes)
+
+    def update(self, vertex_in:_ext.typing.Dict[str, _ext.typing.Any], start:int=0,
+               count:_ext.typing.Optional[int]=None):
+        """ Update a range of vertices for the given attributes
+
+        Args:
+            vertex_in (Dict[str, Any]): attribute values, each is (N, components) or (N, fewer components)
+            start (int): first vertex to write
+            count (int, optional): total vertices in use after this update,
+                defaults to growing to cover the written range
+        """
+        self._ensure_format()
+        end = start
+        arrays = {}
+        for name, value in vertex_in.items():
+            if name not in self._attributes:
+                raise KeyError(f"Shader has no vertex input named {name!r}")
+            array = _ext.np.asarray(value, dtype=_ext.np.float32)
+            if array.ndim == 1:
+                array = array.reshape(-1, 1)
+            arrays[name] = array
+            end = max(end, start + len(array))
+
+        required = count if count is not None else max(end, self.count)
+        if max(required, end) > self.capacity:
+            self._grow(max(required, end))
+
+        for name, array in arrays.items():
+            columns = min(array.shape[1], self._data[name].shape[1])
+            target = self._data[name][start:start + len(array), :columns]
+            if _ext.np.array_equal(target, array[:, :columns]):
+                continue
+            target[:] = array[:, :columns]
+            self._dirty.add(name)
+        if required != self.count and self._indices is None:
+            # The index buffer covering the vertices in use depends on the count
+            self._ibo = None
+            self._batch = None
+        self.count = required
+
+    def set_indices(self, indices:_ext.typing.Optional[_ext.typing.Sequence]):
+        """ Set the index map, the index buffer is only rebuilt if the indices differ
+
+        Args:
+            indices (Sequence[int], optional): indices, or None to draw vertices in order
+        """
+        if indices is not None:
+            indices = _ext.np.asarray(indices, dtype=_ext.np.uint32)
+        if self._indices is None and indices is None:
+            return
+        if self._indices is not None and indices is not None and _ext.np.array_equal(self._indices, indices):
+            return
+        self._indices = indices
+        self._ibo = None
+        self._batch = None
+
+    def batch(self)->_ext.gpu.types.GPUBatch:
+        """ Upload any pending changes and return the batch
+
+        Returns:
+            gpu.types.GPUBatch, or None if the vertices in use make no primitive
+        """
+        self._ensure_format()
+        primitive = self.primitive_type.value
+        if self._vbo is None:
+            self._vbo = _ext.gpu.types.GPUVertBuf(vertex_format(self.shader.shader), self.capacity)
+            self.allocations += 1
+        for name in self._dirty:
+            self._vbo.attr_fill(name, self._data[name])
+            self.fills += 1
+        self._dirty.clear()
+
+        if self._ibo is None:
+            if self._indices is not None:
+                indices = self._indices
+                per_primitive = _PRIMITIVE_INDICES.get(primitive)
+                if per_primitive and per_primitive > 1:
+                    indices = indices.reshape(-1, per_primitive)
+            else:
+                # Only index the vertices in use so the unused capacity is never drawn
+                primitive, indices = sequence_indices(primitive, self.count)
+            if not len(indices):
+                return None
+            self._ibo = _ext.gpu.types.GPUIndexBuf(type=primitive, seq=indices)
+            self._ibo_primitive = primitive
+
+        if self._batch is None:
+            self._batch = _ext.gpu.types.GPUBatch(type=self._ibo_primitive, buf=self._vbo, elem=self._ibo)
+        return self._batch
+
+    def draw(self, size:_ext.typing.Optional[float]=None,
+             state:_ext.typing.Optional[_ext.GPUShaderState]=None, **kwargs):
+        """ Draw the current contents with the owning shader
+
+        Args:
+            size (float, optional): size override
+            state (GPUShaderState, optional): state override
+        """
+        if not self.count:
+            return
+        batch = self.batch()
+        if batch is not None:
+            self.shader.draw_batch(batch, size=size, state=state, **kwargs)
@@ -0,0 +1,166 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Small caching helpers shared by the draw path
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    import hashlib
+    from collections import OrderedDict
+    np = lazy_module("numpy")
+
+
+class LRUCache:
+    """ Bounded least recently used cache with hit/miss/eviction counters
+
+    Args:
+        capacity(int): Maximum number of entries to keep
+        on_evict(Callable): Optional callback run with (key, value) when an entry is dropped
+
+    Properties:
+        capacity(int): Maximum number of entries
+        hits(int): Number of successful lookups
+        misses(int): Number of failed lookups
+        evictions(int): Number of entries dropped to stay within capacity
+    """
+    def __init__(self, capacity:int=32,
+                 on_evict:_ext.typing.Optional[_ext.typing.Callable[[_ext.typing.Any, _ext.typing.Any], None]]=None):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._on_evict = on_evict
+        self._entries = _ext.OrderedDict()
+
+    def __len__(self)->int:
+        return len(self._entries)
+
+    def __contains__(self, key)->bool:
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """ Get an entry and mark it as most recently used
+
+        Args:
+            key (Hashable): cache key
+            default (Any, optional): returned on a miss
+
+        Returns:
+            Any
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """ Add or replace an entry, evicting the oldest entries if over capacity
+
+        Args:
+            key (Hashable): cache key
+            value (Any): value to store
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > max(self.capacity, 0):
+            old_key, old_value = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self._on_evict is not None:
+                self._on_evict(old_key, old_value)
+
+    def items(self)->_ext.typing.List[_ext.typing.Tuple[_ext.typing.Any, _ext.typing.Any]]:
+        """ (key, value) of every entry from least to most recently used, counters are not touched
+
+        Returns:
+            List[Tuple[Hashable, Any]]
+        """
+        return list(self._entries.items())
+
+    def discard_if(self, predicate:_ext.typing.Callable[[_ext.typing.Any], bool]):
+        """ Drop every entry whose key matches the predicate, these are not counted as evictions
+
+        Args:
+            predicate (Callable[[Hashable], bool]): returns True for keys to remove
+        """
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def clear(self):
+        """ Remove all entries, counters are kept """
+        self._entries.clear()
+
+    def reset_stats(self):
+        """ Reset the hit/miss/eviction counters """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for this cache
+
+        Returns:
+            Dict[str, int]
+        """
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def freeze(value)->_ext.typing.Hashable:
+    """ Convert a value into something hashable and comparable, arrays become tuples of floats
+
+    Args:
+        value (Any): scalar, sequence or numpy array
+
+    Returns:
+        Hashable
+    """
+    if isinstance(value, (int, float, str, bool, bytes)) or value is None:
+        return value
+    try:
+        return tuple(_ext.np.asarray(value, dtype=_ext.np.float64).ravel().tolist())
+    except (TypeError, ValueError):
+        # Textures and other gpu objects compare by identity
+        return ("id", id(value))
+
+
+def digest(value)->_ext.typing.Hashable:
+    """ Cheap content digest for vertex data, numpy arrays are hashed by their raw bytes
+
+    Args:
+        value (Any): dict, sequence, numpy array or scalar
+
+    Returns:
+        Hashable digest
+    """
+    hasher = _ext.hashlib.blake2b(digest_size=16)
+    _update_digest(hasher, value)
+    return hasher.digest()
+
+
+def _update_digest(hasher, value):
+    if value is None:
+        hasher.update(b"\x00")
+    elif isinstance(value, dict):
+        hasher.update(b"d")
+        for key in sorted(value):
+            hasher.update(str(key).encode())
+            _update_digest(hasher, value[key])
+    else:
+        array = _ext.np.ascontiguousarray(value)
+        if array.dtype == object:
+            # Ragged input, fall back to the python representation
+            hasher.update(repr(value).encode())
+            return
+        hasher.update(array.dtype.str.encode())
+        hasher.update(repr(array.shape).encode())
+        hasher.update(array.data)
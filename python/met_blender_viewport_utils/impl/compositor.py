@@ -0,0 +1,261 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Cached offscreen compositing of HUD items
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    import math
+    import itertools
+    gpu = lazy_module("gpu")
+    from met_viewport_utils.constants import Align
+    from met_viewport_utils.shape.rect import Rect
+    from .picking import rect_bounds
+    from .binding import formatted_text
+    from .offscreen import bind_pixel_space, clear_rect, draw_texture
+    from .redraw import RedrawTracker
+    from .frame import GPUFrame
+    from .regions import RegionPartitions
+
+Bounds = _ext.typing.Tuple[int, int, int, int]
+
+
+def item_draw_bounds(item, viewport)->_ext.typing.Tuple[float, float, float, float]:
+    """ Screen bounds an item draws in.
+    Items may define draw_bounds(viewport) when they draw outside their screen rect, text items
+    are grown by their font's alignment around an anchor in the rect, and by its shadow.
+    Text is measured as drawn, from display_text() when the item defines it, or with its bound data formatted in.
+
+    Args:
+        item (HudItem): item to inspect
+        viewport (BlenderViewport): viewport the item is drawn in
+
+    Returns:
+        Tuple[float, float, float, float]: left, bottom, right, top
+    """
+    draw_bounds = getattr(item, "draw_bounds", None)
+    if draw_bounds is not None:
+        return draw_bounds(viewport)
+    left, bottom, right, top = _ext.rect_bounds(item.screen_rect(viewport))
+    font = getattr(item, "font", None)
+    display_text = getattr(item, "display_text", None)
+    if display_text is not None:
+        text = display_text()
+    else:
+        text = getattr(item, "text", None)
+        if isinstance(text, str):
+            text = _ext.formatted_text(item, text)
+    if font is None or not isinstance(text, str) or not text:
+        return (left, bottom, right, top)
+
+    extent = font.bounds(text, (0.0, 0.0))
+    width, height = extent.width, extent.height
+    # The text may be anchored anywhere in the rect, grow it to the side the font aligns away from
+    if font.align & _ext.Align.Right:
+        left -= width
+    elif font.align & _ext.Align.HCenter:
+        left, right = left - width/2.0, right + width/2.0
+    else:
+        right += width
+    if font.align & _ext.Align.Top:
+        bottom -= height
+    elif font.align & _ext.Align.VCenter:
+        bottom, top = bottom - height/2.0, top + height/2.0
+    else:
+        top += height
+
+    if font.shadow_color is not None:
+        blur = float(font.shadow_blur or 0)
+        offset_x, offset_y = float(font.shadow_offset[0]), float(font.shadow_offset[1])
+        left, right = left + min(offset_x, 0.0) - blur, right + max(offset_x, 0.0) + blur
+        bottom, top = bottom + min(offset_y, 0.0) - blur, top + max(offset_y, 0.0) + blur
+    return (left, bottom, right, top)
+
+
+def _overlaps(a:Bounds, b:Bounds)->bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class _RegionLayer:
+    """ Offscreen buffer and render bookkeeping of one region """
+    def __init__(self):
+        self.offscreen:_ext.typing.Optional[_ext.gpu.types.GPUOffScreen] = None
+        self.size:_ext.typing.Optional[_ext.typing.Tuple[int, int]] = None
+        self.full = True
+        self.tracker = _ext.RedrawTracker()
+        self.marked:_ext.typing.Dict[int, _ext.typing.Any] = {}
+        # id(item) -> bounds the item was last rendered in
+        self.bounds:_ext.typing.Dict[int, Bounds] = {}
+
+    def free(self):
+        if self.offscreen is not None:
+            self.offscreen.free()
+            self.offscreen = None
+        self.size = None
+        self.full = True
+
+
+class HudCompositor:
+    """ Draws HUD items through an offscreen texture that is kept between redraws.
+
+    Items are rendered into a GPUOffScreen the size of the region, redraws where nothing
+    changed only composite that texture as a single quad. Items whose redraw signature changed,
+    or that were marked dirty, are re-rendered inside a scissor covering their old and new bounds.
+    The texture is only reallocated when the region is resized.
+
+    Each region the handler draws in, eg the views of a quad view, keeps its own texture and
+    bookkeeping, so alternating regions do not re-render or reallocate for each other.
+
+    Dirty bounds cover an item's screen rect and, for text items, the text and its shadow.
+    Items drawing anywhere else should define draw_bounds(viewport), see item_draw_bounds.
+
+    Args:
+        padding(int): pixels added around dirty bounds for anti aliasing
+        regions(int): number of regions whose texture is kept
+
+    Properties:
+        composites(int): number of frames drawn
+        renders(int): number of frames that re-rendered items
+        allocations(int): number of offscreen buffers created
+
+    Usage:
+        items = [root, *root.iter_descendants(HudItem)]
+        compositor.draw(viewport, items, dirty=bindings.take_dirty())
+    """
+    def __init__(self, padding:int=4, regions:int=4):
+        self.padding = padding
+        self.composites = 0
+        self.renders = 0
+        self.allocations = 0
+        self._layers = _ext.RegionPartitions(_RegionLayer, capacity=regions,
+                                             on_evict=lambda key, layer: layer.free())
+
+    def invalidate(self, items:_ext.typing.Optional[_ext.typing.Iterable]=None):
+        """ Re-render items on the next draw of every region, eg after changing something their signature does not cover
+
+        Args:
+            items (Iterable[HudItem], optional): items to re-render, None re-renders everything
+        """
+        items = None if items is None else list(items)
+        for layer in self._layers.values():
+            if items is None:
+                layer.full = True
+                continue
+            for item in items:
+                layer.marked[id(item)] = item
+
+    def free(self):
+        """ Release the offscreen buffers, the next draw of each region renders everything again """
+        self._layers.clear()
+
+    def _item_bounds(self, item, viewport)->Bounds:
+        left, bottom, right, top = item_draw_bounds(item, viewport)
+        padding = self.padding
+        return (int(_ext.math.floor(left)) - padding,
+                int(_ext.math.floor(bottom)) - padding,
+                int(_ext.math.ceil(right)) + padding,
+                int(_ext.math.ceil(top)) + padding)
+
+    def _dirty_bounds(self, layer:_RegionLayer, viewport, items:_ext.typing.Sequence,
+                      dirty:_ext.typing.Iterable)->_ext.typing.Optional[Bounds]:
+        """ Union of the old and new bounds of everything that needs rendering, clamped to the buffer """
+        width, height = layer.size
+        changed = layer.tracker.changed(items)
+        if layer.full:
+            layer.full = False
+            layer.marked.clear()
+            layer.bounds = {id(item): self._item_bounds(item, viewport) for item in items}
+            return (0, 0, width, height)
+
+        current = {id(item) for item in items}
+        marked = dict(layer.marked)
+        layer.marked.clear()
+        for item in _ext.itertools.chain(changed, dirty):
+            marked[id(item)] = item
+        if not marked:
+            return None
+
+        union = None
+        for key, item in marked.items():
+            rects = []
+            previous = layer.bounds.pop(key, None)
+            if previous is not None:
+                rects.append(previous)
+            if key in current:
+                bounds = self._item_bounds(item, viewport)
+                layer.bounds[key] = bounds
+                rects.append(bounds)
+            for rect in rects:
+                union = rect if union is None else (
+                    min(union[0], rect[0]), min(union[1], rect[1]),
+                    max(union[2], rect[2]), max(union[3], rect[3]))
+        if union is None:
+            return None
+        union = (max(union[0], 0), max(union[1], 0), min(union[2], width), min(union[3], height))
+        if union[0] >= union[2] or union[1] >= union[3]:
+            return None
+        return union
+
+    def _render(self, layer:_RegionLayer, viewport, items:_ext.typing.Sequence, region:Bounds):
+        left, bottom, right, top = region
+        full = region == (0, 0) + layer.size
+        with _ext.bind_pixel_space(layer.offscreen, clear=full):
+            # Scissor state belongs to the bound framebuffer, the region's own is untouched
+            _ext.gpu.state.scissor_test_set(True)
+            _ext.gpu.state.scissor_set(left, bottom, right - left, top - bottom)
+            try:
+                if not full:
+                    clear_area = _ext.Rect((float(left), float(bottom)), (float(right - left), float(top - bottom)))
+                    _ext.clear_rect(clear_area)
+                with _ext.GPUFrame(viewport=viewport):
+                    for item in items:
+                        bounds = layer.bounds.get(id(item))
+                        if bounds is None or _overlaps(bounds, region):
+                            item.draw(viewport)
+            finally:
+                _ext.gpu.state.scissor_test_set(False)
+        self.renders += 1
+
+    def draw(self, viewport, items:_ext.typing.Sequence, dirty:_ext.typing.Iterable=()):
+        """ Composite the items, re-rendering only what changed since the last draw of this region
+
+        Args:
+            viewport (BlenderViewport): viewport being drawn
+            items (List[HudItem]): items to draw, in draw order
+            dirty (Iterable[HudItem]): extra items to re-render, eg DataBindings.take_dirty()
+        """
+        rect = viewport.rect()
+        size = (max(int(_ext.math.ceil(rect.width)), 1), max(int(_ext.math.ceil(rect.height)), 1))
+        layer = self._layers.get(viewport.region_key())
+        if layer.offscreen is None or size != layer.size:
+            layer.free()
+            layer.offscreen = _ext.gpu.types.GPUOffScreen(*size)
+            layer.size = size
+            self.allocations += 1
+
+        # Dirty items are shared by every region, the others re-render them on their next draw
+        dirty = list(dirty)
+        for other in self._layers.values():
+            if other is not layer:
+                for item in dirty:
+                    other.marked[id(item)] = item
+        region = self._dirty_bounds(layer, viewport, items, dirty)
+        if region is not None:
+            self._render(layer, viewport, items, region)
+        self.composites += 1
+        _ext.draw_texture(layer.offscreen.texture_color,
+                          _ext.Rect((0.0, 0.0), (float(size[0]), float(size[1]))))
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for this compositor
+
+        Returns:
+            Dict[str, int]
+        """
+        return {
+            "composites": self.composites,
+            "renders": self.renders,
+            "allocations": self.allocations,
+            "regions": len(self._layers),
+        }
@@ -0,0 +1,173 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Skip drawing HUD items outside the region
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    np = lazy_module("numpy")
+    from met_viewport_utils.constants import ItemState
+    from met_viewport_utils.items.hud_item import HudItem
+    from .picking import Bounds, rect_bounds
+
+
+def region_bounds(viewport)->Bounds:
+    """ (left, bottom, right, top) of the region in the pixel space HUD items are drawn in """
+    rect = viewport.rect()
+    return (0.0, 0.0, float(rect.width), float(rect.height))
+
+
+def bounds_in_region(bounds:_ext.np.ndarray, region:Bounds, padding:float=0.0)->_ext.np.ndarray:
+    """ Test many screen bounds against the region at once
+
+    Args:
+        bounds (np.ndarray): (N, 4) left, bottom, right, top
+        region (Bounds): region bounds, see region_bounds
+        padding (float): pixels the region is grown by
+
+    Returns:
+        np.ndarray: (N,) True where the bounds overlap the region
+    """
+    bounds = _ext.np.asarray(bounds, dtype=_ext.np.float64).reshape(-1, 4)
+    left, bottom, right, top = region
+    return ((bounds[:, 0] < right + padding) & (bounds[:, 2] > left - padding) &
+            (bounds[:, 1] < top + padding) & (bounds[:, 3] > bottom - padding))
+
+
+def item_cull_bounds(item, viewport)->Bounds:
+    """ Screen bounds used to cull an item.
+    Items may define cull_bounds(viewport) to cover their whole subtree, or drawing outside their screen rect.
+
+    Args:
+        item (HudItem): item to inspect
+        viewport (BlenderViewport): viewport the item is drawn in
+
+    Returns:
+        Bounds
+    """
+    cull_bounds = getattr(item, "cull_bounds", None)
+    if cull_bounds is not None:
+        return cull_bounds(viewport)
+    return _ext.rect_bounds(item.screen_rect(viewport))
+
+
+def _children_by_parent(root, item_class:type)->_ext.typing.Dict[int, list]:
+    children = {}
+    for item in root.iter_descendants(item_class):
+        children.setdefault(id(item.parent), []).append(item)
+    return children
+
+
+def _contains(outer:_ext.np.ndarray, inner:_ext.np.ndarray)->bool:
+    """ True if every (N, 4) inner bounds lies within the outer bounds """
+    return bool(((inner[:, 0] >= outer[0]) & (inner[:, 1] >= outer[1]) &
+                 (inner[:, 2] <= outer[2]) & (inner[:, 3] <= outer[3])).all())
+
+
+class HudCuller:
+    """ Collects the HUD items that overlap the region, in draw order.
+
+    The children of each item are tested together, screen items by their bounds against the region
+    and items defining world_sphere() -> (center, radius) against the view frustum.
+    Items outside the region are not drawn, and their subtree is skipped when the item bounds it:
+    by defining cull_bounds(viewport), by setting clips_children, or when its children lie within its bounds.
+    Items placing their descendants further out should define cull_bounds covering their subtree.
+
+    Args:
+        padding(float): pixels the region is grown by, for shadows and anti aliasing
+        item_class(type): class of items to collect, defaults to HudItem
+
+    Properties:
+        visited(int): items tested by the last call
+        culled(int): items outside the region in the last call
+        pruned(int): subtrees skipped without being visited in the last call
+
+    Usage:
+        culler = HudCuller()
+        for item in culler.visible(viewport, root):
+            item.draw(viewport)
+    """
+    def __init__(self, padding:float=4.0, item_class:_ext.typing.Optional[type]=None):
+        self.padding = padding
+        self.item_class = item_class
+        self.visited = 0
+        self.culled = 0
+        self.pruned = 0
+
+    def _test(self, viewport, region:Bounds, items:_ext.typing.Sequence)->_ext.typing.Tuple[_ext.np.ndarray, _ext.np.ndarray]:
+        """ Screen bounds of items, NaN for world items, and whether each is in view, tested in batch """
+        np = _ext.np
+        bounds = np.full((len(items), 4), np.nan)
+        inside = np.zeros(len(items), dtype=bool)
+        world = []
+        for index, item in enumerate(items):
+            if hasattr(item, "world_sphere"):
+                world.append(index)
+            else:
+                bounds[index] = item_cull_bounds(item, viewport)
+        screen = np.ones(len(items), dtype=bool)
+        screen[world] = False
+        if screen.any():
+            inside[screen] = bounds_in_region(bounds[screen], region, self.padding)
+        if world:
+            spheres = [items[index].world_sphere() for index in world]
+            inside[world] = viewport.spheres_in_view([center for center, _ in spheres],
+                                                     [radius for _, radius in spheres])
+        return bounds, inside
+
+    def visible(self, viewport, root, include_root:bool=True)->_ext.typing.List:
+        """ Visible items overlapping the region, parents before their children
+
+        Args:
+            viewport (BlenderViewport): viewport being drawn
+            root (HudItem): root of the hierarchy
+            include_root (bool): test and return the root itself
+
+        Returns:
+            List[HudItem]
+        """
+        self.visited = self.culled = self.pruned = 0
+        region = region_bounds(viewport)
+        item_class = self.item_class or _ext.HudItem
+        by_parent = None
+        result = []
+        bounds, inside = self._test(viewport, region, [root])
+        stack = [(root, bounds[0], inside[0])]
+        while stack:
+            item, bounds, inside = stack.pop()
+            self.visited += 1
+            if inside and item.state & _ext.ItemState.Visible:
+                if include_root or item is not root:
+                    result.append(item)
+            elif not inside:
+                self.culled += 1
+                if getattr(item, "clips_children", False) or hasattr(item, "cull_bounds"):
+                    self.pruned += 1
+                    continue
+            children = getattr(item, "children", None)
+            if callable(children):
+                children = children()
+            if children is None:
+                # Items without a children accessor are grouped from one walk of the root
+                if by_parent is None:
+                    by_parent = _children_by_parent(root, item_class)
+                children = by_parent.get(id(item), ())
+            children = [child for child in children if isinstance(child, item_class)]
+            if not children:
+                continue
+            child_bounds, child_inside = self._test(viewport, region, children)
+            if not inside and _contains(bounds, child_bounds):
+                # Children within an item outside the region are outside too
+                self.pruned += 1
+                continue
+            stack.extend(reversed(list(zip(children, child_bounds, child_inside))))
+        return result
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for the last call
+
+        Returns:
+            Dict[str, int]
+        """
+        return {"cull_visited": self.visited, "cull_culled": self.culled, "cull_pruned": self.pruned}
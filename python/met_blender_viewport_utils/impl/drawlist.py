@@ -0,0 +1,230 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Deferred draw list that groups and merges draw calls for a frame
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    np = lazy_module("numpy")
+    from met_viewport_utils.constants import GPUShaderPrimitiveType, GPUShaderState
+    from .cache import freeze
+    from .pool import SHADER_POOL
+
+# Primitives whose geometry can be concatenated into a single batch
+_MERGEABLE_PRIMITIVES = {"POINTS", "LINES", "TRIS"}
+
+
+class _DrawCommand:
+    """ A single deferred draw """
+    __slots__ = ("shader", "vertex_in", "primitive_type", "indices", "size", "state",
+                 "uniforms", "batch_key", "callback", "sequence")
+
+    def __init__(self, shader=None, vertex_in=None, primitive_type=None, indices=None,
+                 size=None, state=None, uniforms=None, batch_key=None, callback=None, sequence=0):
+        self.shader = shader
+        self.vertex_in = vertex_in
+        self.primitive_type = primitive_type
+        self.indices = indices
+        self.size = size
+        self.state = state
+        self.uniforms = uniforms or {}
+        self.batch_key = batch_key
+        self.callback = callback
+        self.sequence = sequence
+
+    def group_key(self)->_ext.typing.Hashable:
+        if self.callback is not None:
+            # Callbacks draw whatever they like, each one keeps its own place
+            return ("callback", self.sequence)
+        return (
+            id(self.shader.shader),
+            self.primitive_type,
+            self.state,
+            self.size,
+            tuple(sorted((name, _ext.freeze(value)) for name, value in self.uniforms.items())),
+            tuple(sorted(self.vertex_in)),
+        )
+
+    def mergeable(self)->bool:
+        return (self.callback is None
+                and self.shader.mergeable
+                and self.primitive_type.value in _MERGEABLE_PRIMITIVES)
+
+
+class GPUDrawList:
+    """ Collects draw requests for a frame and submits them grouped by shader, primitive, state and uniforms
+
+    While a draw list is active, GPUShader.draw and GPUFont.draw queue their work here instead of
+    drawing immediately. Geometry of mergeable shaders (UniformColorShader, FlatColorShader) that
+    share a group is concatenated into a single batch on flush.
+
+    Args:
+        sort(bool): If true, commands are grouped across the whole frame in order of first appearance,
+            which merges more but may paint a later draw under an earlier one. By default only
+            consecutive compatible commands are merged and paint order is kept exactly.
+
+    Properties:
+        submitted(int): number of draw calls issued by the last flush
+        requested(int): number of draw requests received by the last flush
+
+    Usage:
+        with GPUDrawList():
+            for item in items:
+                item.draw(viewport)
+    """
+    _active:_ext.typing.List["GPUDrawList"] = []
+
+    def __init__(self, sort:bool=False):
+        self.sort = sort
+        self.submitted = 0
+        self.requested = 0
+        self._commands:_ext.typing.List[_DrawCommand] = []
+
+    @classmethod
+    def active(cls)->_ext.typing.Optional["GPUDrawList"]:
+        """ The innermost active draw list, if any
+
+        Returns:
+            GPUDrawList or None
+        """
+        return cls._active[-1] if cls._active else None
+
+    def __enter__(self)->"GPUDrawList":
+        self._active.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._active.remove(self)
+        if exc_type is None:
+            self.flush()
+        else:
+            self._commands.clear()
+
+    def add(self, shader, vertex_in:_ext.typing.Dict[str, _ext.typing.Any],
+            primitive_type:_ext.GPUShaderPrimitiveType,
+            indices:_ext.typing.Optional[_ext.typing.Sequence[int]]=None,
+            size:_ext.typing.Optional[float]=None,
+            state:_ext.typing.Optional[_ext.GPUShaderState]=None,
+            uniforms:_ext.typing.Optional[_ext.typing.Dict[str, _ext.typing.Any]]=None,
+            batch_key:_ext.typing.Optional[_ext.typing.Hashable]=None):
+        """ Queue a shader draw
+
+        Args:
+            shader (GPUShader): shader wrapper to draw with
+            vertex_in (Dict[str, Any]): Inputs to vertex shader
+            primitive_type (GPUShaderPrimitiveType): primitive to draw
+            indices (List[int], optional): indices map, optional
+            size (float, optional): point or line size, defaults to the wrapper's size
+            state (GPUShaderState, optional): state to draw with, defaults to the wrapper's state
+            uniforms (Dict[str, Any], optional): uniform values, including the shader's own uniforms
+            batch_key (Hashable, optional): batch cache key, used if the command is not merged
+        """
+        # Wrappers of a pooled shader share one gpu shader, group by what each one actually draws with
+        if size is None:
+            size = shader.size
+        if state is None:
+            state = shader.state
+        self._commands.append(_DrawCommand(
+            shader, vertex_in, primitive_type, indices, size, state, uniforms, batch_key))
+
+    def add_callback(self, callback:_ext.typing.Callable[[], None]):
+        """ Queue arbitrary drawing, such as text, these are never merged
+
+        Args:
+            callback (Callable): function that performs the draw
+        """
+        self._commands.append(_DrawCommand(callback=callback, sequence=len(self._commands)))
+
+    def _groups(self, commands:_ext.typing.List[_DrawCommand])->_ext.typing.List[_ext.typing.List[_DrawCommand]]:
+        groups = []
+        if self.sort:
+            by_key = {}
+            for command in commands:
+                key = command.group_key()
+                if key not in by_key:
+                    by_key[key] = []
+                    groups.append(by_key[key])
+                by_key[key].append(command)
+        else:
+            last_key = None
+            for command in commands:
+                key = command.group_key()
+                if not groups or key != last_key:
+                    groups.append([])
+                groups[-1].append(command)
+                last_key = key
+        return groups
+
+    @staticmethod
+    def _merge(commands:_ext.typing.List[_DrawCommand])->_DrawCommand:
+        """ Concatenate the geometry of compatible commands into one """
+        first = commands[0]
+        if len(commands) == 1:
+            return first
+        indexed = any(command.indices is not None for command in commands)
+        vertex_in = {}
+        for name in first.vertex_in:
+            arrays = [_ext.np.asarray(command.vertex_in[name], dtype=_ext.np.float32) for command in commands]
+            width = max(array.shape[-1] if array.ndim > 1 else 1 for array in arrays)
+            padded = []
+            for array in arrays:
+                array = array.reshape(len(array), -1)
+                if array.shape[1] < width:
+                    # Mixed 2d/3d positions, pad with zeros
+                    array = _ext.np.pad(array, ((0, 0), (0, width - array.shape[1])))
+                padded.append(array)
+            vertex_in[name] = _ext.np.concatenate(padded)
+
+        indices = None
+        if indexed:
+            offset = 0
+            parts = []
+            for command in commands:
+                count = len(command.vertex_in[next(iter(command.vertex_in))])
+                if command.indices is None:
+                    local = _ext.np.arange(count, dtype=_ext.np.uint32)
+                else:
+                    local = _ext.np.asarray(command.indices, dtype=_ext.np.uint32).ravel()
+                parts.append(local + offset)
+                offset += count
+            indices = _ext.np.concatenate(parts)
+            per_primitive = {"LINES": 2, "TRIS": 3}.get(first.primitive_type.value)
+            if per_primitive:
+                indices = indices.reshape(-1, per_primitive)
+        return _DrawCommand(first.shader, vertex_in, first.primitive_type, indices,
+                            first.size, first.state, first.uniforms)
+
+    def flush(self):
+        """ Submit all queued commands and clear the list """
+        commands, self._commands = self._commands, []
+        self.requested = len(commands)
+        self.submitted = 0
+        # Submitting replaces the uniform values of the wrappers, restore what the owners last set afterwards
+        shaders = {id(command.shader): command.shader for command in commands if command.shader is not None}
+        saved = {key: dict(shader.uniform_values) for key, shader in shaders.items()}
+        try:
+            for group in self._groups(commands):
+                if group[0].callback is not None:
+                    for command in group:
+                        command.callback()
+                        self.submitted += 1
+                    continue
+                if group[0].mergeable():
+                    group = [self._merge(group)]
+                for command in group:
+                    command.shader.draw_immediate(
+                        command.vertex_in,
+                        command.primitive_type,
+                        indices=command.indices,
+                        size=command.size,
+                        state=command.state,
+                        batch_key=command.batch_key,
+                        **command.uniforms)
+                    self.submitted += 1
+        finally:
+            for key, shader in shaders.items():
+                shader.uniform_values.clear()
+                shader.uniform_values.update(saved[key])
+                # Nothing is uploaded here, the owner's values are sent by its next draw
+                _ext.SHADER_POOL.invalidate(shader.shader)
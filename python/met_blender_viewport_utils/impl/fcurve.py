@@ -0,0 +1,407 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Vectorized F-curve evaluation for sampling object transforms over a frame range
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    import math
+    np = lazy_module("numpy")
+    bpy = lazy_module("bpy")
+
+# Keyframe interpolation enum values
+_CONSTANT = 0
+_LINEAR = 1
+_BEZIER = 2
+
+# Iterations used to solve bezier segments for time
+_SOLVE_ITERATIONS = 24
+
+Span = _ext.typing.Tuple[float, float]
+_EVERYTHING:Span = (-_ext.math.inf, _ext.math.inf)
+
+
+def _merge_spans(spans:_ext.typing.Iterable[_ext.typing.Optional[Span]])->_ext.typing.Optional[Span]:
+    spans = [span for span in spans if span is not None]
+    if not spans:
+        return None
+    return (min(span[0] for span in spans), max(span[1] for span in spans))
+
+
+class FCurveSampler:
+    """ Evaluates a single F-curve for many frames at once with NumPy.
+
+    Constant, linear and bezier keys with constant or linear extrapolation are evaluated
+    directly. Other interpolation modes are treated as linear. Curves with modifiers fall
+    back to fcurve.evaluate per frame.
+
+    Args:
+        fcurve(bpy.types.FCurve): curve to sample
+    """
+    def __init__(self, fcurve:_ext.bpy.types.FCurve):
+        self.fcurve = fcurve
+        self._keys = None
+        self.refresh()
+
+    def _read_keys(self)->_ext.typing.Dict[str, _ext.np.ndarray]:
+        points = self.fcurve.keyframe_points
+        count = len(points)
+        keys = {}
+        for name in ("co", "handle_left", "handle_right"):
+            values = _ext.np.empty(count * 2, dtype=_ext.np.float64)
+            points.foreach_get(name, values)
+            keys[name] = values.reshape(count, 2)
+        interpolation = _ext.np.empty(count, dtype=_ext.np.int32)
+        points.foreach_get("interpolation", interpolation)
+        keys["interpolation"] = interpolation
+        keys["linear"] = _ext.np.array([self.fcurve.extrapolation == "LINEAR"])
+        keys["modifiers"] = _ext.np.array([len(self.fcurve.modifiers)])
+        return keys
+
+    def refresh(self)->_ext.typing.Optional[Span]:
+        """ Re-read the keys and get the frame span affected by any edits since the last refresh
+
+        Returns:
+            (start, end) frames to re-evaluate, or None if nothing changed
+        """
+        keys = self._read_keys()
+        old, self._keys = self._keys, keys
+        if old is None:
+            return _EVERYTHING
+        if len(old["co"]) != len(keys["co"]) or any(
+                not _ext.np.array_equal(old[name], keys[name]) for name in ("interpolation", "linear", "modifiers")):
+            return _EVERYTHING
+        changed = _ext.np.flatnonzero(
+            _ext.np.any(old["co"] != keys["co"], axis=1)
+            | _ext.np.any(old["handle_left"] != keys["handle_left"], axis=1)
+            | _ext.np.any(old["handle_right"] != keys["handle_right"], axis=1))
+        if not len(changed):
+            return None
+        count = len(keys["co"])
+        spans = []
+        for index in changed:
+            if index == 0 or index == count - 1:
+                # End keys change the extrapolated range as well
+                return _EVERYTHING
+            # A key only shapes the segments either side of it, before and after the edit
+            for co in (old["co"], keys["co"]):
+                spans.append((co[index - 1, 0], co[index + 1, 0]))
+        return _merge_spans(spans)
+
+    def evaluate(self, frames:_ext.np.ndarray)->_ext.np.ndarray:
+        """ Evaluate the curve
+
+        Args:
+            frames (np.ndarray): (N,) frames
+
+        Returns:
+            (N,) values
+        """
+        frames = _ext.np.asarray(frames, dtype=_ext.np.float64)
+        keys = self._keys
+        co = keys["co"]
+        if not len(co):
+            return _ext.np.zeros_like(frames)
+        if keys["modifiers"][0]:
+            return _ext.np.array([self.fcurve.evaluate(frame) for frame in frames], dtype=_ext.np.float64)
+        if len(co) == 1:
+            return _ext.np.full_like(frames, co[0, 1])
+
+        interpolation = keys["interpolation"]
+        handle_left = keys["handle_left"]
+        handle_right = keys["handle_right"]
+        values = _ext.np.empty_like(frames)
+
+        # Segment index for each frame, clipped so extrapolated frames use the end segments
+        segment = _ext.np.clip(_ext.np.searchsorted(co[:, 0], frames, side="right") - 1, 0, len(co) - 2)
+        start, end = co[segment], co[segment + 1]
+        mode = interpolation[segment]
+
+        constant = mode == _CONSTANT
+        values[constant] = start[constant, 1]
+
+        linear = ~constant & (mode != _BEZIER)
+        if linear.any():
+            factor = (frames[linear] - start[linear, 0]) / (end[linear, 0] - start[linear, 0])
+            values[linear] = start[linear, 1] + (end[linear, 1] - start[linear, 1]) * factor
+
+        bezier = mode == _BEZIER
+        if bezier.any():
+            values[bezier] = self._evaluate_bezier(
+                frames[bezier], start[bezier], handle_right[segment[bezier]],
+                handle_left[segment[bezier] + 1], end[bezier])
+
+        self._extrapolate(frames, values)
+        return values
+
+    @staticmethod
+    def _evaluate_bezier(frames, v1, v2, v3, v4)->_ext.np.ndarray:
+        """ Solve cubic bezier segments for time then evaluate their value """
+        # Match BKE_fcurve_correct_bezpart, handles may not overlap in time
+        h1 = v1 - v2
+        h2 = v4 - v3
+        length = v4[:, 0] - v1[:, 0]
+        handle_length = _ext.np.abs(h1[:, 0]) + _ext.np.abs(h2[:, 0])
+        scale = _ext.np.ones_like(length)
+        overlap = handle_length > length
+        scale[overlap] = length[overlap] / handle_length[overlap]
+        v2 = v1 - h1 * scale[:, None]
+        v3 = v4 - h2 * scale[:, None]
+
+        x1, x2, x3, x4 = v1[:, 0], v2[:, 0], v3[:, 0], v4[:, 0]
+        # Power basis coefficients of x(t)
+        a = x4 - 3.0 * x3 + 3.0 * x2 - x1
+        b = 3.0 * x3 - 6.0 * x2 + 3.0 * x1
+        c = 3.0 * x2 - 3.0 * x1
+        d = x1 - frames
+
+        # Safeguarded newton, the corrected curve is monotonic in x so a bracket always exists
+        low = _ext.np.zeros_like(frames)
+        high = _ext.np.ones_like(frames)
+        with _ext.np.errstate(divide="ignore", invalid="ignore"):
+            t = _ext.np.clip(-d / (x4 - x1), 0.0, 1.0)
+            t[~_ext.np.isfinite(t)] = 0.0
+            for _ in range(_SOLVE_ITERATIONS):
+                x = ((a * t + b) * t + c) * t + d
+                above = x > 0.0
+                high = _ext.np.where(above, t, high)
+                low = _ext.np.where(above, low, t)
+                slope = (3.0 * a * t + 2.0 * b) * t + c
+                step = t - x / slope
+                inside = _ext.np.isfinite(step) & (step > low) & (step < high)
+                t = _ext.np.where(inside, step, (low + high) * 0.5)
+
+        y1, y2, y3, y4 = v1[:, 1], v2[:, 1], v3[:, 1], v4[:, 1]
+        inverse = 1.0 - t
+        return (inverse ** 3 * y1 + 3.0 * inverse ** 2 * t * y2
+                + 3.0 * inverse * t ** 2 * y3 + t ** 3 * y4)
+
+    def _extrapolate(self, frames:_ext.np.ndarray, values:_ext.np.ndarray):
+        """ Values past the end keys, as blender's keyframe extrapolation.
+        Constant extrapolation and constant end keys stay flat, linear end keys continue towards
+        their neighbour and other end keys continue along their outer handle.
+        """
+        co = self._keys["co"]
+        before = frames < co[0, 0]
+        # The last key is included as the final segment is evaluated from its start key
+        after = frames >= co[-1, 0]
+        for mask, end, neighbor, handle in ((before, 0, 1, self._keys["handle_left"][0]),
+                                            (after, -1, -2, self._keys["handle_right"][-1])):
+            slope = self._end_slope(end, neighbor, handle)
+            values[mask] = co[end, 1] + (frames[mask] - co[end, 0]) * slope
+
+    def _end_slope(self, end:int, neighbor:int, handle:_ext.np.ndarray)->float:
+        """ Extrapolation gradient of an end key, from that key's own interpolation """
+        keys = self._keys
+        interpolation = keys["interpolation"][end]
+        if not keys["linear"][0] or interpolation == _CONSTANT:
+            return 0.0
+        co = keys["co"]
+        if interpolation == _LINEAR:
+            delta = co[neighbor] - co[end]
+        else:
+            delta = handle - co[end]
+        return delta[1] / delta[0] if delta[0] else 0.0
+
+
+def _axis_rotation(axis:int, angles:_ext.np.ndarray)->_ext.np.ndarray:
+    """ (N, 3, 3) rotations about a single axis """
+    cos, sin = _ext.np.cos(angles), _ext.np.sin(angles)
+    matrices = _ext.np.zeros((len(angles), 3, 3), dtype=_ext.np.float64)
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    matrices[:, axis, axis] = 1.0
+    matrices[:, i, i] = cos
+    matrices[:, i, j] = -sin
+    matrices[:, j, i] = sin
+    matrices[:, j, j] = cos
+    return matrices
+
+
+def _euler_matrices(euler:_ext.np.ndarray, order:str)->_ext.np.ndarray:
+    """ (N, 3, 3) rotations from (N, 3) euler angles, the first axis in order is applied first """
+    matrix = None
+    for name in order:
+        axis = "XYZ".index(name)
+        rotation = _axis_rotation(axis, euler[:, axis])
+        matrix = rotation if matrix is None else rotation @ matrix
+    return matrix
+
+
+def _quaternion_matrices(quaternion:_ext.np.ndarray)->_ext.np.ndarray:
+    """ (N, 3, 3) rotations from (N, 4) wxyz quaternions """
+    norm = _ext.np.linalg.norm(quaternion, axis=1, keepdims=True)
+    norm[norm == 0.0] = 1.0
+    w, x, y, z = (quaternion / norm).T
+    return _ext.np.stack((
+        _ext.np.stack((1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)), axis=1),
+        _ext.np.stack((2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)), axis=1),
+        _ext.np.stack((2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)), axis=1),
+    ), axis=1)
+
+
+class TransformSampler:
+    """ Samples an object's world matrix over many frames from its action F-curves.
+
+    Location, euler or quaternion rotation and scale channels are read from the action,
+    channels without keys use the object's current value. Object parents are sampled
+    recursively, other parent types, constraints and drivers use the current parent matrix
+    and are not animated.
+
+    Args:
+        obj(bpy.types.Object): object to sample
+    """
+    _CHANNELS = {"location": 3, "rotation_euler": 3, "rotation_quaternion": 4, "scale": 3}
+
+    def __init__(self, obj:_ext.bpy.types.Object):
+        self.obj = obj
+        self.parent = None
+        self._curves:_ext.typing.Dict[_ext.typing.Tuple[str, int], FCurveSampler] = {}
+        self._static = None
+        self._structure = None
+        self.refresh()
+
+    def _read_structure(self)->tuple:
+        action = self.obj.animation_data.action if self.obj.animation_data else None
+        paths = tuple(sorted((fcurve.data_path, fcurve.array_index) for fcurve in action.fcurves)) if action else ()
+        parent = self.obj.parent if self.obj.parent_type == "OBJECT" else None
+        return (action, paths, parent)
+
+    def _read_static(self)->tuple:
+        """ Inputs that are not animated, channels driven by F-curves are compared by their keys instead """
+        values = tuple(
+            tuple(value for index, value in enumerate(getattr(self.obj, name)) if (name, index) not in self._curves)
+            for name in self._CHANNELS)
+        parent = () if self.parent is not None else tuple(
+            _ext.np.array(self.obj.parent.matrix_world).ravel()) if self.obj.parent else ()
+        return (self.obj.rotation_mode, values, tuple(_ext.np.array(self.obj.matrix_parent_inverse).ravel()), parent)
+
+    def refresh(self)->_ext.typing.Optional[Span]:
+        """ Re-read the animation and get the frame span affected by any edits
+
+        Returns:
+            (start, end) frames to re-evaluate, or None if nothing changed
+        """
+        structure = self._read_structure()
+        if structure != self._structure:
+            self._structure = structure
+            action, _, parent = structure
+            self._curves = {}
+            if action is not None:
+                for fcurve in action.fcurves:
+                    if fcurve.data_path in self._CHANNELS:
+                        self._curves[(fcurve.data_path, fcurve.array_index)] = FCurveSampler(fcurve)
+            self.parent = TransformSampler(parent) if parent is not None else None
+            self._static = self._read_static()
+            return _EVERYTHING
+
+        static = self._read_static()
+        if static != self._static:
+            self._static = static
+            return _EVERYTHING
+
+        spans = [curve.refresh() for curve in self._curves.values()]
+        if self.parent is not None:
+            spans.append(self.parent.refresh())
+        return _merge_spans(spans)
+
+    def _channel(self, name:str, frames:_ext.np.ndarray)->_ext.np.ndarray:
+        current = getattr(self.obj, name)
+        values = _ext.np.empty((len(frames), self._CHANNELS[name]), dtype=_ext.np.float64)
+        for index in range(self._CHANNELS[name]):
+            curve = self._curves.get((name, index))
+            values[:, index] = curve.evaluate(frames) if curve is not None else current[index]
+        return values
+
+    def world_matrices(self, frames:_ext.np.ndarray)->_ext.np.ndarray:
+        """ Evaluate the world matrix for each frame
+
+        Args:
+            frames (np.ndarray): (N,) frames
+
+        Returns:
+            (N, 4, 4) matrices
+        """
+        frames = _ext.np.asarray(frames, dtype=_ext.np.float64)
+        rotation_mode = self.obj.rotation_mode
+        if rotation_mode == "QUATERNION":
+            rotation = _quaternion_matrices(self._channel("rotation_quaternion", frames))
+        elif rotation_mode == "AXIS_ANGLE":
+            # Not animated, use the current rotation
+            rotation = _ext.np.broadcast_to(
+                _ext.np.array(self.obj.matrix_basis.to_3x3().normalized()), (len(frames), 3, 3))
+        else:
+            rotation = _euler_matrices(self._channel("rotation_euler", frames), rotation_mode)
+
+        basis = _ext.np.zeros((len(frames), 4, 4), dtype=_ext.np.float64)
+        basis[:, :3, :3] = rotation * self._channel("scale", frames)[:, None, :]
+        basis[:, :3, 3] = self._channel("location", frames)
+        basis[:, 3, 3] = 1.0
+
+        if self.obj.parent is None:
+            return basis
+        parent_inverse = _ext.np.array(self.obj.matrix_parent_inverse, dtype=_ext.np.float64)
+        if self.parent is not None:
+            parent = self.parent.world_matrices(frames)
+        else:
+            parent = _ext.np.array(self.obj.parent.matrix_world, dtype=_ext.np.float64)
+        return parent @ parent_inverse @ basis
+
+
+class MotionPath:
+    """ Cached world positions of an object over a frame range, only frames affected by
+    edited keys are evaluated again.
+
+    Args:
+        obj(bpy.types.Object): object to follow
+        start(int): first frame
+        end(int): last frame, inclusive
+        step(float): frame step
+
+    Properties:
+        frames(np.ndarray): (N,) sampled frames
+        positions(np.ndarray): (N, 3) world positions, valid after update()
+        evaluated(int): number of frames evaluated by the last update
+    """
+    def __init__(self, obj:_ext.bpy.types.Object, start:int, end:int, step:float=1.0):
+        self.sampler = TransformSampler(obj)
+        self.frames = _ext.np.arange(start, end + step * 0.5, step, dtype=_ext.np.float64)
+        self.positions = _ext.np.zeros((len(self.frames), 3), dtype=_ext.np.float64)
+        self._valid = _ext.np.zeros(len(self.frames), dtype=bool)
+        self.evaluated = 0
+
+    def set_range(self, start:int, end:int, step:float=1.0):
+        """ Change the sampled range, frames already evaluated are kept """
+        frames = _ext.np.arange(start, end + step * 0.5, step, dtype=_ext.np.float64)
+        if _ext.np.array_equal(frames, self.frames):
+            return
+        positions = _ext.np.zeros((len(frames), 3), dtype=_ext.np.float64)
+        valid = _ext.np.zeros(len(frames), dtype=bool)
+        lookup = {frame: index for index, frame in enumerate(self.frames.tolist())}
+        for index, frame in enumerate(frames.tolist()):
+            old = lookup.get(frame)
+            if old is not None and self._valid[old]:
+                positions[index] = self.positions[old]
+                valid[index] = True
+        self.frames, self.positions, self._valid = frames, positions, valid
+
+    def invalidate(self, span:Span=_EVERYTHING):
+        """ Mark frames within a span for re-evaluation """
+        self._valid[(self.frames >= span[0]) & (self.frames <= span[1])] = False
+
+    def update(self)->_ext.np.ndarray:
+        """ Pick up animation edits and evaluate any invalid frames
+
+        Returns:
+            (N, 3) world positions
+        """
+        span = self.sampler.refresh()
+        if span is not None:
+            self.invalidate(span)
+        invalid = ~self._valid
+        self.evaluated = int(invalid.sum())
+        if self.evaluated:
+            matrices = self.sampler.world_matrices(self.frames[invalid])
+            self.positions[invalid] = matrices[:, :3, 3]
+            self._valid[invalid] = True
+        return self.positions
@@ -2,16 +2,155 @@
 from __future__ import annotations
 class _ext:
     """ External Dependencies """
+    from .lazy import lazy_module
     import logging
-    import blf
+    import typing
+    import math
+    import inspect
+    blf = lazy_module("blf")
+    bpy = lazy_module("bpy")
+    gpu = lazy_module("gpu")
     from met_viewport_utils.constants import  Align
     from met_viewport_utils.algorithm.color import parse_color
     from met_viewport_utils.shape.rect import Rect
     from met_viewport_utils.algorithm import types
     from met_viewport_utils.interfaces import IGPUFont
+    from .drawlist import GPUDrawList
+    from .cache import LRUCache
+    from .offscreen import bind_pixel_space, draw_texture
+    from .state import invalidate_state
     
 LOGGER = _ext.logging.getLogger("met_blender_viewport_utils.impl.font")
 
+# Measured text dimensions keyed by (font id, point size, text)
+MEASURE_CACHE = _ext.LRUCache(4096)
+
+# Last blf state set per font id, only trusted inside a frame, see GPUFont.begin_frame
+_BLF_STATE:_ext.typing.Dict[int, _ext.typing.Dict[str, _ext.typing.Any]] = {}
+_BLF_STATS = {"calls": 0, "skipped": 0}
+_BLF_FRAME_DEPTH = 0
+# Incremented by every outermost frame, retained text drawn in the current frame is never evicted
+_FRAME_COUNT = 0
+
+# Retained text per font starts this large and doubles whenever a frame draws more
+_RETAINED_CAPACITY = 8
+# Retained text evicted while draws may still refer to it, freed when the frame ends
+_RETAINED_RELEASED:_ext.typing.List["RetainedText"] = []
+
+# Properties that choose the font file, applied when a lazy font is resolved
+_FILE_PROPERTIES = ("family", "weight", "style")
+
+
+def _release_retained(key, retained:"RetainedText"):
+    """ Evict callback of the retained text caches, queued draw list callbacks may still draw the text """
+    if _BLF_FRAME_DEPTH or _ext.GPUDrawList.active() is not None:
+        _RETAINED_RELEASED.append(retained)
+    else:
+        retained.free()
+
+
+def _blf_set(font_id:int, key:str, value)->bool:
+    """Record a blf state value for a font.
+    Outside a frame blender or other add-ons may have changed the shared font ids, so blf is always called.
+
+    Returns:
+        bool, True if the value changed and blf needs to be called
+    """
+    state = _BLF_STATE.setdefault(font_id, {})
+    if _BLF_FRAME_DEPTH and key in state and state[key] == value:
+        _BLF_STATS["skipped"] += 1
+        return False
+    state[key] = value
+    _BLF_STATS["calls"] += 1
+    return True
+
+
+class FontRegistry:
+    """ Process wide registry of blf fonts, each font file is loaded at most once and
+    shared between GPUFont instances with reference counting.
+    Fonts are unloaded when the last GPUFont using them is released.
+
+    Properties:
+        loads(int): number of blf.load calls made
+        unloads(int): number of blf.unload calls made
+    """
+    def __init__(self):
+        self.loads = 0
+        self.unloads = 0
+        self._ids:_ext.typing.Dict[str, int] = {}
+        self._refs:_ext.typing.Dict[str, int] = {}
+        self._prototypes:_ext.typing.Dict[_ext.typing.Hashable, GPUFont] = {}
+
+    def acquire(self, path:str)->int:
+        """ Get the font id for a path, loading it if no one is using it yet
+
+        Args:
+            path (str): font file path
+
+        Returns:
+            int font id
+        """
+        font_id = self._ids.get(path)
+        if font_id is None:
+            font_id = _ext.blf.load(path)
+            self.loads += 1
+            if font_id == -1:
+                LOGGER.warning("Failed to load font: %s", path)
+                return 0
+            self._ids[path] = font_id
+            self._refs[path] = 0
+        self._refs[path] += 1
+        return font_id
+
+    def release(self, path:str):
+        """ Release a reference to a font, unloading it if it was the last one
+
+        Args:
+            path (str): font file path
+        """
+        if path not in self._refs:
+            return
+        self._refs[path] -= 1
+        if self._refs[path] > 0:
+            return
+        font_id = self._ids.pop(path)
+        del self._refs[path]
+        _ext.blf.unload(path)
+        self.unloads += 1
+        # Ids may be reused by the next font loaded
+        MEASURE_CACHE.discard_if(lambda key: key[0] == font_id)
+        _BLF_STATE.pop(font_id, None)
+
+    def refcount(self, path:str)->int:
+        """ Number of GPUFonts using a font file """
+        return self._refs.get(path, 0)
+
+    def prototype(self, key:_ext.typing.Hashable)->_ext.typing.Optional[GPUFont]:
+        """ Get a previously resolved font for the given properties """
+        return self._prototypes.get(key)
+
+    def add_prototype(self, key:_ext.typing.Hashable, font:GPUFont):
+        """ Store a resolved font, prototypes do not hold a reference to their font file.
+        Copy the font first so the file is not unloaded when the prototype's reference is released.
+        """
+        font._unregister()
+        self._prototypes[key] = font
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for this registry
+
+        Returns:
+            Dict[str, int]
+        """
+        return {
+            "fonts": len(self._ids),
+            "references": sum(self._refs.values()),
+            "resolved": len(self._prototypes),
+            "loads": self.loads,
+            "unloads": self.unloads,
+        }
+
+
 class GPUFont(_ext.IGPUFont):
     """ Convenience class for drawing text to screen
     
@@ -34,40 +173,190 @@ class GPUFont(_ext.IGPUFont):
         shadow_blur(int)
         point_size(int)
         angle(float)
+        retained(bool): If true, text is cached in a texture and only rasterised again when it changes
     """
     id:int = 0
-    
+    _registered_path:str = None  # Path this instance holds a FONT_REGISTRY reference to
+    _retained:_ext.LRUCache = None  # RetainedText by text and properties, see draw_retained
+    retained:bool = False  # If true, unrotated draws go through draw_retained
+    _pending_props:tuple = None  # from_props arguments and initial file properties of an unresolved lazy font
+
+    @classmethod
+    def from_props(cls, *args, **kwargs)->GPUFont:
+        """ Resolve a font from its properties, each set of properties is only resolved once per session """
+        key = (cls, args, tuple(sorted(kwargs.items())))
+        prototype = FONT_REGISTRY.prototype(key)
+        if prototype is not None:
+            return prototype.copy()
+        prototype = super().from_props(*args, **kwargs)
+        # Copy before storing the prototype so its reference is handed over and the file stays loaded
+        font = prototype.copy()
+        FONT_REGISTRY.add_prototype(key, prototype)
+        return font
+
+    @classmethod
+    def lazy_from_props(cls, *args, **kwargs)->GPUFont:
+        """ Like from_props, but the font is only looked up and loaded when it is first drawn or measured.
+        Use this for fonts created at import or registration time.
+        The family, weight or style set on the font or its copies before then choose the file loaded.
+        """
+        font = cls()
+        font._pending_props = (args, tuple(sorted(kwargs.items())), font._file_properties())
+        return font
+
+    def _file_properties(self)->_ext.typing.Dict[str, _ext.typing.Any]:
+        return {name: getattr(self, name, None) for name in _FILE_PROPERTIES}
+
+    def _resolve(self):
+        """ Look up and load a font created by lazy_from_props, from its current properties """
+        args, kwargs, initial = self._pending_props
+        self._pending_props = None
+        bound = _ext.inspect.signature(_ext.IGPUFont.from_props).bind(*args, **dict(kwargs))
+        for name, value in self._file_properties().items():
+            # Properties changed since creation win over the arguments given to lazy_from_props
+            if value != initial[name] and name in bound.signature.parameters:
+                bound.arguments[name] = value
+        resolved = type(self).from_props(*bound.args, **bound.kwargs)
+        path = getattr(resolved, "path", None)
+        if path:
+            self.path = path
+            self._register(path.as_posix())
+        else:
+            self.id = resolved.id
+
     def copy(self)->GPUFont:
         copy = super().copy()
-        copy.id = self.id
+        copy.retained = self.retained
+        if self._pending_props is not None:
+            # Copies of an unresolved font stay unresolved
+            copy._pending_props = self._pending_props
+            return copy
+        path = getattr(self, "path", None)
+        path = path.as_posix() if path else None
+        if path is None:
+            copy.id = self.id
+        elif copy._registered_path != path:
+            copy._register(path)
         return copy
-            
+
+    def __del__(self):
+        try:
+            self._unregister()
+        except Exception:  # pylint: disable=broad-except
+            # Interpreter shutdown
+            pass
+
+    def _register(self, path:str):
+        """ Take a registry reference to a font file and release the previous one """
+        if path == self._registered_path:
+            return
+        font_id = FONT_REGISTRY.acquire(path)
+        self._unregister()
+        self._registered_path = path
+        self.id = font_id
+
+    def _unregister(self):
+        """ Release the registry reference held by this instance """
+        if self._registered_path is not None:
+            FONT_REGISTRY.release(self._registered_path)
+            self._registered_path = None
+
     def _load_path(self):
         """ Load the font """
-        self.id = _ext.blf.load(self.path.as_posix())
+        self._register(self.path.as_posix())
     
-    def _preprocess(self, text:str, position:_ext.types.Vector2f, point_size:int, angle:float)->_ext.Rect:
-        """ Preps the font and determins the bounds
+    @classmethod
+    def begin_frame(cls):
+        """ Start trusting the tracked blf state, anything recorded before is unknown again """
+        global _BLF_FRAME_DEPTH, _FRAME_COUNT
+        if _BLF_FRAME_DEPTH == 0:
+            _BLF_STATE.clear()
+            _FRAME_COUNT += 1
+        _BLF_FRAME_DEPTH += 1
+
+    @classmethod
+    def end_frame(cls):
+        """ Stop trusting the tracked blf state and free evicted retained text once the outermost frame ends """
+        global _BLF_FRAME_DEPTH
+        _BLF_FRAME_DEPTH = max(_BLF_FRAME_DEPTH - 1, 0)
+        if _BLF_FRAME_DEPTH == 0:
+            _BLF_STATE.clear()
+            while _RETAINED_RELEASED:
+                _RETAINED_RELEASED.pop().free()
+
+    @classmethod
+    def invalidate_state(cls, font_id:_ext.typing.Optional[int]=None):
+        """ Forget the tracked blf state so the next draw sets everything again,
+        eg after drawing with blf directly inside a frame.
+
+        Args:
+            font_id (int, optional): only forget this font, defaults to all fonts
+        """
+        if font_id is None:
+            _BLF_STATE.clear()
+        else:
+            _BLF_STATE.pop(font_id, None)
+
+    @classmethod
+    def stats(cls)->_ext.typing.Dict[str, int]:
+        """ Measurement cache and blf state counters
+
+        Returns:
+            Dict[str, int]
         """
+        measure = MEASURE_CACHE.stats()
+        return {
+            "measure_hits": measure["hits"],
+            "measure_misses": measure["misses"],
+            "measure_evictions": measure["evictions"],
+            "blf_calls": _BLF_STATS["calls"],
+            "blf_skipped": _BLF_STATS["skipped"],
+            "font_loads": FONT_REGISTRY.loads,
+        }
+
+    def _dimensions(self, text:str, point_size:int)->_ext.typing.Tuple[float, float]:
+        """ Measure text, blf.size must already be set """
+        key = (self.id, point_size, text)
+        dimensions = MEASURE_CACHE.get(key)
+        if dimensions is None:
+            dimensions = _ext.blf.dimensions(self.id, text)
+            MEASURE_CACHE.put(key, dimensions)
+        return dimensions
+
+    def _setup(self, point_size:int, angle:float):
+        """ Set the blf rotation, shadow and size for this font """
+        if self._pending_props is not None:
+            self._resolve()
         # Todo
         # _ext.blf.disable(self.id, _ext.blf.CLIPPING)
         # _ext.blf.disable(self.id, _ext.blf.KERNING_DEFAULT)
-        if angle == 0.0:
-            _ext.blf.disable(self.id, _ext.blf.ROTATION)
-        else:
-            _ext.blf.enable(self.id, _ext.blf.ROTATION)
-            _ext.blf.rotation(self.id, angle)
-        
-        if self.shadow_color is not None:
-            _ext.blf.enable(self.id, _ext.blf.SHADOW)
-            _ext.blf.shadow(self.id, self.shadow_blur, *_ext.parse_color(self.shadow_color))
-            _ext.blf.shadow_offset(self.id, int(self.shadow_offset[0]), int(self.shadow_offset[1]))
-        else:
-            _ext.blf.disable(self.id, _ext.blf.SHADOW)
+        if _blf_set(self.id, "rotation", angle or 0.0):
+            if angle == 0.0:
+                _ext.blf.disable(self.id, _ext.blf.ROTATION)
+            else:
+                _ext.blf.enable(self.id, _ext.blf.ROTATION)
+                _ext.blf.rotation(self.id, angle)
         
-        _ext.blf.size(self.id, point_size)
+        shadow = self._shadow_key()
+        if _blf_set(self.id, "shadow", shadow):
+            if shadow is not None:
+                _ext.blf.enable(self.id, _ext.blf.SHADOW)
+                _ext.blf.shadow(self.id, shadow[0], *shadow[1])
+                _ext.blf.shadow_offset(self.id, shadow[2], shadow[3])
+            else:
+                _ext.blf.disable(self.id, _ext.blf.SHADOW)
         
-        width, height = _ext.blf.dimensions(self.id, text)
+        if _blf_set(self.id, "size", point_size):
+            _ext.blf.size(self.id, point_size)
+
+    def _shadow_key(self)->_ext.typing.Optional[tuple]:
+        if self.shadow_color is None:
+            return None
+        return (self.shadow_blur, tuple(_ext.parse_color(self.shadow_color)),
+                int(self.shadow_offset[0]), int(self.shadow_offset[1]))
+
+    def _aligned(self, position:_ext.types.Vector2f, width:float, height:float)->_ext.types.Vector2f:
+        """ Offset a position so text of the given size is placed by self.align """
         position = _ext.types.as_vector2f(position)
         if self.align & _ext.Align.Right:
             position[0] -= width
@@ -82,8 +371,16 @@ class GPUFont(_ext.IGPUFont):
             position[1] -= height/2.0
         elif self.align & _ext.Align.Bottom:
             pass # default
-        
-        _ext.blf.position(self.id, position[0], position[1], 0)
+        return position
+
+    def _preprocess(self, text:str, position:_ext.types.Vector2f, point_size:int, angle:float)->_ext.Rect:
+        """ Preps the font and determins the bounds
+        """
+        self._setup(point_size, angle)
+        width, height = self._dimensions(text, point_size)
+        position = self._aligned(position, width, height)
+        if _blf_set(self.id, "position", (float(position[0]), float(position[1]))):
+            _ext.blf.position(self.id, position[0], position[1], 0)
         return _ext.Rect(position, [width, height])
     
     def draw(self, text:str, position:_ext.types.Vector2f, point_size:int=None,
@@ -100,21 +397,85 @@ class GPUFont(_ext.IGPUFont):
         Returns:
             Bounds of text just drawn
         """
-        rect = self._preprocess(
-            text,
-            position,
-            point_size if point_size is not None else self.point_size,
-            angle if angle is not None else self.angle
-        )
+        point_size = point_size if point_size is not None else self.point_size
+        angle = angle if angle is not None else self.angle
+        if self.retained and not angle:
+            return self.draw_retained(text, position, point_size, color)
         color = _ext.parse_color(color) if color is not None else self.color
+        draw_list = _ext.GPUDrawList.active()
+        if draw_list is not None:
+            draw_list.add_callback(lambda: self._draw(text, position, point_size, angle, color))
+            return self._preprocess(text, position, point_size, angle)
+        return self._draw(text, position, point_size, angle, color)
+
+    def _draw(self, text:str, position:_ext.types.Vector2f, point_size:int,
+              angle:float, color:_ext.types.Vector2f)->_ext.Rect:
+        rect = self._preprocess(text, position, point_size, angle)
         if len(color) == 3:
             # Specify alpha
-            _ext.blf.color(self.id, *color, 1.0)
-        else:
+            color = (*color, 1.0)
+        if _blf_set(self.id, "color", tuple(color)):
             _ext.blf.color(self.id, *color)
         _ext.blf.draw(self.id, text)
+        # blf.draw leaves blending disabled
+        _ext.invalidate_state("blend")
         return rect
     
+    def draw_retained(self, text:_ext.typing.Union[str, _ext.typing.Sequence[str]],
+                      position:_ext.types.Vector2f, point_size:int=None,
+                      color:_ext.types.Vector2f=None, line_spacing:float=1.2)->_ext.Rect:
+        """ Draw static text from a cached texture, the text is only rasterised again
+        when the text, font properties or DPI change. Rotation is not supported.
+        
+        Args:
+            text(str|List[str]): text, or a block of lines, to draw
+            position(Vector): 2d position to draw text
+            point_size(int): optional point_size, defaults to self.point_size
+            color(Vector): optional color, defaults to self.color
+            line_spacing(float): multiplier of the line height between lines of a block
+        
+        Returns:
+            Bounds of text just drawn
+        """
+        if self._pending_props is not None:
+            self._resolve()
+        lines = (text,) if isinstance(text, str) else tuple(text)
+        point_size = point_size if point_size is not None else self.point_size
+        color = _ext.parse_color(color) if color is not None else self.color
+        if len(color) == 3:
+            color = (*color, 1.0)
+        preferences = _ext.bpy.context.preferences
+        key = (lines, point_size, tuple(color), line_spacing, int(self.align), self.id, self._shadow_key(),
+               preferences.system.dpi, preferences.view.ui_scale)
+        if self._retained is None:
+            self._retained = _ext.LRUCache(_RETAINED_CAPACITY, on_evict=_release_retained)
+        retained = self._retained.get(key)
+        if retained is None:
+            retained = RetainedText(self, lines, point_size, tuple(color), line_spacing)
+            self._grow_retained()
+            self._retained.put(key, retained)
+        retained.frame = _FRAME_COUNT
+
+        width, height = retained.text_size
+        position = self._aligned(position, width, height)
+        rect = _ext.Rect(position, [width, height])
+        draw_list = _ext.GPUDrawList.active()
+        if draw_list is not None:
+            draw_list.add_callback(lambda: retained.draw(rect))
+        else:
+            retained.draw(rect)
+        return rect
+
+    def _grow_retained(self):
+        """ Double the retained cache before it would evict text already drawn this frame """
+        cache = self._retained
+        if not _BLF_FRAME_DEPTH or len(cache) < cache.capacity:
+            return
+        entries = cache.items()
+        # Entries are ordered by use, if the oldest was drawn this frame all of them were
+        if entries and entries[0][1].frame == _FRAME_COUNT:
+            cache.capacity *= 2
+
     def bounds(self, text:str, position:_ext.types.Vector2f, point_size:int=None,
                angle:float=None)->_ext.Rect:
         """ Get the bounding box of this text without drawing it
@@ -134,4 +495,83 @@ class GPUFont(_ext.IGPUFont):
             point_size if point_size is not None else self.point_size,
             angle if angle is not None else self.angle
         )
-    
\ No newline at end of file
+
+
+class RetainedText:
+    """ Text rasterised once into an offscreen texture and drawn back as a single quad
+
+    Args:
+        font(GPUFont): font to render with
+        lines(List[str]): lines of text, top to bottom
+        point_size(int): point size
+        color(Vector): rgba color
+        line_spacing(float): multiplier of the line height between lines
+
+    Properties:
+        text_size(Tuple[float, float]): size of the text block, excluding shadow padding
+        padding(int): pixels around the text reserved for the shadow
+        frame(int): frame the text was last drawn in
+    """
+    def __init__(self, font:GPUFont, lines:_ext.typing.Sequence[str], point_size:int,
+                 color:_ext.typing.Tuple[float, ...], line_spacing:float=1.2):
+        self.font = font
+        self.lines = tuple(lines)
+        self.point_size = point_size
+        self.color = color
+        self.line_spacing = line_spacing
+        self.offscreen = None
+        self.frame = 0
+
+        font._setup(point_size, 0.0)
+        self._line_sizes = [font._dimensions(line, point_size) for line in self.lines]
+        self._line_height = max(height for _, height in self._line_sizes) if self._line_sizes else 0.0
+        width = max(width for width, _ in self._line_sizes) if self._line_sizes else 0.0
+        height = self._line_height * (1.0 + line_spacing * (len(self.lines) - 1))
+        self.text_size = (width, height)
+        shadow = font._shadow_key()
+        self.padding = 2 + (shadow[0] + max(abs(shadow[2]), abs(shadow[3])) if shadow else 0)
+
+    def _render(self):
+        width, height = self.text_size
+        offscreen = _ext.gpu.types.GPUOffScreen(
+            max(int(_ext.math.ceil(width)) + self.padding * 2, 1),
+            max(int(_ext.math.ceil(height)) + self.padding * 2, 1))
+        font = self.font
+        with _ext.bind_pixel_space(offscreen):
+            font._setup(self.point_size, 0.0)
+            if _blf_set(font.id, "color", self.color):
+                _ext.blf.color(font.id, *self.color)
+            top = self.padding + height
+            for index, (line, (line_width, _)) in enumerate(zip(self.lines, self._line_sizes)):
+                x = self.padding
+                if font.align & _ext.Align.Right:
+                    x += width - line_width
+                elif font.align & _ext.Align.HCenter:
+                    x += (width - line_width) / 2.0
+                y = top - self._line_height * (1.0 + self.line_spacing * index)
+                if _blf_set(font.id, "position", (float(x), float(y))):
+                    _ext.blf.position(font.id, x, y, 0)
+                _ext.blf.draw(font.id, line)
+        _ext.invalidate_state("blend")
+        self.offscreen = offscreen
+
+    def draw(self, rect:_ext.Rect):
+        """ Draw the text with its block placed at rect, rendering it first if needed
+
+        Args:
+            rect (Rect): bounds of the text block
+        """
+        if self.offscreen is None:
+            self._render()
+        position = _ext.types.as_vector2f((rect.left() - self.padding, rect.bottom() - self.padding))
+        _ext.draw_texture(self.offscreen.texture_color,
+                          _ext.Rect(position, [self.offscreen.width, self.offscreen.height]))
+
+    def free(self):
+        """ Release the offscreen buffer """
+        if self.offscreen is not None:
+            self.offscreen.free()
+            self.offscreen = None
+
+
+FONT_REGISTRY = FontRegistry()
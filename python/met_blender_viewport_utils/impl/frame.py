@@ -0,0 +1,100 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Frame scope for draw handlers
+"""
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    bpy = lazy_module("bpy")
+    from .state import GPUStateTracker
+    from .drawlist import GPUDrawList
+    from .font import GPUFont
+    from .pool import SHADER_POOL
+    from .uniforms import FRAME_UNIFORMS
+    from .regions import RegionScope
+
+
+class GPUFrame:
+    """Context manager wrapping a single draw handler call
+
+    Resets per frame caches that blender may have invalidated between redraws,
+    tracks gpu state so it is only changed when needed and optionally defers
+    draws into a GPUDrawList.
+
+    Args:
+        defer(bool): If true, draws are collected and merged in a GPUDrawList
+        sort(bool): If true, the draw list groups across the whole frame and may change paint order, see GPUDrawList
+        viewport(BlenderViewport): If given, FRAME_UNIFORMS is updated with its size and the dpi scale,
+            and caches partitioned by region use the viewport's region while drawing
+        opacity(float): global opacity written to FRAME_UNIFORMS along with the viewport
+
+    Properties:
+        state(GPUStateTracker): state tracker for this frame
+        draw_list(GPUDrawList): draw list for this frame, None if not deferring
+        region(RegionScope): scope of the viewport's region, None without a viewport
+
+    Usage:
+        def draw(self, context):
+            with GPUFrame():
+                for item in items:
+                    item.draw(viewport)
+    """
+    def __init__(self, defer:bool=True, sort:bool=False, viewport=None, opacity:float=1.0):
+        self.state = _ext.GPUStateTracker()
+        self.draw_list = _ext.GPUDrawList(sort=sort) if defer else None
+        self.viewport = viewport
+        self.opacity = opacity
+        region_key = getattr(viewport, "region_key", None)
+        self.region = _ext.RegionScope(region_key()) if region_key is not None else None
+
+    def __enter__(self)->"GPUFrame":
+        # Blender draws text with the same font ids between our handlers
+        _ext.GPUFont.begin_frame()
+        # and with the same builtin shaders, forget which uniforms they hold
+        _ext.SHADER_POOL.begin_frame()
+        if self.viewport is not None:
+            self._update_uniforms()
+        if self.region is not None:
+            self.region.__enter__()
+        self.state.__enter__()
+        if self.draw_list is not None:
+            self.draw_list.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if self.draw_list is not None:
+                self.draw_list.__exit__(exc_type, exc_value, traceback)
+        finally:
+            self.state.__exit__(exc_type, exc_value, traceback)
+            if self.region is not None:
+                self.region.__exit__(exc_type, exc_value, traceback)
+            _ext.SHADER_POOL.end_frame()
+            _ext.GPUFont.end_frame()
+
+    def _update_uniforms(self):
+        """ Write the per frame values, they are uploaded once by the first shader reading them """
+        rect = self.viewport.rect()
+        preferences = _ext.bpy.context.preferences
+        _ext.FRAME_UNIFORMS.update(
+            viewport_size=(rect.width, rect.height),
+            dpi_scale=preferences.system.dpi / 72.0,
+            opacity=self.opacity)
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for this frame
+
+        Returns:
+            Dict[str, int]
+        """
+        stats = {
+            "state_changes": self.state.changes,
+            "state_skipped": self.state.skipped,
+        }
+        if self.draw_list is not None:
+            stats["draw_requests"] = self.draw_list.requested
+            stats["draw_calls"] = self.draw_list.submitted
+        stats.update(_ext.GPUFont.stats())
+        stats.update(_ext.SHADER_POOL.stats())
+        stats.update(_ext.FRAME_UNIFORMS.stats())
+        return stats
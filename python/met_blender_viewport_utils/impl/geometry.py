@@ -0,0 +1,127 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Memoization of generated HUD geometry
+"""
+class _ext:
+    """ External Dependencies """
+    import typing
+    from met_viewport_utils.shape.rect import Rect
+    from met_viewport_utils.shape.margins import Margins
+    from .cache import LRUCache, freeze
+    from .regions import RegionPartitions
+
+
+def _freeze_argument(value)->_ext.typing.Hashable:
+    if isinstance(value, _ext.Rect):
+        return ("Rect", value.left(), value.bottom(), value.width, value.height)
+    if isinstance(value, _ext.Margins):
+        return ("Margins",) + tuple(value)
+    return _ext.freeze(value)
+
+
+class GeometryCache:
+    """ Bounded cache of generated meshes keyed by generator and arguments.
+
+    The same mesh object is returned until an input changes, so draws of it can reuse their
+    GPU batch through batch_key. Returned meshes are shared and must not be modified, wrap
+    any transforms such as rotate_by in the generator instead.
+
+    HUD geometry depends on the size of the region it is laid out in, so each region drawn through
+    GPUFrame(viewport=...) keeps its own meshes and quad views do not evict each other.
+
+    Args:
+        capacity(int): maximum number of meshes kept per region
+        regions(int): number of regions kept
+
+    Usage:
+        mesh = GEOMETRY_CACHE.get(border2d, rect, margins)
+        shader.draw({"pos": mesh.points}, indices=mesh.indices, batch_key=GEOMETRY_CACHE.batch_key(mesh))
+    """
+    def __init__(self, capacity:int=256, regions:int=8):
+        self._capacity = capacity
+        self._partitions = _ext.RegionPartitions(
+            lambda: _ext.LRUCache(self._capacity, on_evict=self._evicted),
+            capacity=regions, on_evict=self._region_evicted)
+        self._keys:_ext.typing.Dict[int, _ext.typing.Hashable] = {}
+
+    def _evicted(self, key:_ext.typing.Hashable, mesh):
+        self._keys.pop(id(mesh), None)
+
+    def _region_evicted(self, region:_ext.typing.Hashable, cache:_ext.LRUCache):
+        for key, mesh in cache.items():
+            self._evicted(key, mesh)
+
+    @property
+    def capacity(self)->int:
+        return self._capacity
+
+    @capacity.setter
+    def capacity(self, capacity:int):
+        self._capacity = capacity
+        for cache in self._partitions.values():
+            cache.capacity = capacity
+
+    def key(self, generator:_ext.typing.Callable, *args, **kwargs)->_ext.typing.Hashable:
+        """ Cache key for a generator call
+
+        Returns:
+            Hashable
+        """
+        return (
+            getattr(generator, "__module__", None),
+            getattr(generator, "__qualname__", id(generator)),
+            tuple(_freeze_argument(arg) for arg in args),
+            tuple(sorted((name, _freeze_argument(value)) for name, value in kwargs.items())),
+        )
+
+    def get(self, generator:_ext.typing.Callable, *args, **kwargs):
+        """ Get the mesh for a generator call, generating it only if the inputs are new
+
+        Args:
+            generator (Callable): mesh generator, eg border2d
+            args (Any): generator arguments
+            kwargs (Any): generator keyword arguments
+
+        Returns:
+            Mesh
+        """
+        key = self.key(generator, *args, **kwargs)
+        cache = self._partitions.get()
+        mesh = cache.get(key)
+        if mesh is None:
+            mesh = generator(*args, **kwargs)
+            cache.put(key, mesh)
+            self._keys[id(mesh)] = key
+        return mesh
+
+    def batch_key(self, mesh)->_ext.typing.Optional[_ext.typing.Hashable]:
+        """ Key identifying a cached mesh for GPUShader.draw(batch_key=...)
+
+        Args:
+            mesh (Mesh): mesh returned by get
+
+        Returns:
+            Hashable, or None if the mesh is not cached
+        """
+        return self._keys.get(id(mesh))
+
+    def clear(self):
+        """ Drop all cached meshes of every region """
+        self._partitions.clear()
+        self._keys.clear()
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for this cache, summed over the regions kept
+
+        Returns:
+            Dict[str, int]
+        """
+        stats = {"size": 0, "capacity": self._capacity, "hits": 0, "misses": 0, "evictions": 0}
+        for cache in self._partitions.values():
+            for key, value in cache.stats().items():
+                if key != "capacity":
+                    stats[key] += value
+        stats.update(self._partitions.stats())
+        return stats
+
+
+GEOMETRY_CACHE = GeometryCache()
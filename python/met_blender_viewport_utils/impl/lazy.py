@@ -0,0 +1,50 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Deferred imports so loading the package does not pull in numpy, gpu or blender modules
+"""
+class _ext:
+    """ External Dependencies """
+    import sys
+    import types
+    import importlib
+
+
+class LazyModule(_ext.types.ModuleType):
+    """ Module placeholder that imports the real module on first attribute access.
+
+    The real module's attributes are copied onto the placeholder once loaded,
+    so later lookups are plain attribute reads.
+
+    Args:
+        name(str): module to import
+
+    Usage:
+        class _ext:
+            np = lazy_module("numpy")
+    """
+    def __init__(self, name:str):
+        super().__init__(name)
+
+    def __getattr__(self, name:str):
+        # Only reached for attributes that are not loaded yet
+        module = _ext.importlib.import_module(self.__name__)
+        self.__dict__.update(vars(module))
+        return getattr(module, name)
+
+    def __repr__(self)->str:
+        return f"<lazy module '{self.__name__}'>"
+
+
+def lazy_module(name:str)->_ext.types.ModuleType:
+    """ Get a module, deferring the import until it is used if it is not already loaded
+
+    Args:
+        name (str): module to import, eg "numpy" or "gpu_extras.batch"
+
+    Returns:
+        ModuleType
+    """
+    module = _ext.sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
@@ -0,0 +1,193 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Screen space level of detail for long polylines
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    np = lazy_module("numpy")
+    from .cache import LRUCache, digest
+    from .regions import RegionPartitions
+
+
+def _runs(mask:_ext.np.ndarray)->_ext.typing.List[_ext.typing.Tuple[int, int, bool]]:
+    """ (start, end, value) of each run of equal values, end inclusive """
+    if not len(mask):
+        return []
+    edges = _ext.np.flatnonzero(mask[1:] != mask[:-1]) + 1
+    starts = _ext.np.concatenate(([0], edges))
+    ends = _ext.np.concatenate((edges - 1, [len(mask) - 1]))
+    return [(int(start), int(end), bool(mask[start])) for start, end in zip(starts, ends)]
+
+
+def _grid_cull(points:_ext.np.ndarray, cell:float)->_ext.np.ndarray:
+    """ Indices of points that leave the grid cell of the point before them, endpoints are kept """
+    np = _ext.np
+    cells = np.floor(points / cell).astype(np.int64)
+    moved = np.any(cells[1:] != cells[:-1], axis=1)
+    keep = np.concatenate(([True], moved))
+    keep[-1] = True
+    return np.flatnonzero(keep)
+
+
+def _douglas_peucker(points:_ext.np.ndarray, tolerance:float)->_ext.np.ndarray:
+    """ Indices kept by Douglas-Peucker, each segment is tested in one vectorized pass """
+    np = _ext.np
+    count = len(points)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        inner = points[start + 1:end]
+        origin = points[start]
+        direction = points[end] - origin
+        length_sq = float(direction @ direction)
+        offsets = inner - origin
+        if length_sq > 0.0:
+            # Distance to the segment rather than its line, so loops back past an end are kept
+            t = np.clip(offsets @ direction / length_sq, 0.0, 1.0)
+            offsets = offsets - t[:, None] * direction
+        distances = np.einsum("ij,ij->i", offsets, offsets)
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance * tolerance:
+            middle = start + 1 + index
+            keep[middle] = True
+            stack.append((start, middle))
+            stack.append((middle, end))
+    return np.flatnonzero(keep)
+
+
+def simplify_screen(screen_positions:_ext.np.ndarray, tolerance:float=1.0, chunk_size:int=4096)->_ext.np.ndarray:
+    """ Simplify a projected polyline to within about tolerance pixels
+
+    Points closer than half the tolerance are culled in one pass before Douglas-Peucker runs,
+    and long runs are simplified in chunks that share their end points, so the cost stays close
+    to linear. Points that did not project, NaN from world_to_screen_array, only keep the ends of
+    each run so the line still breaks there.
+
+    Args:
+        screen_positions (np.ndarray): (N, 2) region positions
+        tolerance (float): maximum deviation in pixels
+        chunk_size (int): maximum points simplified at once
+
+    Returns:
+        np.ndarray: sorted indices of the points to draw
+    """
+    np = _ext.np
+    points = np.asarray(screen_positions, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 3 or tolerance <= 0.0:
+        return np.arange(len(points))
+    chunk_size = max(int(chunk_size), 3)
+    kept = []
+    for start, end, finite in _runs(np.isfinite(points).all(axis=1)):
+        if not finite:
+            kept.append(np.array(sorted({start, end})))
+            continue
+        run = start + _grid_cull(points[start:end + 1], tolerance * 0.5)
+        for first in range(0, len(run) - 1, chunk_size - 1):
+            chunk = run[first:first + chunk_size]
+            kept.append(chunk[_douglas_peucker(points[chunk], tolerance)])
+        if len(run) == 1:
+            kept.append(run)
+    return np.unique(np.concatenate(kept))
+
+
+class PolylineLOD:
+    """ Screen space decimation of polylines, cached by the shape of the line's projected bounds.
+
+    The polyline is projected through BlenderViewport.world_to_screen_array and simplified to a
+    pixel tolerance, so the drawn vertex count follows the line's size on screen rather than
+    its sample count. Simplifying only depends on where points are relative to each other, so
+    results are reused while the corners of the line's projected bounding box keep their relative
+    positions to within reuse * tolerance pixels, eg when panning. Zooming and orbiting move them
+    and simplify again. Lines crossing the camera plane are only reused for the exact same view,
+    as which points are behind the camera changes with any move.
+    Each region keeps its own results, so a quad view does not alternate between them.
+
+    Args:
+        tolerance(float): maximum deviation in pixels
+        reuse(float): fraction of the tolerance the projected bounds may change by before simplifying again
+        chunk_size(int): maximum points simplified at once
+        capacity(int): number of simplified lines kept per region
+
+    Properties:
+        input_vertices(int): vertices passed to the last simplify
+        output_vertices(int): vertices returned by the last simplify
+
+    Usage:
+        lod = PolylineLOD(tolerance=1.0)
+        indices = lod.simplify(viewport, positions)
+        shader.draw({"pos": positions[indices], "color": colors[indices]})
+    """
+    def __init__(self, tolerance:float=1.0, reuse:float=0.5, chunk_size:int=4096, capacity:int=8):
+        self.tolerance = tolerance
+        self.reuse = reuse
+        self.chunk_size = chunk_size
+        self.input_vertices = 0
+        self.output_vertices = 0
+        self._caches = _ext.RegionPartitions(lambda: _ext.LRUCache(capacity))
+
+    def _view_bucket(self, viewport, positions:_ext.np.ndarray)->_ext.typing.Hashable:
+        """ Corners of the line's projected bounding box relative to the first, in cells of reuse * tolerance pixels """
+        np = _ext.np
+        snapshot = viewport.view_snapshot()
+        minimum, maximum = np.nanmin(positions, axis=0), np.nanmax(positions, axis=0)
+        corners = np.array([[(minimum, maximum)[(index >> axis) & 1][axis] for axis in range(3)]
+                            for index in range(8)], dtype=np.float64)
+        matrix = snapshot.perspective_matrix
+        if np.any(corners @ matrix[3, :3] + matrix[3, 3] <= 0.0):
+            return ("view", snapshot.signature)
+        screen = snapshot.world_to_screen(corners)
+        cell = max(self.tolerance * self.reuse, 1e-6)
+        return tuple(np.floor((screen - screen[0]) / cell).astype(np.int64).ravel().tolist())
+
+    def simplify(self, viewport, positions:_ext.np.ndarray, key:_ext.typing.Optional[_ext.typing.Hashable]=None)->_ext.np.ndarray:
+        """ Indices of the points to draw for this view
+
+        Args:
+            viewport (BlenderViewport): viewport being drawn
+            positions (np.ndarray): (N, 3) world positions
+            key (Hashable, optional): identifies the positions, defaults to a digest of them.
+                The caller is responsible for changing the key when the positions change.
+
+        Returns:
+            np.ndarray: sorted indices into positions
+        """
+        positions = _ext.np.asarray(positions).reshape(-1, 3)
+        self.input_vertices = len(positions)
+        if len(positions) < 3:
+            self.output_vertices = len(positions)
+            return _ext.np.arange(len(positions))
+        if key is None:
+            key = _ext.digest(positions)
+        cache = self._caches.get(viewport.region_key())
+        cache_key = (key, self.tolerance, self._view_bucket(viewport, positions))
+        indices = cache.get(cache_key)
+        if indices is None:
+            screen = viewport.world_to_screen_array(positions)
+            indices = simplify_screen(screen, self.tolerance, self.chunk_size)
+            cache.put(cache_key, indices)
+        self.output_vertices = len(indices)
+        return indices
+
+    def clear(self):
+        """ Forget all simplified lines of every region """
+        self._caches.clear()
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for the last simplify
+
+        Returns:
+            Dict[str, int]
+        """
+        caches = self._caches.values()
+        return {
+            "lod_input_vertices": self.input_vertices,
+            "lod_output_vertices": self.output_vertices,
+            "lod_hits": sum(cache.hits for cache in caches),
+            "lod_misses": sum(cache.misses for cache in caches),
+        }
@@ -0,0 +1,224 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Instanced markers, one shape drawn many times with a single draw call
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    import functools
+    gpu = lazy_module("gpu")
+    np = lazy_module("numpy")
+    from met_viewport_utils.constants import GPUShaderPrimitiveType, GPUShaderState
+    from .shader import GPUShader
+    from .shaders import VertexColorShader
+    from .state import GPURestoreState, set_size
+    from .cache import digest
+    from .pool import SHADER_POOL
+    from .drawlist import GPUDrawList
+    from .uniforms import FRAME_UNIFORMS
+
+
+_VERTEX_SOURCE = """
+void main()
+{
+  int texel = gl_InstanceID * 3;
+  int width = textureSize(instances, 0).x;
+  ivec2 coord = ivec2(texel % width, texel / width);
+  vec4 transform = texelFetch(instances, coord, 0);
+  float angle = texelFetch(instances, coord + ivec2(1, 0), 0).x;
+  v_color = texelFetch(instances, coord + ivec2(2, 0), 0);
+  vec2 local = pos * transform.w;
+  float s = sin(angle);
+  float c = cos(angle);
+  local = vec2(c * local.x - s * local.y, s * local.x + c * local.y);
+  vec4 center = ModelViewProjectionMatrix * vec4(transform.xyz, 1.0);
+  /* Offsets are in pixels whatever the projection, markers keep their size when zooming */
+  vec2 pixel = 2.0 / max(frame.viewport_size, vec2(1.0));
+  gl_Position = center + vec4(local * pixel * center.w, 0.0, 0.0);
+}
+"""
+
+_FRAGMENT_SOURCE = """
+void main()
+{
+  fragColor = vec4(v_color.rgb, v_color.a * frame.opacity);
+}
+"""
+
+# Texels per instance: position and scale, rotation, color
+_TEXELS = 3
+# Widest instance texture, a multiple of _TEXELS so an instance never wraps a row
+_TEXTURE_WIDTH = _TEXELS * 1024
+
+
+def _declare(info:_ext.gpu.types.GPUShaderCreateInfo):
+    interface = _ext.gpu.types.GPUStageInterfaceInfo("marker_interface")
+    interface.flat("VEC4", "v_color")
+    _ext.FRAME_UNIFORMS.declare(info, slot=0)
+    info.push_constant("MAT4", "ModelViewProjectionMatrix")
+    info.sampler(0, "FLOAT_2D", "instances")
+    info.vertex_in(0, "VEC2", "pos")
+    info.vertex_out(interface)
+    info.fragment_out(0, "VEC4", "fragColor")
+    return interface
+
+
+def instancing_supported()->bool:
+    """ Whether this blender can compile custom shaders and draw instanced batches from python
+
+    Returns:
+        bool
+    """
+    return (hasattr(_ext.gpu.types, "GPUShaderCreateInfo") and
+            hasattr(_ext.gpu.types.GPUBatch, "draw_instanced"))
+
+
+class InstancedMarkerShader(_ext.GPUShader):
+    """
+    Draw one base shape at many positions with a single instanced draw call.
+
+    The base shape is uploaded once, per instance position, scale, rotation and color are packed
+    into a float texture that is only uploaded again when they change. Shape coordinates are in
+    pixels times the instance scale, so markers keep their screen size in both the 3D view and
+    pixel space HUDs. The viewport size comes from FRAME_UNIFORMS, draw inside GPUFrame(viewport=...).
+
+    Where instancing is not available the shape is expanded per instance on the CPU and drawn with
+    VertexColorShader, sizes are then in the units of the positions.
+
+    Args:
+        mesh: base shape from met_viewport_utils.shape.generate, centered on the origin
+
+    ShaderParams:
+        pos: in vec2
+        instances: uniform sampler2D
+
+    Usage:
+        markers = InstancedMarkerShader(square2d(Rect((-0.5, -0.5), (1.0, 1.0))))
+        markers.set_instances(positions, scale=8.0, colors=colors)
+        with GPUFrame(viewport=viewport):
+            markers.draw_markers()
+    """
+    primitive_type = _ext.GPUShaderPrimitiveType.Tris
+
+    def __init__(self, mesh=None):
+        super().__init__(_ext.functools.partial(
+            _ext.SHADER_POOL.create, _VERTEX_SOURCE, _FRAGMENT_SOURCE, _declare))
+        self.state = _ext.GPUShaderState.UseAlpha
+        self.bind_block(_ext.FRAME_UNIFORMS.name, _ext.FRAME_UNIFORMS)
+        self.uploads = 0
+        self._points = None
+        self._indices = None
+        self._shape_version = 0
+        self._instances = None
+        self._instances_digest = None
+        self._texture = None
+        self._fallback = None
+        if mesh is not None:
+            self.set_shape(mesh)
+
+    @property
+    def count(self)->int:
+        """ Number of instances drawn """
+        return 0 if self._instances is None else len(self._instances)
+
+    def set_shape(self, mesh):
+        """ Set the base shape drawn for every instance
+
+        Args:
+            mesh: shape with points and triangle indices, centered on the origin
+        """
+        points = _ext.np.asarray(mesh.points, dtype=_ext.np.float32)
+        self._points = _ext.np.ascontiguousarray(points[:, :2])
+        self._indices = _ext.np.asarray(mesh.indices, dtype=_ext.np.uint32).reshape(-1, 3)
+        self._shape_version += 1
+
+    def set_instances(self,
+                      positions:_ext.np.ndarray,
+                      scale:_ext.typing.Union[float, _ext.np.ndarray]=1.0,
+                      rotation:_ext.typing.Union[float, _ext.np.ndarray]=0.0,
+                      colors=(1.0, 1.0, 1.0, 1.0)):
+        """ Set the per instance values, the instance texture is only rebuilt when they change
+
+        Args:
+            positions (np.ndarray): (N, 2) or (N, 3) instance positions
+            scale (float|np.ndarray): shape scale, per instance or shared
+            rotation (float|np.ndarray): rotation in radians, per instance or shared
+            colors (Color|np.ndarray): rgba color, per instance (N, 4) or shared
+        """
+        np = _ext.np
+        positions = np.asarray(positions, dtype=np.float32).reshape(len(positions), -1)
+        count = len(positions)
+        instances = np.zeros((count, _TEXELS, 4), dtype=np.float32)
+        instances[:, 0, :positions.shape[1]] = positions[:, :3]
+        instances[:, 0, 3] = scale
+        instances[:, 1, 0] = rotation
+        instances[:, 2] = np.broadcast_to(np.asarray(colors, dtype=np.float32), (count, 4))
+        key = _ext.digest(instances)
+        if key == self._instances_digest:
+            return
+        self._instances = instances
+        self._instances_digest = key
+        self._texture = None
+
+    def _instance_texture(self)->_ext.gpu.types.GPUTexture:
+        if self._texture is None:
+            texels = self.count * _TEXELS
+            width = min(texels, _TEXTURE_WIDTH)
+            height = -(-texels // width)
+            data = _ext.np.zeros((height * width, 4), dtype=_ext.np.float32)
+            data[:texels] = self._instances.reshape(-1, 4)
+            buffer = _ext.gpu.types.Buffer("FLOAT", data.size, data.ravel())
+            self._texture = _ext.gpu.types.GPUTexture((width, height), format="RGBA32F", data=buffer)
+            self.uploads += 1
+        return self._texture
+
+    def draw_markers(self):
+        """ Draw every instance with one draw call """
+        if self._points is None or not self.count:
+            return
+        if not instancing_supported():
+            self._draw_fallback()
+            return
+        batch = self._batch({"pos": self._points}, self.primitive_type, self._indices,
+                            batch_key=("shape", self._shape_version))
+        texture = self._instance_texture()
+        count = self.count
+        draw_list = _ext.GPUDrawList.active()
+        if draw_list is not None:
+            draw_list.add_callback(lambda: self._draw_instanced(batch, texture, count))
+            return
+        self._draw_instanced(batch, texture, count)
+
+    def _draw_instanced(self, batch:_ext.gpu.types.GPUBatch, texture:_ext.gpu.types.GPUTexture, count:int):
+        if self.size:
+            _ext.set_size(self.size)
+        self.uniform_values["instances"] = texture
+        self._upload_uniforms()
+        with _ext.GPURestoreState(self.state):
+            batch.draw_instanced(self.shader, instance_count=count)
+
+    def _draw_fallback(self):
+        """ Expand the shape per instance on the CPU, one draw with count times the vertices """
+        np = _ext.np
+        if self._fallback is None:
+            self._fallback = _ext.VertexColorShader()
+        instances = self._instances
+        angle = instances[:, 1, 0]
+        cos, sin = np.cos(angle), np.sin(angle)
+        local = self._points[None, :, :] * instances[:, 0, 3, None, None]
+        rotated = np.stack((cos[:, None] * local[..., 0] - sin[:, None] * local[..., 1],
+                            sin[:, None] * local[..., 0] + cos[:, None] * local[..., 1]), axis=-1)
+        positions = np.repeat(instances[:, None, 0, :3], len(self._points), axis=1)
+        positions[..., :2] += rotated
+        colors = np.repeat(instances[:, None, 2], len(self._points), axis=1)
+        offsets = np.arange(self.count, dtype=np.uint32)[:, None, None] * len(self._points)
+        indices = (self._indices[None] + offsets).reshape(-1, 3)
+        self._fallback.draw({"pos": positions.reshape(-1, 3), "color": colors.reshape(-1, 4)},
+                            self.primitive_type, indices=indices, state=self.state,
+                            batch_key=("markers", self._shape_version, self._instances_digest))
+
+    def free(self):
+        """ Release the instance texture, it is rebuilt on the next draw """
+        self._texture = None
+
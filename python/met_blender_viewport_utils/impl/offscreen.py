@@ -0,0 +1,99 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Helpers for rendering into offscreen buffers and drawing them back
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    import contextlib
+    gpu = lazy_module("gpu")
+    mathutils = lazy_module("mathutils")
+    from met_viewport_utils.shape.rect import Rect
+    from .shaders import ImageShader, UniformColorShader
+    from .state import blend_override
+
+_QUAD_INDICES = ((0, 1, 2), (0, 2, 3))
+_QUAD_UVS = ((0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0))
+_IMAGE_SHADER:_ext.typing.Optional[_ext.ImageShader] = None
+_CLEAR_SHADER:_ext.typing.Optional[_ext.UniformColorShader] = None
+
+
+def pixel_projection(width:float, height:float)->_ext.mathutils.Matrix:
+    """ Orthographic projection mapping pixel coordinates to clip space
+
+    Args:
+        width (float): width in pixels
+        height (float): height in pixels
+
+    Returns:
+        Matrix
+    """
+    return _ext.mathutils.Matrix((
+        (2.0 / width, 0.0, 0.0, -1.0),
+        (0.0, 2.0 / height, 0.0, -1.0),
+        (0.0, 0.0, 1.0, 0.0),
+        (0.0, 0.0, 0.0, 1.0)))
+
+
+@_ext.contextlib.contextmanager
+def bind_pixel_space(offscreen:_ext.gpu.types.GPUOffScreen, clear:bool=True):
+    """ Bind an offscreen buffer with a pixel space projection, draws inside land in the buffer
+
+    Args:
+        offscreen (gpu.types.GPUOffScreen): buffer to draw into
+        clear (bool): If true, clear the buffer to transparent first
+
+    Usage:
+        with bind_pixel_space(offscreen):
+            blf.draw(font_id, "text")
+    """
+    with offscreen.bind():
+        if clear:
+            _ext.gpu.state.active_framebuffer_get().clear(color=(0.0, 0.0, 0.0, 0.0))
+        with _ext.gpu.matrix.push_pop():
+            _ext.gpu.matrix.load_matrix(_ext.mathutils.Matrix.Identity(4))
+            with _ext.gpu.matrix.push_pop_projection():
+                _ext.gpu.matrix.load_projection_matrix(pixel_projection(offscreen.width, offscreen.height))
+                yield offscreen
+
+
+def draw_texture(texture:_ext.gpu.types.GPUTexture, rect:_ext.Rect, premultiplied:bool=True):
+    """ Draw a texture as a single quad covering rect
+
+    Args:
+        texture (gpu.types.GPUTexture): texture to draw
+        rect (Rect): screen rect to cover
+        premultiplied (bool): If true the texture holds premultiplied alpha, as offscreen renders do
+    """
+    global _IMAGE_SHADER
+    if _IMAGE_SHADER is None:
+        _IMAGE_SHADER = _ext.ImageShader()
+    left, bottom = rect.left(), rect.bottom()
+    right, top = left + rect.width, bottom + rect.height
+    positions = ((left, bottom), (right, bottom), (right, top), (left, top))
+    with _ext.blend_override("ALPHA_PREMULT" if premultiplied else "ALPHA"):
+        _IMAGE_SHADER.draw_immediate(
+            {"pos": positions, "texCoord": _QUAD_UVS},
+            indices=_QUAD_INDICES,
+            image=texture)
+
+
+def clear_rect(rect:_ext.Rect):
+    """ Reset part of the bound framebuffer to transparent.
+    Drawn as a quad without blending, framebuffer clears ignore the scissor on some backends.
+
+    Args:
+        rect (Rect): rect to clear
+    """
+    global _CLEAR_SHADER
+    if _CLEAR_SHADER is None:
+        _CLEAR_SHADER = _ext.UniformColorShader()
+    left, bottom = rect.left(), rect.bottom()
+    right, top = left + rect.width, bottom + rect.height
+    positions = ((left, bottom), (right, bottom), (right, top), (left, top))
+    with _ext.blend_override("NONE"):
+        _CLEAR_SHADER.draw_immediate(
+            {"pos": positions},
+            indices=_QUAD_INDICES,
+            color=(0.0, 0.0, 0.0, 0.0))
@@ -0,0 +1,142 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Screen space spatial index for finding HUD items under the mouse
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    import math
+    rect = lazy_module("met_viewport_utils.shape.rect")
+
+Bounds = _ext.typing.Tuple[float, float, float, float]
+
+
+def rect_bounds(rect:_ext.rect.Rect)->Bounds:
+    """ (left, bottom, right, top) of a rect """
+    left, bottom = rect.left(), rect.bottom()
+    return (left, bottom, left + rect.width, bottom + rect.height)
+
+
+def item_pick_bounds(item, viewport)->_ext.typing.List[Bounds]:
+    """ Screen bounds an item responds to the mouse in.
+    Items may define pick_rects(viewport) to return several smaller areas than their screen rect.
+
+    Args:
+        item (HudItem): item to inspect
+        viewport (BlenderViewport): viewport the item is drawn in
+
+    Returns:
+        List[Bounds]
+    """
+    pick_rects = getattr(item, "pick_rects", None)
+    rects = pick_rects(viewport) if pick_rects is not None else [item.screen_rect(viewport)]
+    return [rect_bounds(rect) for rect in rects]
+
+
+class HudPickIndex:
+    """ Uniform grid of item screen rects for sub-linear hover lookups.
+
+    The grid is rebuilt when the region size changes, otherwise only items reported as
+    changed are re-inserted.
+
+    Args:
+        cell_size(int): grid cell size in pixels
+
+    Properties:
+        rebuilds(int): number of full rebuilds
+        reinserts(int): number of items updated incrementally
+
+    Usage:
+        index.update(viewport, items, changed=redraw_tracker.changed(items))
+        hovered = index.query(mouse_position)
+    """
+    def __init__(self, cell_size:int=64):
+        self.cell_size = cell_size
+        self.rebuilds = 0
+        self.reinserts = 0
+        self._region_size = None
+        self._cells:_ext.typing.Dict[_ext.typing.Tuple[int, int], _ext.typing.Dict[int, int]] = {}
+        # id(item) -> (draw order, item, bounds, cells)
+        self._entries:_ext.typing.Dict[int, tuple] = {}
+
+    def __len__(self)->int:
+        return len(self._entries)
+
+    def _cells_of(self, bounds:Bounds)->_ext.typing.List[_ext.typing.Tuple[int, int]]:
+        size = self.cell_size
+        left, bottom, right, top = bounds
+        x0, y0 = int(_ext.math.floor(left / size)), int(_ext.math.floor(bottom / size))
+        x1, y1 = int(_ext.math.floor(right / size)), int(_ext.math.floor(top / size))
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def _remove(self, key:int):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for cell in entry[3]:
+            members = self._cells.get(cell)
+            if members is not None:
+                members.pop(key, None)
+                if not members:
+                    del self._cells[cell]
+
+    def _insert(self, order:int, item, viewport):
+        key = id(item)
+        self._remove(key)
+        bounds = item_pick_bounds(item, viewport)
+        cells = set()
+        for rect in bounds:
+            cells.update(self._cells_of(rect))
+        for cell in cells:
+            self._cells.setdefault(cell, {})[key] = order
+        self._entries[key] = (order, item, bounds, cells)
+
+    def update(self, viewport, items:_ext.typing.Sequence, changed:_ext.typing.Optional[_ext.typing.Iterable]=None):
+        """ Bring the index up to date with the layout
+
+        Args:
+            viewport (BlenderViewport): viewport items are drawn in
+            items (List[HudItem]): all pickable items in draw order
+            changed (Iterable[HudItem], optional): items whose layout changed, None rebuilds everything
+        """
+        region_size = tuple(viewport.rect().size)
+        if changed is None or region_size != self._region_size or len(items) != len(self._entries):
+            self._region_size = region_size
+            self._cells.clear()
+            self._entries.clear()
+            for order, item in enumerate(items):
+                self._insert(order, item, viewport)
+            self.rebuilds += 1
+            return
+
+        for item in changed:
+            entry = self._entries.get(id(item))
+            if entry is None:
+                continue
+            self._insert(entry[0], item, viewport)
+            self.reinserts += 1
+
+    def query(self, position)->_ext.typing.List:
+        """ Items whose pick bounds contain a screen position, topmost first
+
+        Args:
+            position (Vector2f): screen position
+
+        Returns:
+            List[HudItem]
+        """
+        x, y = float(position[0]), float(position[1])
+        size = self.cell_size
+        members = self._cells.get((int(_ext.math.floor(x / size)), int(_ext.math.floor(y / size))))
+        if not members:
+            return []
+        hits = []
+        for key, order in members.items():
+            _, item, bounds, _ = self._entries[key]
+            for left, bottom, right, top in bounds:
+                if left <= x <= right and bottom <= y <= top:
+                    hits.append((order, item))
+                    break
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return [item for _, item in hits]
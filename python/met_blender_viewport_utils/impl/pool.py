@@ -0,0 +1,144 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Builtin shaders shared between shader wrappers
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    import hashlib
+    gpu = lazy_module("gpu")
+
+
+class ShaderPool:
+    """ One gpu shader per builtin name and config, shared by every wrapper that draws with it,
+    along with the uniform values last uploaded to each shader.
+
+    Wrappers only upload uniforms that differ from what the shader already holds. Uploads are only
+    tracked for shaders compiled by create, between begin_frame and end_frame, see GPUFrame.
+    Builtin shaders are shared with blender and other add-ons, which may bind them and set uniforms
+    at any time, so every uniform is uploaded to them, as it is outside a frame.
+
+    Properties:
+        created(int): number of shaders fetched or compiled from gpu.shader
+        uploads(int): number of uniform uploads made
+        skipped(int): number of uniform uploads avoided
+
+    Usage:
+        shader = SHADER_POOL.builtin("UNIFORM_COLOR")
+    """
+    def __init__(self):
+        self.created = 0
+        self.uploads = 0
+        self.skipped = 0
+        self._shaders:_ext.typing.Dict[_ext.typing.Tuple[str, _ext.typing.Optional[str]], _ext.gpu.types.GPUShader] = {}
+        # id(shader) -> uniform name -> frozen value
+        self._bound:_ext.typing.Dict[int, _ext.typing.Dict[str, _ext.typing.Hashable]] = {}
+        # id(shader) of shaders compiled by create, only these are used by nothing else
+        self._owned:_ext.typing.Set[int] = set()
+        self._depth = 0
+
+    def builtin(self, name:str, config:_ext.typing.Optional[str]=None)->_ext.gpu.types.GPUShader:
+        """ Get a builtin shader, fetching it on first use
+
+        Args:
+            name (str): builtin shader name, eg UNIFORM_COLOR
+            config (str, optional): shader config, eg CLIPPED
+
+        Returns:
+            gpu.types.GPUShader
+        """
+        key = (name, config)
+        shader = self._shaders.get(key)
+        if shader is None:
+            if config is None:
+                shader = _ext.gpu.shader.from_builtin(name)
+            else:
+                shader = _ext.gpu.shader.from_builtin(name, config=config)
+            self._shaders[key] = shader
+            self.created += 1
+        return shader
+
+    def create(self,
+               vertex_source:str,
+               fragment_source:str,
+               declare:_ext.typing.Callable[[_ext.gpu.types.GPUShaderCreateInfo], _ext.typing.Any])->_ext.gpu.types.GPUShader:
+        """ Compile a shader from a GPUShaderCreateInfo, each distinct set of sources is only compiled once per session
+
+        Args:
+            vertex_source (str): glsl main of the vertex stage
+            fragment_source (str): glsl main of the fragment stage
+            declare (Callable): adds the inputs, interfaces, constants and outputs to the create info.
+                Anything it returns, eg GPUStageInterfaceInfo objects, is kept alive until compiled.
+
+        Returns:
+            gpu.types.GPUShader
+        """
+        source = "\0".join((vertex_source, fragment_source, f"{declare.__module__}.{declare.__qualname__}"))
+        key = ("create_from_info", _ext.hashlib.sha1(source.encode("utf-8")).hexdigest())
+        shader = self._shaders.get(key)
+        if shader is None:
+            info = _ext.gpu.types.GPUShaderCreateInfo()
+            keep_alive = declare(info)
+            info.vertex_source(vertex_source)
+            info.fragment_source(fragment_source)
+            shader = _ext.gpu.shader.create_from_info(info)
+            del keep_alive
+            self._shaders[key] = shader
+            self._owned.add(id(shader))
+            self.created += 1
+        return shader
+
+    def begin_frame(self):
+        """ Start tracking uploaded uniforms, anything recorded before is unknown again """
+        if self._depth == 0:
+            self._bound.clear()
+        self._depth += 1
+
+    def end_frame(self):
+        """ Stop tracking uploaded uniforms once the outermost frame ends """
+        self._depth = max(self._depth - 1, 0)
+        if self._depth == 0:
+            self._bound.clear()
+
+    def bound_uniforms(self, shader:_ext.gpu.types.GPUShader)->_ext.typing.Optional[_ext.typing.Dict[str, _ext.typing.Hashable]]:
+        """ Uniform values uploaded to a shader this frame, to be updated by the caller
+
+        Args:
+            shader (gpu.types.GPUShader): shader being drawn
+
+        Returns:
+            Dict[str, Hashable], or None for builtin shaders and outside a frame, when nothing is known
+        """
+        if self._depth == 0 or id(shader) not in self._owned:
+            return None
+        bound = self._bound.get(id(shader))
+        if bound is None:
+            bound = self._bound[id(shader)] = {}
+        return bound
+
+    def invalidate(self, shader:_ext.typing.Optional[_ext.gpu.types.GPUShader]=None):
+        """ Forget uploaded uniforms, eg after drawing with a shader outside of the wrappers
+
+        Args:
+            shader (gpu.types.GPUShader, optional): only forget this shader, defaults to all shaders
+        """
+        if shader is None:
+            self._bound.clear()
+        else:
+            self._bound.pop(id(shader), None)
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for this pool
+
+        Returns:
+            Dict[str, int]
+        """
+        return {
+            "shaders": len(self._shaders),
+            "uniform_uploads": self.uploads,
+            "uniform_skipped": self.skipped,
+        }
+
+
+SHADER_POOL = ShaderPool()
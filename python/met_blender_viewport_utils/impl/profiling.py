@@ -0,0 +1,347 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Per frame timings and counters for the draw path
+"""
+class _ext:
+    """ External Dependencies """
+    import typing
+    import time
+    import json
+    import functools
+    import contextlib
+    from collections import deque
+    from met_viewport_utils.constants import Align
+    from met_viewport_utils.shape.rect import Rect
+    from met_viewport_utils.items.hud_item import HudItem
+    from .shader import GPUShader
+    from .drawlist import GPUDrawList
+    from .state import GPURestoreState
+    from . import font
+
+
+_DISABLED = _ext.contextlib.nullcontext()
+
+
+class _Frame:
+    """ Record of a single profiled frame """
+    __slots__ = ("name", "start", "duration", "events", "counters", "items", "_blf", "_measure")
+
+    def __init__(self, name:str, start:float):
+        self.name = name
+        self.start = start
+        self.duration = 0.0
+        # (name, category, start, duration)
+        self.events:_ext.typing.List[tuple] = []
+        self.counters:_ext.typing.Dict[str, int] = {
+            "draw_calls": 0, "batch_hits": 0, "batch_misses": 0, "blf_calls": 0, "measure_misses": 0}
+        # item label -> cpu seconds
+        self.items:_ext.typing.Dict[str, float] = {}
+        self._blf = _ext.font._BLF_STATS["calls"]
+        self._measure = _ext.font.MEASURE_CACHE.misses
+
+    def close(self, end:float):
+        self.duration = end - self.start
+        self.counters["blf_calls"] = _ext.font._BLF_STATS["calls"] - self._blf
+        self.counters["measure_misses"] = _ext.font.MEASURE_CACHE.misses - self._measure
+
+    def as_dict(self)->dict:
+        return {
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration * 1000.0,
+            "counters": dict(self.counters),
+            "items_ms": {label: seconds * 1000.0 for label, seconds in self.items.items()},
+            "events": [{"name": name, "category": category, "start": start, "duration_ms": duration * 1000.0}
+                       for name, category, start, duration in self.events],
+        }
+
+
+class _FrameScope:
+    def __init__(self, profiler:"Profiler", name:str):
+        self._profiler = profiler
+        self._name = name
+        self._nested = False
+        self._start = 0.0
+
+    def __enter__(self):
+        profiler = self._profiler
+        self._start = _ext.time.perf_counter()
+        self._nested = profiler._frame is not None
+        if not self._nested:
+            profiler._frame = _Frame(self._name, self._start)
+        return profiler._frame
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        profiler = self._profiler
+        end = _ext.time.perf_counter()
+        frame = profiler._frame
+        if frame is None:
+            return
+        if self._nested:
+            frame.events.append((self._name, "frame", self._start, end - self._start))
+            return
+        frame.close(end)
+        profiler._frame = None
+        profiler.frames.append(frame)
+
+
+class Profiler:
+    """ Collects per frame CPU timings, draw calls, batch cache hits and blf calls into a ring buffer.
+
+    Nothing is instrumented while disabled, enable() swaps timing wrappers onto GPUShader.draw,
+    GPUFont.draw and bounds, GPURestoreState, GPUDrawList.flush and the draw of any given item
+    classes, and disable() puts the originals back. Only calls made inside frame() are recorded.
+
+    Args:
+        capacity(int): number of frames kept
+
+    Properties:
+        enabled(bool): True while instrumented
+        frames(deque): most recent frame records, oldest first
+
+    Usage:
+        PROFILER.enable(item_classes=(HudMaskItem, FontItem))
+        def draw(self, context):
+            with PROFILER.frame("HudOverlayOperator.draw"):
+                ...
+        PROFILER.dump_chrome_trace("/tmp/hud.json")
+    """
+    def __init__(self, capacity:int=256):
+        self.enabled = False
+        self.frames = _ext.deque(maxlen=capacity)
+        self._frame:_ext.typing.Optional[_Frame] = None
+        # (owner, attribute, original or None if inherited)
+        self._patches:_ext.typing.List[tuple] = []
+
+    def frame(self, name:str="frame")->_ext.typing.ContextManager:
+        """ Scope of a draw callback, frames nested in another frame are recorded as events of it
+
+        Args:
+            name (str): name of the frame in exports
+
+        Returns:
+            ContextManager
+        """
+        if not self.enabled:
+            return _DISABLED
+        return _FrameScope(self, name)
+
+    def _event(self, name:str, category:str, start:float, end:float):
+        self._frame.events.append((name, category, start, end - start))
+
+    def _timed(self, function:_ext.typing.Callable, category:str, label:_ext.typing.Callable[[tuple], str]):
+        profiler = self
+
+        @_ext.functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if profiler._frame is None:
+                return function(*args, **kwargs)
+            start = _ext.time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler._event(label(args), category, start, _ext.time.perf_counter())
+        return wrapper
+
+    def _timed_item(self, function:_ext.typing.Callable):
+        profiler = self
+
+        @_ext.functools.wraps(function)
+        def wrapper(item, *args, **kwargs):
+            frame = profiler._frame
+            if frame is None:
+                return function(item, *args, **kwargs)
+            start = _ext.time.perf_counter()
+            try:
+                return function(item, *args, **kwargs)
+            finally:
+                end = _ext.time.perf_counter()
+                label = item_label(item)
+                frame.items[label] = frame.items.get(label, 0.0) + end - start
+                frame.events.append((label, "item", start, end - start))
+        return wrapper
+
+    def _counted_draw(self, function:_ext.typing.Callable):
+        profiler = self
+
+        @_ext.functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if profiler._frame is not None:
+                profiler._frame.counters["draw_calls"] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def _counted_batch(self, function:_ext.typing.Callable):
+        profiler = self
+
+        @_ext.functools.wraps(function)
+        def wrapper(shader, *args, **kwargs):
+            frame = profiler._frame
+            if frame is None:
+                return function(shader, *args, **kwargs)
+            misses = shader.batch_cache.misses
+            try:
+                return function(shader, *args, **kwargs)
+            finally:
+                key = "batch_misses" if shader.batch_cache.misses != misses else "batch_hits"
+                frame.counters[key] += 1
+        return wrapper
+
+    def _patch(self, owner:type, attribute:str, wrapper:_ext.typing.Callable):
+        original = owner.__dict__.get(attribute)
+        self._patches.append((owner, attribute, original))
+        setattr(owner, attribute, wrapper(getattr(owner, attribute)))
+
+    def enable(self, item_classes:_ext.typing.Iterable[type]=()):
+        """ Instrument the draw path
+
+        Args:
+            item_classes (Iterable[type]): HudItem classes whose draw is timed per item
+        """
+        if self.enabled:
+            self.disable()
+        shader_label = lambda args: f"{type(args[0]).__name__}.draw"
+        self._patch(_ext.GPUShader, "draw", lambda function: self._timed(function, "shader", shader_label))
+        self._patch(_ext.GPUShader, "_draw_batch", self._counted_draw)
+        self._patch(_ext.GPUShader, "_batch", self._counted_batch)
+        self._patch(_ext.font.GPUFont, "draw", lambda function: self._timed(function, "font", lambda _: "GPUFont.draw"))
+        self._patch(_ext.font.GPUFont, "bounds", lambda function: self._timed(function, "font", lambda _: "GPUFont.bounds"))
+        self._patch(_ext.GPURestoreState, "__enter__",
+                    lambda function: self._timed(function, "state", lambda _: "GPURestoreState"))
+        self._patch(_ext.GPUDrawList, "flush",
+                    lambda function: self._timed(function, "drawlist", lambda _: "GPUDrawList.flush"))
+        for cls in item_classes:
+            self._patch(cls, "draw", self._timed_item)
+        self.enabled = True
+
+    def disable(self):
+        """ Remove all instrumentation, recorded frames are kept """
+        for owner, attribute, original in reversed(self._patches):
+            if original is None:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, original)
+        self._patches.clear()
+        self._frame = None
+        self.enabled = False
+
+    def clear(self):
+        """ Drop recorded frames """
+        self.frames.clear()
+
+    def summary(self)->_ext.typing.Dict[str, float]:
+        """ Averages over the recorded frames
+
+        Returns:
+            Dict[str, float]
+        """
+        frames = list(self.frames)
+        if not frames:
+            return {}
+        count = len(frames)
+        summary = {
+            "frames": count,
+            "frame_ms": sum(frame.duration for frame in frames) * 1000.0 / count,
+            "frame_ms_max": max(frame.duration for frame in frames) * 1000.0,
+            "last_frame_ms": frames[-1].duration * 1000.0,
+        }
+        for key in frames[-1].counters:
+            summary[key] = sum(frame.counters[key] for frame in frames) / count
+        return summary
+
+    def slowest_items(self, count:int=5)->_ext.typing.List[_ext.typing.Tuple[str, float]]:
+        """ Items with the highest average CPU time over the recorded frames
+
+        Returns:
+            List[Tuple[str, float]] item label and milliseconds
+        """
+        totals:_ext.typing.Dict[str, float] = {}
+        for frame in self.frames:
+            for label, seconds in frame.items.items():
+                totals[label] = totals.get(label, 0.0) + seconds
+        frames = max(len(self.frames), 1)
+        ranked = sorted(totals.items(), key=lambda pair: pair[1], reverse=True)[:count]
+        return [(label, seconds * 1000.0 / frames) for label, seconds in ranked]
+
+    def to_json(self)->dict:
+        """ Recorded frames as plain data """
+        return {"summary": self.summary(), "frames": [frame.as_dict() for frame in self.frames]}
+
+    def to_chrome_trace(self)->dict:
+        """ Recorded frames in the chrome://tracing and perfetto event format """
+        events = []
+        for frame in self.frames:
+            events.append({"name": frame.name, "cat": "frame", "ph": "X", "pid": 0, "tid": 0,
+                           "ts": frame.start * 1e6, "dur": frame.duration * 1e6})
+            for name, category, start, duration in frame.events:
+                events.append({"name": name, "cat": category, "ph": "X", "pid": 0, "tid": 0,
+                               "ts": start * 1e6, "dur": duration * 1e6})
+            events.append({"name": "counters", "ph": "C", "pid": 0, "tid": 0,
+                           "ts": frame.start * 1e6, "args": dict(frame.counters)})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump_json(self, path:str):
+        """ Write to_json() to a file """
+        with open(path, "w", encoding="utf-8") as handle:
+            _ext.json.dump(self.to_json(), handle, indent=2)
+
+    def dump_chrome_trace(self, path:str):
+        """ Write to_chrome_trace() to a file """
+        with open(path, "w", encoding="utf-8") as handle:
+            _ext.json.dump(self.to_chrome_trace(), handle)
+
+
+def item_label(item)->str:
+    """ Name of an item in profiles, its name attribute if it has one """
+    name = getattr(item, "name", None)
+    if isinstance(name, str) and name:
+        return name
+    return f"{type(item).__name__}#{id(item):x}"
+
+
+PROFILER = Profiler()
+
+
+class ProfilerStatsItem(_ext.HudItem):
+    """ On screen readout of a profiler's recent frames
+
+    Args:
+        font(GPUFont): font to draw with, lines are drawn from the top left of the item
+        profiler(Profiler): profiler to read, defaults to PROFILER
+        items(int): number of slowest items listed
+    """
+    def __init__(self, font, profiler:Profiler=None, items:int=3):
+        super().__init__()
+        self.font = font.copy()
+        self.font.align = _ext.Align.BottomLeft
+        self.profiler = profiler or PROFILER
+        self.items = items
+
+    def redraw_key(self):
+        # Changes with every recorded frame so redraw trackers and compositors refresh the readout
+        frames = self.profiler.frames
+        return frames[-1].start if frames else None
+
+    def lines(self)->_ext.typing.List[str]:
+        """ Text shown by this item """
+        summary = self.profiler.summary()
+        if not summary:
+            return ["profiler: no frames" if self.profiler.enabled else "profiler: disabled"]
+        lines = [
+            f"frame {summary['last_frame_ms']:.2f}ms  avg {summary['frame_ms']:.2f}ms  max {summary['frame_ms_max']:.2f}ms",
+            f"draws {summary['draw_calls']:.0f}  batches {summary['batch_hits']:.0f} hit {summary['batch_misses']:.0f} miss",
+            f"blf {summary['blf_calls']:.0f}  measured {summary['measure_misses']:.0f}",
+        ]
+        for label, milliseconds in self.profiler.slowest_items(self.items):
+            lines.append(f"{label} {milliseconds:.3f}ms")
+        return lines
+
+    def screen_rect(self, viewport)->_ext.Rect:
+        return _ext.Rect(self.position, self.size)
+
+    def draw(self, viewport):
+        rect = self.screen_rect(viewport)
+        line_height = self.font.point_size * 1.4
+        x, y = rect.left(), rect.top()
+        for line in self.lines():
+            y -= line_height
+            self.font.draw(line, (x, y))
@@ -0,0 +1,102 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Track visual changes of HUD items so redraws are only requested when needed
+"""
+class _ext:
+    """ External Dependencies """
+    import typing
+    from .cache import freeze
+
+# Font properties that change how text is drawn, the family, weight and style select the file
+_FONT_PROPERTIES = ("family", "weight", "style", "point_size", "angle", "align",
+                    "color", "shadow_color", "shadow_offset", "shadow_blur", "retained")
+
+
+def font_signature(font)->_ext.typing.Hashable:
+    """ Values of a font that affect how its text is drawn
+
+    Args:
+        font (GPUFont): font to inspect, may be None
+
+    Returns:
+        Hashable
+    """
+    if font is None:
+        return None
+    return tuple(_ext.freeze(getattr(font, name, None)) for name in _FONT_PROPERTIES)
+
+
+def item_signature(item)->_ext.typing.Hashable:
+    """ Values that affect how an item is drawn.
+    Text items are compared by their text and font, other items may define a redraw_key() method
+    returning extra hashable state, eg the active handle.
+
+    Args:
+        item (HudItem): item to inspect
+
+    Returns:
+        Hashable
+    """
+    signature = (
+        int(item.state),
+        _ext.freeze(item.position),
+        _ext.freeze(item.size),
+        _ext.freeze(getattr(item, "margins", None)),
+        _ext.freeze(getattr(item, "text", None)),
+        font_signature(getattr(item, "font", None)),
+    )
+    redraw_key = getattr(item, "redraw_key", None)
+    if redraw_key is not None:
+        signature += (redraw_key(),)
+    return signature
+
+
+class RedrawTracker:
+    """ Compares item signatures between events and reports which items visually changed
+
+    Properties:
+        requested(int): number of checks that found a change
+        skipped(int): number of checks that found nothing to redraw
+
+    Usage:
+        if tracker.changed(items):
+            context.area.tag_redraw()
+    """
+    def __init__(self):
+        self.requested = 0
+        self.skipped = 0
+        self._signatures:_ext.typing.Dict[int, _ext.typing.Hashable] = {}
+        self._items:_ext.typing.Dict[int, _ext.typing.Any] = {}
+
+    def changed(self, items:_ext.typing.Iterable)->_ext.typing.List:
+        """ Get the items whose signature changed since the last call and record the new signatures
+
+        Args:
+            items (Iterable[HudItem]): items to check
+
+        Returns:
+            List[HudItem]
+        """
+        changed = []
+        seen = set()
+        for item in items:
+            key = id(item)
+            seen.add(key)
+            signature = item_signature(item)
+            if self._signatures.get(key) != signature:
+                self._signatures[key] = signature
+                self._items[key] = item
+                changed.append(item)
+        for key in set(self._signatures) - seen:
+            # Removed items need a redraw to disappear
+            del self._signatures[key]
+            changed.append(self._items.pop(key))
+        if changed:
+            self.requested += 1
+        else:
+            self.skipped += 1
+        return changed
+
+    def invalidate(self):
+        """ Forget all signatures so the next check reports everything as changed """
+        self._signatures.clear()
+        self._items.clear()
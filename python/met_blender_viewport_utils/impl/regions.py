@@ -0,0 +1,160 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Per region partitions of the draw path caches, so several 3D views do not evict each other
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    import typing
+    from .cache import LRUCache
+
+
+def region_key(region)->_ext.typing.Hashable:
+    """ Stable key of a blender region for as long as it exists
+
+    Args:
+        region (bpy.types.Region): region to identify
+
+    Returns:
+        Hashable
+    """
+    try:
+        return region.as_pointer()
+    except (AttributeError, ReferenceError):
+        return id(region)
+
+
+def view_signature(region, region_3d=None)->_ext.typing.Hashable:
+    """ Cheap signature of what a region shows, its size and for 3D regions the view matrix.
+    The window (projection) matrix is included too so lens and zoom changes are caught,
+    reading the matrix values is much cheaper than anything derived from them.
+
+    Args:
+        region (bpy.types.Region): region drawn
+        region_3d (bpy.types.RegionView3D, optional): view of the region
+
+    Returns:
+        Hashable
+    """
+    signature = (region.width, region.height)
+    if region_3d is not None:
+        signature += (region_3d.view_perspective,
+                      tuple(value for row in region_3d.view_matrix for value in row),
+                      tuple(value for row in region_3d.window_matrix for value in row))
+    return signature
+
+
+class RegionScope:
+    """ Marks the region being drawn, RegionPartitions.get uses it when no key is given.
+    GPUFrame enters one for its viewport, so handlers drawn in several regions keep separate caches.
+
+    Args:
+        key(Hashable): region key, see region_key
+
+    Usage:
+        with RegionScope(region_key(context.region)):
+            shader.draw(vertex_in)
+    """
+    _active:_ext.typing.List[_ext.typing.Hashable] = []
+
+    def __init__(self, key:_ext.typing.Hashable):
+        self.key = key
+
+    @classmethod
+    def active(cls)->_ext.typing.Optional[_ext.typing.Hashable]:
+        """ Key of the innermost region being drawn, None outside of any scope
+
+        Returns:
+            Hashable or None
+        """
+        return cls._active[-1] if cls._active else None
+
+    def __enter__(self)->"RegionScope":
+        self._active.append(self.key)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._active.pop()
+
+
+class RegionPartitions:
+    """ One value per region, created on first use. The least recently drawn regions are dropped
+    so closed areas do not keep their caches alive.
+
+    A signature may be passed with each lookup, the region's value is then created again
+    whenever the signature differs from the one it was created with, eg view_signature.
+
+    Args:
+        factory(Callable[[], Any]): creates the value for a new region
+        capacity(int): number of regions kept
+        on_evict(Callable): run with (key, value) when a region's value is dropped or replaced
+
+    Properties:
+        invalidations(int): number of values replaced because their signature changed
+
+    Usage:
+        batches = RegionPartitions(lambda: LRUCache(8))
+        cache = batches.get()  # the partition of the region being drawn
+    """
+    def __init__(self, factory:_ext.typing.Callable[[], _ext.typing.Any], capacity:int=8,
+                 on_evict:_ext.typing.Optional[_ext.typing.Callable[[_ext.typing.Any, _ext.typing.Any], None]]=None):
+        self._factory = factory
+        self._on_evict = on_evict
+        self._partitions = _ext.LRUCache(capacity, on_evict=self._evicted)
+        self._signatures:_ext.typing.Dict[_ext.typing.Hashable, _ext.typing.Hashable] = {}
+        self.invalidations = 0
+
+    def __len__(self)->int:
+        return len(self._partitions)
+
+    def _evicted(self, key:_ext.typing.Hashable, value):
+        self._signatures.pop(key, None)
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+
+    def get(self, key:_ext.typing.Optional[_ext.typing.Hashable]=None,
+            signature:_ext.typing.Optional[_ext.typing.Hashable]=None):
+        """ The value of a region, created if the region is new or its signature changed
+
+        Args:
+            key (Hashable, optional): region key, defaults to the active RegionScope
+            signature (Hashable, optional): state the value depends on, None skips the check
+
+        Returns:
+            Any
+        """
+        if key is None:
+            key = RegionScope.active()
+        value = self._partitions.get(key)
+        if value is not None and signature is not None and self._signatures.get(key) != signature:
+            self.invalidations += 1
+            if self._on_evict is not None:
+                self._on_evict(key, value)
+            value = None
+        if value is None:
+            value = self._factory()
+            self._partitions.put(key, value)
+        if signature is not None:
+            self._signatures[key] = signature
+        return value
+
+    def values(self)->_ext.typing.List:
+        """ Values of every region kept
+
+        Returns:
+            List[Any]
+        """
+        return [value for _, value in self._partitions.items()]
+
+    def clear(self):
+        """ Drop every region's value """
+        for key, value in self._partitions.items():
+            self._evicted(key, value)
+        self._partitions.clear()
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for these partitions
+
+        Returns:
+            Dict[str, int]
+        """
+        return {"regions": len(self._partitions), "region_invalidations": self.invalidations}
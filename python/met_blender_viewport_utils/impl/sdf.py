@@ -0,0 +1,201 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Signed distance shapes, rects, rounded rects, borders and outlines drawn as one quad each
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    import functools
+    gpu = lazy_module("gpu")
+    np = lazy_module("numpy")
+    from met_viewport_utils.constants import GPUShaderPrimitiveType, GPUShaderState
+    from met_viewport_utils.shape.rect import Rect
+    from met_viewport_utils.algorithm.color import parse_color
+    from .shader import GPUShader
+    from .pool import SHADER_POOL
+    from .uniforms import FRAME_UNIFORMS
+
+
+_VERTEX_SOURCE = """
+void main()
+{
+  v_local = pos - rect.xy;
+  v_half = rect.zw;
+  v_params = params;
+  v_fill = fill_color;
+  v_border = border_color;
+  gl_Position = ModelViewProjectionMatrix * vec4(pos, 0.0, 1.0);
+}
+"""
+
+_FRAGMENT_SOURCE = """
+float rounded_box(vec2 point, vec2 half_size, float radius)
+{
+  vec2 q = abs(point) - half_size + radius;
+  return length(max(q, 0.0)) + min(max(q.x, q.y), 0.0) - radius;
+}
+
+void main()
+{
+  float radius = clamp(v_params.x, 0.0, min(v_half.x, v_half.y));
+  float border = v_params.y;
+  float softness = max(v_params.z, 1e-4);
+  float dist = rounded_box(v_local, v_half, radius);
+  vec4 color = v_fill;
+  if (border > 0.0) {
+    float inside = clamp(0.5 - (dist + border) / softness, 0.0, 1.0);
+    color = mix(v_border, v_fill, inside);
+  }
+  float coverage = clamp(0.5 - dist / softness, 0.0, 1.0);
+  fragColor = vec4(color.rgb, color.a * coverage * frame.opacity);
+  if (fragColor.a <= 0.0) {
+    discard;
+  }
+}
+"""
+
+# Two triangles per shape, corners counter clockwise from the bottom left
+_CORNERS = ((-1.0, -1.0), (1.0, -1.0), (1.0, 1.0), (-1.0, 1.0))
+_QUAD_INDICES = ((0, 1, 2), (0, 2, 3))
+
+
+def _declare(info:_ext.gpu.types.GPUShaderCreateInfo):
+    interface = _ext.gpu.types.GPUStageInterfaceInfo("sdf_shape_interface")
+    interface.smooth("VEC2", "v_local")
+    interface.flat("VEC2", "v_half")
+    interface.flat("VEC4", "v_params")
+    interface.flat("VEC4", "v_fill")
+    interface.flat("VEC4", "v_border")
+    _ext.FRAME_UNIFORMS.declare(info, slot=0)
+    info.push_constant("MAT4", "ModelViewProjectionMatrix")
+    info.vertex_in(0, "VEC2", "pos")
+    info.vertex_in(1, "VEC4", "rect")
+    info.vertex_in(2, "VEC4", "params")
+    info.vertex_in(3, "VEC4", "fill_color")
+    info.vertex_in(4, "VEC4", "border_color")
+    info.vertex_out(interface)
+    info.fragment_out(0, "VEC4", "fragColor")
+    return interface
+
+
+def _colors(color, count:int)->_ext.np.ndarray:
+    """ One rgba color per shape from a single color or a color per shape """
+    if isinstance(color, str):
+        color = _ext.parse_color(color)
+    colors = _ext.np.asarray(color, dtype=_ext.np.float32)
+    if colors.shape[-1] == 3:
+        colors = _ext.np.concatenate((colors, _ext.np.ones(colors.shape[:-1] + (1,), dtype=_ext.np.float32)), axis=-1)
+    return _ext.np.broadcast_to(colors, (count, 4))
+
+
+def shape_vertices(rects:_ext.typing.Sequence[_ext.Rect],
+                   radius:_ext.typing.Union[float, _ext.typing.Sequence[float]]=0.0,
+                   border:_ext.typing.Union[float, _ext.typing.Sequence[float]]=0.0,
+                   fill=(1.0, 1.0, 1.0, 1.0),
+                   border_color=(0.0, 0.0, 0.0, 0.0),
+                   softness:float=1.0)->_ext.typing.Tuple[_ext.typing.Dict[str, _ext.np.ndarray], _ext.np.ndarray]:
+    """Vertex inputs for SDFShapeShader, four vertices per shape whatever its radius or border
+
+    Args:
+        rects (List[Rect]): shape bounds in screen space
+        radius (float|List[float]): corner radius, per shape or shared
+        border (float|List[float]): border width inside the bounds, 0 for no border
+        fill (Color|List[Color]): fill color, use a transparent fill for outlines
+        border_color (Color|List[Color]): border color
+        softness (float): anti-aliased edge width in pixels
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], np.ndarray]: vertex_in and triangle indices
+    """
+    count = len(rects)
+    np = _ext.np
+    boxes = np.array([(rect.left(), rect.bottom(), rect.width, rect.height) for rect in rects],
+                     dtype=np.float32).reshape(-1, 4)
+    half = boxes[:, 2:] * 0.5
+    center = boxes[:, :2] + half
+    # Grow the quad so the anti-aliased edge is not clipped
+    corners = np.array(_CORNERS, dtype=np.float32)
+    positions = center[:, None, :] + corners[None, :, :] * (half[:, None, :] + softness)
+    params = np.zeros((count, 4), dtype=np.float32)
+    params[:, 0] = radius
+    params[:, 1] = border
+    params[:, 2] = softness
+    vertex_in = {
+        "pos": positions.reshape(-1, 2),
+        "rect": np.repeat(np.concatenate((center, half), axis=1), 4, axis=0),
+        "params": np.repeat(params, 4, axis=0),
+        "fill_color": np.repeat(_colors(fill, count), 4, axis=0),
+        "border_color": np.repeat(_colors(border_color, count), 4, axis=0),
+    }
+    indices = (np.arange(count, dtype=np.uint32)[:, None, None] * 4 +
+               np.array(_QUAD_INDICES, dtype=np.uint32)[None]).reshape(-1, 3)
+    return vertex_in, indices
+
+
+class SDFShapeShader(_ext.GPUShader):
+    """
+    Draw rects, rounded rects, borders and outlines in screen space as one anti-aliased quad per shape.
+    The shape is evaluated per pixel from a signed distance, so corners stay smooth at any size without
+    tessellation. Every parameter is a vertex input, so shapes with different colors and radii
+    drawn in a frame merge into a single draw through GPUDrawList.
+
+    The compiled shader is shared through SHADER_POOL, keyed by the hash of its sources.
+    Alpha is scaled by FRAME_UNIFORMS.opacity.
+
+    ShaderParams:
+        pos: in vec2
+        rect: in vec4, center and half size
+        params: in vec4, radius, border width and softness
+        fill_color: in vec4
+        border_color: in vec4
+
+    Usage:
+        shader = SDFShapeShader()
+        shader.draw_rects([rect], radius=4.0, border=1.0, fill="#00000080", border_color="#FFFFFF")
+    """
+    primitive_type = _ext.GPUShaderPrimitiveType.Tris
+    mergeable = True
+
+    def __init__(self):
+        super().__init__(_ext.functools.partial(
+            _ext.SHADER_POOL.create, _VERTEX_SOURCE, _FRAGMENT_SOURCE, _declare))
+        self.state = _ext.GPUShaderState.UseAlpha
+        self.bind_block(_ext.FRAME_UNIFORMS.name, _ext.FRAME_UNIFORMS)
+
+    def draw_rects(self,
+                   rects:_ext.typing.Sequence[_ext.Rect],
+                   radius:_ext.typing.Union[float, _ext.typing.Sequence[float]]=0.0,
+                   border:_ext.typing.Union[float, _ext.typing.Sequence[float]]=0.0,
+                   fill=(1.0, 1.0, 1.0, 1.0),
+                   border_color=(0.0, 0.0, 0.0, 0.0),
+                   softness:float=1.0,
+                   batch_key:_ext.typing.Optional[_ext.typing.Hashable]=None):
+        """Draw shapes, see shape_vertices for the arguments
+
+        Args:
+            batch_key (Hashable, optional): key identifying these shapes in the batch cache
+        """
+        if not rects:
+            return
+        vertex_in, indices = shape_vertices(rects, radius, border, fill, border_color, softness)
+        self.draw(vertex_in, indices=indices, batch_key=batch_key)
+
+    def draw_outline(self,
+                     rect:_ext.Rect,
+                     width:float=1.0,
+                     color=(1.0, 1.0, 1.0, 1.0),
+                     radius:float=0.0,
+                     softness:float=1.0,
+                     batch_key:_ext.typing.Optional[_ext.typing.Hashable]=None):
+        """Draw an unfilled outline inside a rect
+
+        Args:
+            rect (Rect): outer bounds
+            width (float): outline width in pixels
+            color (Color): outline color
+            radius (float): corner radius
+            softness (float): anti-aliased edge width in pixels
+            batch_key (Hashable, optional): key identifying this outline in the batch cache
+        """
+        self.draw_rects([rect], radius, width, (0.0, 0.0, 0.0, 0.0), color, softness, batch_key)
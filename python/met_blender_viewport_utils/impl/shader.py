@@ -1,16 +1,24 @@
 # copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+from __future__ import annotations
 class _ext:
     """ External Dependencies """
-    import gpu
-    import bpy
+    from .lazy import lazy_module
+    gpu = lazy_module("gpu")
+    bpy = lazy_module("bpy")
     import typing
-    import numpy as np
-    from gpu_extras.batch import batch_for_shader
+    np = lazy_module("numpy")
+    batch = lazy_module("gpu_extras.batch")
     from met_viewport_utils.constants import (
         GPUShaderPrimitiveType,
         GPUShaderUniformType,
         GPUShaderState)
-    from .state import GPURestoreState
+    from .state import GPURestoreState, set_size
+    from .cache import LRUCache, digest, freeze
+    from .pool import SHADER_POOL
+    from .uniforms import UniformBlock
+    from .buffer import GPUDynamicBatch, contiguous_vertex_in, batch_from_arrays
+    from .drawlist import GPUDrawList
+    from .regions import RegionPartitions
     from met_viewport_utils.interfaces import IGPUShader
 
 
@@ -18,57 +26,98 @@ class GPUShader(_ext.IGPUShader):
     """ Simple wrapper around a blender GPU shader draw
     
     Args:
-        shader(GPUShader): Shader to draw
+        shader(GPUShader|Callable): Shader to draw, builtin shaders should come from SHADER_POOL so wrappers share them.
+            A function returning the shader defers creating it until first use, eg when the wrapper
+            is made at registration time without a gpu context.
     
     Properties:
-        shader(GPUShader): Internal shader
+        shader(GPUShader): Internal shader, created on first access when a function was given
         primitive(GPUShaderPrimitiveType): primitive drawing type
         state(GPUShaderState): Optional state to set while drawing this shader
         size(float): Width of points or lines
+        batch_cache(LRUCache): Recently drawn batches of the region being drawn, keyed by content digest or batch_key.
+            Each region drawn through GPUFrame(viewport=...) has its own cache so views do not evict each other.
+        uniform_values(Dict[str, Any]): Last value set for each uniform
+        uniform_blocks(Dict[str, UniformBlock]): Shared uniform blocks bound by name, see bind_block
+        mergeable(bool): If true, a GPUDrawList may concatenate draws of this shader into one batch
     """
-    # Set the typing on the root
-    shader:_ext.gpu.types.GPUShader = None  # Internal shader pointer
+    _shader:_ext.typing.Union[_ext.gpu.types.GPUShader, _ext.typing.Callable, None] = None  # Internal shader or its factory
+    batch_cache_size:int = 8  # Number of batches kept per shader and region
+    mergeable:bool = False
 
     def __init__(self, shader:_ext.gpu.types.GPUShader):
+        self.uniform_values = {}
+        self.uniform_blocks = {}
         super().__init__(shader)
-        self._last_batch = None
-        
+        self._batch_caches = _ext.RegionPartitions(lambda: _ext.LRUCache(self.batch_cache_size))
+
+    @property
+    def shader(self)->_ext.gpu.types.GPUShader:
+        shader = self._shader
+        if callable(shader):
+            shader = self._shader = shader()
+        return shader
+
+    @shader.setter
+    def shader(self, shader:_ext.typing.Union[_ext.gpu.types.GPUShader, _ext.typing.Callable]):
+        self._shader = shader
+
+    @property
+    def batch_cache(self)->_ext.LRUCache:
+        return self._batch_caches.get()
     
     def _batch(self,
                vertex_in:_ext.typing.Dict[str, _ext.typing.Any],
                primitive_type:_ext.GPUShaderPrimitiveType,
-               indices:_ext.typing.Optional[_ext.typing.List[int]]=None)->_ext.gpu.types.GPUBatch:
-        """Batch the shader for processing
+               indices:_ext.typing.Optional[_ext.typing.List[int]]=None,
+               batch_key:_ext.typing.Optional[_ext.typing.Hashable]=None)->_ext.gpu.types.GPUBatch:
+        """Batch the shader for processing, batches are reused while their inputs are unchanged.
+        Contiguous float32 inputs and uint32 indices fill the buffers directly, see contiguous_vertex_in.
 
         Args:
             vertex_in (Dict[str, Any]): vertex shader inputs
             primitive_type (GPUShaderPrimitiveType): primitive type to draw
             indices (List[int], optional): Optional indices to pass for mapping inputs
+            batch_key (Hashable, optional): Caller supplied key, skips hashing the inputs.
+                The caller is responsible for changing the key when the geometry changes.
 
         Returns:
             gpu.types.GPUBatch
         """
-
-        if not self._last_batch:
-            batch = _ext.batch_for_shader(self.shader, primitive_type.value, vertex_in, indices=indices)
-            self._last_batch = [batch, primitive_type, vertex_in, indices]
-            return batch
-
-        last_batch, last_primitive, last_vertex_in, last_indices = self._last_batch
-        try:
-            # There may be numpy arrays, this is a lazy equality operator
-            _ext.np.testing.assert_equal(vertex_in, last_vertex_in)
-            _ext.np.testing.assert_equal(indices, last_indices)
-        except AssertionError:
-            pass
+        if batch_key is None:
+            key = (primitive_type, _ext.digest(vertex_in), _ext.digest(indices))
         else:
-            if primitive_type == last_primitive:
-                return last_batch
+            key = (primitive_type, "key", batch_key)
 
-        batch = _ext.batch_for_shader(self.shader, primitive_type.value, vertex_in, indices=indices)
-        self._last_batch = [batch, primitive_type, vertex_in, indices]
+        cache = self.batch_cache
+        batch = cache.get(key)
+        if batch is None:
+            arrays = _ext.contiguous_vertex_in(self.shader, vertex_in)
+            if arrays is not None:
+                batch = _ext.batch_from_arrays(self.shader, primitive_type.value, arrays, indices)
+            else:
+                batch = _ext.batch.batch_for_shader(self.shader, primitive_type.value, vertex_in, indices=indices)
+            cache.put(key, batch)
         return batch
     
+    def set_uniform(self, name:str, value, *args, **kwargs):
+        self.uniform_values[name] = value
+        super().set_uniform(name, value, *args, **kwargs)
+        # The value may have been sent outside of _upload_uniforms, upload it again on the next draw
+        bound = _ext.SHADER_POOL.bound_uniforms(self.shader)
+        if bound is not None:
+            bound.pop(name, None)
+
+    def bind_block(self, name:str, block:_ext.UniformBlock):
+        """Read a shared uniform block in this shader, the block's contents are uploaded
+        once when they change rather than with every draw.
+
+        Args:
+            name (str): block instance name declared in the shader
+            block (UniformBlock): block to bind, eg FRAME_UNIFORMS
+        """
+        self.uniform_blocks[name] = block
+
     def _set_uniform_by_type(self, name:str, value):
         if isinstance(value, _ext.gpu.types.GPUTexture):
             self._uniform_types[name] = _ext.GPUShaderUniformType.Sampler
@@ -82,6 +131,7 @@ class GPUShader(_ext.IGPUShader):
              indices:_ext.typing.Optional[_ext.typing.List[int]]=None,
              size:_ext.typing.Optional[float]=None,
              state:_ext.typing.Optional[_ext.GPUShaderState]=None,
+             batch_key:_ext.typing.Optional[_ext.typing.Hashable]=None,
              **kwargs):
         """Draw this shader
 
@@ -91,18 +141,107 @@ class GPUShader(_ext.IGPUShader):
             indices (List[int], optional): indices map, optional
             size (float, optional): size override
             state (GPUShaderState, optional): state override
+            batch_key (Hashable, optional): key identifying this geometry in the batch cache
+        """
+        primitive_type = primitive_type or self.primitive_type
+        draw_list = _ext.GPUDrawList.active()
+        if draw_list is not None:
+            uniforms = dict(self.uniform_values)
+            uniforms.update(kwargs)
+            draw_list.add(self, vertex_in, primitive_type, indices, size=size, state=state,
+                          uniforms=uniforms, batch_key=batch_key)
+            return
+        self.draw_immediate(vertex_in, primitive_type, indices, size, state, batch_key, **kwargs)
+
+    def draw_immediate(self,
+                       vertex_in:_ext.typing.Dict[str, _ext.typing.Any],
+                       primitive_type:_ext.GPUShaderPrimitiveType=None,
+                       indices:_ext.typing.Optional[_ext.typing.List[int]]=None,
+                       size:_ext.typing.Optional[float]=None,
+                       state:_ext.typing.Optional[_ext.GPUShaderState]=None,
+                       batch_key:_ext.typing.Optional[_ext.typing.Hashable]=None,
+                       **kwargs):
+        """Draw this shader now, bypassing any active GPUDrawList
+
+        Args:
+            vertex_in (Dict[str, Any]): Inputs to vertex shader
+            primitive_type (GPUShaderPrimitiveType, optional): Primitive override
+            indices (List[int], optional): indices map, optional
+            size (float, optional): size override
+            state (GPUShaderState, optional): state override
+            batch_key (Hashable, optional): key identifying this geometry in the batch cache
         """
+        primitive_type = primitive_type or self.primitive_type
+        batch = self._batch(vertex_in, primitive_type, indices, batch_key)
+        self._draw_batch(batch, size=size, state=state, **kwargs)
+
+    def draw_batch(self,
+                   batch:_ext.gpu.types.GPUBatch,
+                   size:_ext.typing.Optional[float]=None,
+                   state:_ext.typing.Optional[_ext.GPUShaderState]=None,
+                   **kwargs):
+        """Draw a prepared batch with this shader
+
+        Args:
+            batch (gpu.types.GPUBatch): batch built for this shader
+            size (float, optional): size override
+            state (GPUShaderState, optional): state override
+        """
+        draw_list = _ext.GPUDrawList.active()
+        if draw_list is not None:
+            uniforms = dict(self.uniform_values)
+            uniforms.update(kwargs)
+            draw_list.add_callback(lambda: self._draw_batch(batch, size=size, state=state, **uniforms))
+            return
+        self._draw_batch(batch, size=size, state=state, **kwargs)
+
+    def _draw_batch(self, batch, size=None, state=None, **kwargs):
         if state is None:
             state = self.state
         if size is None:
             size = self.size
         if size:
-            _ext.gpu.state.line_width_set(size)
-            _ext.gpu.state.point_size_set(size)
-        primitive_type = primitive_type or self.primitive_type
-        batch = self._batch(vertex_in, primitive_type, indices)
-        self._prep_shader()
-        for key, value in kwargs.items():
-            self.set_uniform(key, value)
+            _ext.set_size(size)
+        if kwargs:
+            self.uniform_values.update(kwargs)
+        self._upload_uniforms()
         with _ext.GPURestoreState(state):
-            batch.draw(self.shader)
\ No newline at end of file
+            batch.draw(self.shader)
+
+    def _upload_uniforms(self):
+        """Bind the shader and upload the uniforms that differ from what it was last given this frame.
+        Wrappers sharing a compiled shader only pay for the uniforms that actually change between them,
+        builtin shaders are shared outside this package so every uniform is uploaded to them.
+        """
+        self.shader.bind()
+        pool = _ext.SHADER_POOL
+        bound = pool.bound_uniforms(self.shader)
+        for name, value in self.uniform_values.items():
+            # Samplers bind a texture unit when set, which other draws such as text rebind in between
+            if bound is not None and not isinstance(value, _ext.gpu.types.GPUTexture):
+                frozen = _ext.freeze(value)
+                if name in bound and bound[name] == frozen:
+                    pool.skipped += 1
+                    continue
+                bound[name] = frozen
+            self._set_uniform_by_type(name, value)
+            pool.uploads += 1
+        for name, block in self.uniform_blocks.items():
+            # Binding slots are global, so blocks are bound every draw, only their contents are diffed
+            self.shader.uniform_block(name, block.buffer())
+
+    def dynamic_batch(self,
+                      primitive_type:_ext.GPUShaderPrimitiveType=None,
+                      capacity:int=64,
+                      growth:float=2.0)->_ext.GPUDynamicBatch:
+        """Create a persistent batch that can be partially refilled without reallocating
+
+        Args:
+            primitive_type (GPUShaderPrimitiveType, optional): Primitive override
+            capacity (int): initial vertex capacity
+            growth (float): capacity multiplier when the buffer needs to grow
+
+        Returns:
+            GPUDynamicBatch
+        """
+        return _ext.GPUDynamicBatch(self, primitive_type, capacity=capacity, growth=growth)
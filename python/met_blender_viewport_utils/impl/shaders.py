@@ -1,14 +1,18 @@
 # copyright (c) 2024 Alex Telford, http://minimaleffort.tech
 """Built in shaders
 """
+from __future__ import annotations
 class _ext:
     """ External Dependencies """
+    from .lazy import lazy_module
     from .shader import GPUShader
+    import functools
+    from .pool import SHADER_POOL
     from met_viewport_utils.constants import (
         GPUShaderUniformType,
         GPUShaderPrimitiveType
     )
-    import gpu
+    gpu = lazy_module("gpu")
 
 class FlatColorShader(_ext.GPUShader):
     """
@@ -21,11 +25,12 @@ class FlatColorShader(_ext.GPUShader):
         color: in vec4
         pos: in vec3
     """
+    mergeable = True
     def __init__(self, polyline:bool=False):
         if polyline:
-            shader = _ext.gpu.shader.from_builtin('POLYLINE_FLAT_COLOR')
+            shader = _ext.functools.partial(_ext.SHADER_POOL.builtin, 'POLYLINE_FLAT_COLOR')
         else:
-            shader = _ext.gpu.shader.from_builtin('FLAT_COLOR')
+            shader = _ext.functools.partial(_ext.SHADER_POOL.builtin, 'FLAT_COLOR')
         super().__init__(shader)
 
 
@@ -42,9 +47,9 @@ class VertexColorShader(_ext.GPUShader):
     """
     def __init__(self, polyline:bool=False):
         if polyline:
-            shader = _ext.gpu.shader.from_builtin('POLYLINE_SMOOTH_COLOR')
+            shader = _ext.functools.partial(_ext.SHADER_POOL.builtin, 'POLYLINE_SMOOTH_COLOR')
         else:
-            shader = _ext.gpu.shader.from_builtin('SMOOTH_COLOR')
+            shader = _ext.functools.partial(_ext.SHADER_POOL.builtin, 'SMOOTH_COLOR')
         super().__init__(shader)
 
 
@@ -59,11 +64,12 @@ class UniformColorShader(_ext.GPUShader):
         color: uniform vec4
         pos: in vec3
     """
+    mergeable = True
     def __init__(self, polyline:bool=False):
         if polyline:
-            shader = _ext.gpu.shader.from_builtin('POLYLINE_UNIFORM_COLOR')
+            shader = _ext.functools.partial(_ext.SHADER_POOL.builtin, 'POLYLINE_UNIFORM_COLOR')
         else:
-            shader = _ext.gpu.shader.from_builtin('UNIFORM_COLOR')
+            shader = _ext.functools.partial(_ext.SHADER_POOL.builtin, 'UNIFORM_COLOR')
         super().__init__(shader)
         self._uniform_types["color"] = _ext.GPUShaderUniformType.Float
         
@@ -79,7 +85,7 @@ class ImageShader(_ext.GPUShader):
     """
     primitive_type = _ext.GPUShaderPrimitiveType.Tris
     def __init__(self):
-        shader = _ext.gpu.shader.from_builtin('IMAGE')
+        shader = _ext.functools.partial(_ext.SHADER_POOL.builtin, 'IMAGE')
         super().__init__(shader)
         self._uniform_types["sampler2D"] = _ext.GPUShaderUniformType.Sampler
         
@@ -96,7 +102,7 @@ class ImageUniformColorShader(_ext.GPUShader):
     """
     primitive_type = _ext.GPUShaderPrimitiveType.Tris
     def __init__(self):
-        shader = _ext.gpu.shader.from_builtin('IMAGE_COLOR')
+        shader = _ext.functools.partial(_ext.SHADER_POOL.builtin, 'IMAGE_COLOR')
         super().__init__(shader)
         self._uniform_types["color"] = _ext.GPUShaderUniformType.Float
         self._uniform_types["sampler2D"] = _ext.GPUShaderUniformType.Sampler
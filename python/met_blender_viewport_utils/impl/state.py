@@ -1,27 +1,235 @@
 # copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+from __future__ import annotations
 class _ext:
     """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    import contextlib
     from met_viewport_utils.constants import GPUShaderState
     from met_viewport_utils.interfaces import IGPURestoreState
-    import gpu
+    gpu = lazy_module("gpu")
+
+
+# Values set by each state flag when it is enabled
+_ENABLED_BLEND = "ALPHA"
+_ENABLED_DEPTH = ("LESS_EQUAL", True)
+
+
+class GPUStateTracker:
+    """Frame scoped tracker that only emits gpu state changes that are actually needed
+
+    While active, GPURestoreState and GPUShader sizes go through the tracker instead of
+    querying and restoring the gpu state around every draw. The state found on entry is
+    restored once on exit.
+
+    Properties:
+        changes(int): number of gpu state calls made
+        skipped(int): number of gpu state calls avoided
+
+    Usage:
+        with GPUStateTracker() as tracker:
+            for item in items:
+                item.draw(viewport)
+        print(tracker.skipped)
+    """
+    _active:_ext.typing.List["GPUStateTracker"] = []
+
+    def __init__(self):
+        self.changes = 0
+        self.skipped = 0
+        self._original = {}
+        self._current = {}
+        self._blend_overrides = []
+
+    @classmethod
+    def active(cls)->_ext.typing.Optional["GPUStateTracker"]:
+        """ The innermost active tracker, if any
+
+        Returns:
+            GPUStateTracker or None
+        """
+        return cls._active[-1] if cls._active else None
+
+    def __enter__(self)->"GPUStateTracker":
+        self._original = {
+            "blend": _ext.gpu.state.blend_get(),
+            "depth": (_ext.gpu.state.depth_test_get(), _ext.gpu.state.depth_mask_get()),
+            "line_width": _ext.gpu.state.line_width_get(),
+            # gpu.state has no getter for the point size, assume blender's default
+            "point_size": 1.0,
+        }
+        self._current = dict(self._original)
+        self._active.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._active.remove(self)
+        for key, value in self._original.items():
+            self._set(key, value)
+
+    def invalidate(self, *keys:str):
+        """ Forget the current value of gpu state changed outside the tracker, eg blf.draw resets blending.
+        The next draw needing that state sets it again.
+
+        Args:
+            keys (str): state to forget, one of blend, depth, line_width or point_size, defaults to all
+        """
+        for key in keys or tuple(self._current):
+            self._current.pop(key, None)
+
+    def _set(self, key:str, value):
+        if self._current.get(key) == value:
+            self.skipped += 1
+            return
+        self._current[key] = value
+        self.changes += 1
+        if key == "blend":
+            _ext.gpu.state.blend_set(value)
+        elif key == "depth":
+            depth_test, depth_mask = value
+            _ext.gpu.state.depth_test_set(depth_test)
+            _ext.gpu.state.depth_mask_set(depth_mask)
+        elif key == "line_width":
+            _ext.gpu.state.line_width_set(value)
+        elif key == "point_size":
+            _ext.gpu.state.point_size_set(value)
+
+    def apply(self, flags:_ext.GPUShaderState):
+        """ Transition to the state for the given flags, unset flags return to the frame's original state
+
+        Args:
+            flags (GPUShaderState): State flags to draw with
+        """
+        if self._blend_overrides:
+            self._set("blend", self._blend_overrides[-1])
+        elif flags and flags & _ext.GPUShaderState.UseAlpha:
+            self._set("blend", _ENABLED_BLEND)
+        else:
+            self._set("blend", self._original["blend"])
+        if flags and flags & _ext.GPUShaderState.UseDepth:
+            self._set("depth", _ENABLED_DEPTH)
+        else:
+            self._set("depth", self._original["depth"])
+
+    @_ext.contextlib.contextmanager
+    def blend_override(self, mode:str):
+        """ Force a blend mode for draws made inside this context, regardless of their state flags
+
+        Args:
+            mode (str): gpu.state.blend_set mode
+        """
+        previous = self._current.get("blend")
+        self._blend_overrides.append(mode)
+        try:
+            self._set("blend", mode)
+            yield
+        finally:
+            self._blend_overrides.pop()
+            if previous is not None:
+                self._set("blend", previous)
+            else:
+                self.invalidate("blend")
+
+    def line_width(self, width:float):
+        """ Set the line width if it differs from the current width """
+        self._set("line_width", width)
+
+    def point_size(self, size:float):
+        """ Set the point size if it differs from the current size """
+        self._set("point_size", size)
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for this tracker
+
+        Returns:
+            Dict[str, int]
+        """
+        return {"changes": self.changes, "skipped": self.skipped}
+
+
+def set_size(size:float):
+    """ Set the line width and point size, going through the active GPUStateTracker if there is one
+
+    Args:
+        size (float): Width of points or lines
+    """
+    tracker = GPUStateTracker.active()
+    if tracker is not None:
+        tracker.line_width(size)
+        tracker.point_size(size)
+    else:
+        _ext.gpu.state.line_width_set(size)
+        _ext.gpu.state.point_size_set(size)
+
+
+def invalidate_state(*keys:str):
+    """ Tell the active GPUStateTracker that drawing it does not track changed gpu state
+
+    Args:
+        keys (str): state that may have changed, see GPUStateTracker.invalidate
+    """
+    tracker = GPUStateTracker.active()
+    if tracker is not None:
+        tracker.invalidate(*keys)
+
+
+@_ext.contextlib.contextmanager
+def blend_override(mode:str):
+    """ Draw with a specific blend mode, going through the active GPUStateTracker if there is one
+
+    Args:
+        mode (str): gpu.state.blend_set mode
+    """
+    tracker = GPUStateTracker.active()
+    if tracker is not None:
+        with tracker.blend_override(mode):
+            yield
+        return
+    previous = _ext.gpu.state.blend_get()
+    _ext.gpu.state.blend_set(mode)
+    try:
+        yield
+    finally:
+        _ext.gpu.state.blend_set(previous)
 
 
 class GPURestoreState(_ext.IGPURestoreState):
     """Context manager to temporarily set and restore state while drawing
 
+    If a GPUStateTracker is active only the needed transitions are made and
+    restoring is left to the tracker.
+
     Args:
         flags (GpuShaderState): State flags to set
-    
+
     Usage:
         with GpuRestoreState(GpuShaderState.Alpha|GpuShaderState.Depth):
             batch.draw()
     """
+    def __init__(self, flags:_ext.GPUShaderState, *args, **kwargs):
+        super().__init__(flags, *args, **kwargs)
+        self._tracked_flags = flags
+        self._tracker = None
+
+    def __enter__(self):
+        self._tracker = GPUStateTracker.active()
+        if self._tracker is not None:
+            self._tracker.apply(self._tracked_flags)
+            return self
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._tracker is not None:
+            self._tracker = None
+            return None
+        return super().__exit__(exc_type, exc_value, traceback)
+
     def _get_state(cls, state:_ext.GPUShaderState):
         if state == _ext.GPUShaderState.UseAlpha:
             return _ext.gpu.state.blend_get()
         elif state == _ext.GPUShaderState.UseDepth:
             return (_ext.gpu.state.depth_test_get(), _ext.gpu.state.depth_mask_get())
-    
+
     def _set_state(cls, state:_ext.GPUShaderState, param):
         if state == _ext.GPUShaderState.UseAlpha:
             _ext.gpu.state.blend_set(param)
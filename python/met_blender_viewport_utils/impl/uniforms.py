@@ -0,0 +1,172 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Uniform blocks shared between shaders
+"""
+from __future__ import annotations
+class _ext:
+    """ External Dependencies """
+    from .lazy import lazy_module
+    import typing
+    gpu = lazy_module("gpu")
+    np = lazy_module("numpy")
+
+
+# glsl type -> (components, std140 alignment in floats)
+_LAYOUT = {
+    "float": (1, 1),
+    "int": (1, 1),
+    "vec2": (2, 2),
+    "vec3": (3, 4),
+    "vec4": (4, 4),
+}
+
+
+class UniformBlock:
+    """ Uniforms shared by many draws, packed with the std140 layout into one GPUUniformBuf.
+
+    Values are only uploaded to the gpu when they change, so a block updated at the start
+    of each frame costs one upload per frame however many shaders read it.
+    Shaders read the block through a GPUShaderCreateInfo declared with declare,
+    and wrappers attach it with GPUShader.bind_block.
+
+    Args:
+        type_name(str): glsl struct name
+        fields(List[Tuple[str, str]]): field name and glsl type, one of float, int, vec2, vec3, vec4
+        name(str): default instance name of the block in shaders
+        defaults(Dict[str, Any]): initial field values, fields default to zero
+
+    Properties:
+        version(int): incremented every time a value changes
+        uploads(int): number of uploads made to the gpu
+
+    Usage:
+        block = UniformBlock("Globals", [("viewport_size", "vec2"), ("opacity", "float")], name="globals")
+        block.update(viewport_size=(1920, 1080), opacity=1.0)
+        shader.bind_block("globals", block)
+    """
+    def __init__(self, type_name:str, fields:_ext.typing.Sequence[_ext.typing.Tuple[str, str]], name:str="block",
+                 defaults:_ext.typing.Optional[_ext.typing.Dict[str, _ext.typing.Any]]=None):
+        self.type_name = type_name
+        self.name = name
+        self.fields = tuple(fields)
+        self.version = 0
+        self.uploads = 0
+        self._offsets = {}
+        offset = 0
+        for field, glsl_type in self.fields:
+            if glsl_type not in _LAYOUT:
+                raise ValueError(f"Unsupported uniform block type {glsl_type} for {field}")
+            components, alignment = _LAYOUT[glsl_type]
+            offset = -(-offset // alignment) * alignment
+            self._offsets[field] = (offset, components, glsl_type == "int")
+            offset += components
+        # Blocks are sized in multiples of vec4
+        self._size = max(-(-offset // 4) * 4, 4)
+        self._data = None
+        self._buffer = None
+        self._dirty = True
+        self._defaults = dict(defaults or {})
+
+    @property
+    def data(self)->_ext.np.ndarray:
+        """ Packed float32 contents of the block """
+        if self._data is None:
+            self._data = _ext.np.zeros(self._size, dtype=_ext.np.float32)
+            for field, value in self._defaults.items():
+                self._write(self._data, field, value)
+        return self._data
+
+    def typedef(self)->str:
+        """ glsl struct source for GPUShaderCreateInfo.typedef_source
+
+        Returns:
+            str
+        """
+        lines = "".join(f"  {glsl_type} {field};\n" for field, glsl_type in self.fields)
+        # std140 pads the struct to a vec4, declare the padding so both sides agree
+        used = max(offset + components for offset, components, _ in self._offsets.values()) if self._offsets else 0
+        padding = "".join(f"  float _pad{index};\n" for index in range(self._size - used))
+        return f"struct {self.type_name} {{\n{lines}{padding}}};\n"
+
+    def declare(self, info:_ext.gpu.types.GPUShaderCreateInfo, slot:int=0, name:_ext.typing.Optional[str]=None):
+        """ Declare this block on a shader create info.
+        Only one typedef_source can be set per create info, combine typedef() sources when using several blocks.
+
+        Args:
+            info (gpu.types.GPUShaderCreateInfo): shader being declared
+            slot (int): uniform buffer binding slot
+            name (str, optional): instance name in the shader, defaults to self.name
+        """
+        info.typedef_source(self.typedef())
+        info.uniform_buf(slot, self.type_name, name or self.name)
+
+    def update(self, **values)->bool:
+        """ Set field values, the block is only uploaded again if a value changed
+
+        Returns:
+            bool: True if anything changed
+        """
+        data = self.data
+        changed = False
+        for field, value in values.items():
+            changed = self._write(data, field, value) or changed
+        if changed:
+            self.version += 1
+            self._dirty = True
+        return changed
+
+    def _write(self, data:_ext.np.ndarray, field:str, value)->bool:
+        offset, components, is_int = self._offsets[field]
+        target = data[offset:offset + components]
+        if is_int:
+            target = target.view(_ext.np.int32)
+        if components == 1:
+            value = (value,)
+        if _ext.np.array_equal(target, value):
+            return False
+        target[:] = value
+        return True
+
+    def get(self, field:str):
+        """ Current value of a field """
+        offset, components, is_int = self._offsets[field]
+        value = self.data[offset:offset + components]
+        if is_int:
+            value = value.view(_ext.np.int32)
+        return value[0].item() if components == 1 else tuple(value.tolist())
+
+    def buffer(self)->_ext.gpu.types.GPUUniformBuf:
+        """ The gpu buffer, uploading pending changes first
+
+        Returns:
+            gpu.types.GPUUniformBuf
+        """
+        if self._buffer is None:
+            self._buffer = _ext.gpu.types.GPUUniformBuf(self.data.tobytes())
+            self._dirty = False
+            self.uploads += 1
+        elif self._dirty:
+            self._buffer.update(self.data.tobytes())
+            self._dirty = False
+            self.uploads += 1
+        return self._buffer
+
+    def free(self):
+        """ Release the gpu buffer, it is created again on next use """
+        self._buffer = None
+        self._dirty = True
+
+    def stats(self)->_ext.typing.Dict[str, int]:
+        """ Counters for this block
+
+        Returns:
+            Dict[str, int]
+        """
+        return {"block_uploads": self.uploads}
+
+
+# Values most HUD shaders need, updated by GPUFrame when given a viewport
+FRAME_UNIFORMS = UniformBlock(
+    "FrameGlobals",
+    (("viewport_size", "vec2"), ("dpi_scale", "float"), ("opacity", "float")),
+    name="frame",
+    defaults={"dpi_scale": 1.0, "opacity": 1.0})
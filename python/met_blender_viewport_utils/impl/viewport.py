@@ -1,18 +1,254 @@
 # copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+from __future__ import annotations
 class _ext:
     """ External Dependencies """
+    from .lazy import lazy_module
     import typing
-    import bpy
-    from bpy_extras import view3d_utils
-    import gpu
+    np = lazy_module("numpy")
+    bpy = lazy_module("bpy")
+    view3d_utils = lazy_module("bpy_extras.view3d_utils")
+    gpu = lazy_module("gpu")
     from met_viewport_utils.interfaces import IViewport
     from met_viewport_utils.shape.rect import Rect
     from met_viewport_utils.algorithm import types
-    from mathutils import Vector
+    mathutils = lazy_module("mathutils")
+    from .cache import LRUCache
+    from .regions import region_key, view_signature
+
+class ViewSnapshot:
+    """ NumPy copy of a 3D region's view state for projecting many points at once
+
+    Args:
+        region(bpy.types.Region): region to project into
+        region_3d(bpy.types.RegionView3D): view of the region
+
+    Properties:
+        width(int): region width
+        height(int): region height
+        is_perspective(bool): True for perspective and camera views
+        perspective_matrix(np.ndarray): 4x4 world to clip matrix
+        perspective_inverse(np.ndarray): 4x4 clip to world matrix
+        view_inverse(np.ndarray): 4x4 view to world matrix
+        is_camera(bool): True when looking through the camera
+        frustum_planes(np.ndarray): (6, 4) view frustum planes for culling
+        signature(Hashable): view_signature of the region when the snapshot was taken
+    """
+    def __init__(self, region:_ext.bpy.types.Region, region_3d:_ext.bpy.types.RegionView3D):
+        self.width = region.width
+        self.height = region.height
+        self.is_perspective = region_3d.is_perspective
+        self.is_camera = region_3d.view_perspective == "CAMERA"
+        self.perspective_matrix = _ext.np.array(region_3d.perspective_matrix, dtype=_ext.np.float64)
+        self.perspective_inverse = _ext.np.linalg.inv(self.perspective_matrix)
+        self.view_inverse = _ext.np.linalg.inv(_ext.np.array(region_3d.view_matrix, dtype=_ext.np.float64))
+        self._frustum_planes = None
+        self.signature = _ext.view_signature(region, region_3d)
+
+    def _ndc(self, screen_positions:_ext.np.ndarray)->_ext.typing.Tuple[_ext.np.ndarray, _ext.np.ndarray]:
+        return (2.0 * screen_positions[:, 0] / self.width - 1.0,
+                2.0 * screen_positions[:, 1] / self.height - 1.0)
+
+    def world_to_screen(self, world_positions:_ext.np.ndarray)->_ext.np.ndarray:
+        """ Project (N, 3) world positions to (N, 2) region positions.
+        Points behind the camera are NaN, matching view3d_utils returning None.
+        """
+        points = _ext.np.asarray(world_positions, dtype=_ext.np.float64).reshape(-1, 3)
+        clip = points @ self.perspective_matrix[:3, :3].T + self.perspective_matrix[:3, 3]
+        w = points @ self.perspective_matrix[3, :3] + self.perspective_matrix[3, 3]
+        result = _ext.np.full((len(points), 2), _ext.np.nan, dtype=_ext.np.float64)
+        visible = w > 0.0
+        half_width, half_height = self.width / 2.0, self.height / 2.0
+        result[visible, 0] = half_width + half_width * (clip[visible, 0] / w[visible])
+        result[visible, 1] = half_height + half_height * (clip[visible, 1] / w[visible])
+        return result
+
+    def screen_to_vector(self, screen_positions:_ext.np.ndarray)->_ext.np.ndarray:
+        """ Normalized (N, 3) view directions through (N, 2) region positions """
+        screen = _ext.np.asarray(screen_positions, dtype=_ext.np.float64).reshape(-1, 2)
+        if not self.is_perspective:
+            direction = -self.view_inverse[:3, 2]
+            direction = direction / _ext.np.linalg.norm(direction)
+            return _ext.np.broadcast_to(direction, (len(screen), 3)).copy()
+        x, y = self._ndc(screen)
+        out = _ext.np.stack((x, y, _ext.np.full_like(x, -0.5)), axis=1)
+        inverse = self.perspective_inverse
+        w = out @ inverse[3, :3] + inverse[3, 3]
+        vectors = (out @ inverse[:3, :3].T + inverse[:3, 3]) / w[:, None] - self.view_inverse[:3, 3]
+        return vectors / _ext.np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def screen_to_origin(self, screen_positions:_ext.np.ndarray)->_ext.np.ndarray:
+        """ (N, 3) ray origins for (N, 2) region positions """
+        screen = _ext.np.asarray(screen_positions, dtype=_ext.np.float64).reshape(-1, 2)
+        if self.is_perspective:
+            return _ext.np.broadcast_to(self.view_inverse[:3, 3], (len(screen), 3)).copy()
+        x, y = self._ndc(screen)
+        inverse = self.perspective_inverse
+        origins = inverse[:3, 0] * x[:, None] + inverse[:3, 1] * y[:, None] + inverse[:3, 3]
+        if not self.is_camera:
+            # Scaled to the far clip already
+            origins = origins - inverse[:3, 2]
+        return origins
+
+    def screen_to_world(self, screen_positions:_ext.np.ndarray, depth_positions:_ext.np.ndarray)->_ext.np.ndarray:
+        """ (N, 3) positions under (N, 2) region positions at the depth of (N, 3) or (3,) depth positions """
+        screen = _ext.np.asarray(screen_positions, dtype=_ext.np.float64).reshape(-1, 2)
+        depth = _ext.np.broadcast_to(
+            _ext.np.asarray(depth_positions, dtype=_ext.np.float64), (len(screen), 3))
+        vectors = self.screen_to_vector(screen)
+        origins = self.screen_to_origin(screen)
+        if self.is_perspective:
+            # Intersect with the plane through the depth point facing the view
+            normal = self.view_inverse[:3, 2]
+            denominator = vectors @ normal
+            with _ext.np.errstate(divide="ignore", invalid="ignore"):
+                factor = ((depth - origins) @ normal) / denominator
+            return origins + vectors * factor[:, None]
+        # Closest point on the ray to the depth point
+        factor = _ext.np.einsum("ij,ij->i", depth - origins, vectors)
+        return origins + vectors * factor[:, None]
+
+    @property
+    def frustum_planes(self)->_ext.np.ndarray:
+        """ (6, 4) normalized left, right, bottom, top, near and far planes, normals point inwards """
+        planes = self._frustum_planes
+        if planes is None:
+            matrix = self.perspective_matrix
+            planes = _ext.np.stack((
+                matrix[3] + matrix[0], matrix[3] - matrix[0],
+                matrix[3] + matrix[1], matrix[3] - matrix[1],
+                matrix[3] + matrix[2], matrix[3] - matrix[2]))
+            planes /= _ext.np.linalg.norm(planes[:, :3], axis=1)[:, None]
+            self._frustum_planes = planes
+        return planes
+
+    def spheres_visible(self, centers:_ext.np.ndarray, radii:_ext.np.ndarray)->_ext.np.ndarray:
+        """ (N,) True for (N, 3) world bounding spheres that are at least partly inside the view """
+        centers = _ext.np.asarray(centers, dtype=_ext.np.float64).reshape(-1, 3)
+        radii = _ext.np.broadcast_to(_ext.np.asarray(radii, dtype=_ext.np.float64), (len(centers),))
+        planes = self.frustum_planes
+        distances = centers @ planes[:, :3].T + planes[:, 3]
+        return _ext.np.all(distances >= -radii[:, None], axis=1)
+
+    def boxes_visible(self, minimums:_ext.np.ndarray, maximums:_ext.np.ndarray)->_ext.np.ndarray:
+        """ (N,) True for world axis aligned boxes that are at least partly inside the view.
+        Boxes crossing a frustum corner may be reported visible, they are never wrongly culled.
+        """
+        minimums = _ext.np.asarray(minimums, dtype=_ext.np.float64).reshape(-1, 3)
+        maximums = _ext.np.asarray(maximums, dtype=_ext.np.float64).reshape(-1, 3)
+        planes = self.frustum_planes
+        # The corner furthest along each plane normal decides if the box is fully outside it
+        positive = planes[:, :3] >= 0.0
+        corners = _ext.np.where(positive[None, :, :], maximums[:, None, :], minimums[:, None, :])
+        distances = _ext.np.einsum("npk,pk->np", corners, planes[:, :3]) + planes[:, 3]
+        return _ext.np.all(distances >= 0.0, axis=1)
+
+
+# Latest snapshot of each region, reused by new viewports until that region's view changes
+SNAPSHOT_CACHE = _ext.LRUCache(8)
+
 
 class BlenderViewport(_ext.IViewport):
     def __init__(self, context:_ext.bpy.types.Context):
         self._context = context
+        self._snapshot = None
+
+    def update(self, context:_ext.bpy.types.Context):
+        """ Reuse this viewport for a new event or draw, dropping cached view state
+
+        Args:
+            context (bpy.types.Context): current context
+        """
+        self._context = context
+        self._snapshot = None
+
+    def region_key(self)->_ext.typing.Hashable:
+        """ Key of the region this viewport draws in, caches partitioned by region use it
+
+        Returns:
+            Hashable
+        """
+        return _ext.region_key(self._context.region)
+
+    def view_snapshot(self, refresh:bool=False)->ViewSnapshot:
+        """ Cached NumPy snapshot of the region view, taken on first use.
+        Snapshots are shared per region through SNAPSHOT_CACHE and only taken again when
+        the region's size or view matrix changed, so alternating regions keep their own.
+
+        Args:
+            refresh (bool): If true, take a new snapshot
+
+        Returns:
+            ViewSnapshot
+        """
+        if self._snapshot is None or refresh:
+            region = self._context.region
+            region_3d = self._context.space_data.region_3d
+            key = _ext.region_key(region)
+            snapshot = None if refresh else SNAPSHOT_CACHE.get(key)
+            if snapshot is None or snapshot.signature != _ext.view_signature(region, region_3d):
+                snapshot = ViewSnapshot(region, region_3d)
+                SNAPSHOT_CACHE.put(key, snapshot)
+            self._snapshot = snapshot
+        return self._snapshot
+
+    def spheres_in_view(self, centers:_ext.np.ndarray, radii:_ext.np.ndarray)->_ext.np.ndarray:
+        """ Frustum test many world bounding spheres in one pass
+
+        Args:
+            centers (np.ndarray): (N, 3) world centers
+            radii (np.ndarray): (N,) radii, or one radius for all
+
+        Returns:
+            (N,) True where the sphere is at least partly in view
+        """
+        return self.view_snapshot().spheres_visible(centers, radii)
+
+    def boxes_in_view(self, minimums:_ext.np.ndarray, maximums:_ext.np.ndarray)->_ext.np.ndarray:
+        """ Frustum test many world axis aligned boxes in one pass
+
+        Args:
+            minimums (np.ndarray): (N, 3) lower corners
+            maximums (np.ndarray): (N, 3) upper corners
+
+        Returns:
+            (N,) True where the box is at least partly in view
+        """
+        return self.view_snapshot().boxes_visible(minimums, maximums)
+
+    def world_to_screen_array(self, world_positions:_ext.np.ndarray)->_ext.np.ndarray:
+        """ Project many world positions in one pass
+
+        Args:
+            world_positions (np.ndarray): (N, 3) world positions
+
+        Returns:
+            (N, 2) screen positions, NaN for points behind the camera
+        """
+        return self.view_snapshot().world_to_screen(world_positions)
+
+    def screen_to_world_array(self, screen_positions:_ext.np.ndarray, depth_positions:_ext.np.ndarray)->_ext.np.ndarray:
+        """ Unproject many screen positions in one pass
+
+        Args:
+            screen_positions (np.ndarray): (N, 2) screen positions
+            depth_positions (np.ndarray): (N, 3) or (3,) positions in space to match depth
+
+        Returns:
+            (N, 3) world positions
+        """
+        return self.view_snapshot().screen_to_world(screen_positions, depth_positions)
+
+    def screen_to_ray_array(self, screen_positions:_ext.np.ndarray)->_ext.typing.Tuple[_ext.np.ndarray, _ext.np.ndarray]:
+        """ Rays through many screen positions in one pass
+
+        Args:
+            screen_positions (np.ndarray): (N, 2) screen positions
+
+        Returns:
+            (N, 3) origins, (N, 3) normalized directions
+        """
+        snapshot = self.view_snapshot()
+        return snapshot.screen_to_origin(screen_positions), snapshot.screen_to_vector(screen_positions)
 
     def rect(self)->_ext.Rect:
         """Viewport rect, note that this may sometimes be the window rect depending on what context is passed
@@ -39,7 +275,7 @@ class BlenderViewport(_ext.IViewport):
         region = self._context.region
         region3D = self._context.space_data.region_3d
         view_location = _ext.view3d_utils.region_2d_to_location_3d(
-            region, region3D, _ext.screen_position(screen_position), _ext.Vector(depth_point))
+            region, region3D, _ext.mathutils.Vector(screen_position), _ext.mathutils.Vector(depth_point))
         return _ext.types.as_vector3f(view_location)
     
     def screen_to_ray(self, screen_position:_ext.types.Vector2fCompat)->_ext.typing.Tuple[_ext.types.Vector3f]:
@@ -54,8 +290,8 @@ class BlenderViewport(_ext.IViewport):
         screen_position = _ext.types.as_vector2f(screen_position)
         region = self._context.region
         region3D = self._context.space_data.region_3d
-        origin = _ext.view3d_utils.region_2d_to_origin_3d(region, region3D, _ext.Vector(screen_position))
-        ray = _ext.view3d_utils.region_2d_to_vector_3d(region, region3D, _ext.Vector(screen_position))
+        origin = _ext.view3d_utils.region_2d_to_origin_3d(region, region3D, _ext.mathutils.Vector(screen_position))
+        ray = _ext.view3d_utils.region_2d_to_vector_3d(region, region3D, _ext.mathutils.Vector(screen_position))
         return (origin, ray)
     
     def world_to_screen(self, world_position:_ext.types.Vector3fCompat)->_ext.types.Vector2f:
@@ -70,6 +306,6 @@ class BlenderViewport(_ext.IViewport):
         world_position = _ext.types.as_vector3f(world_position)
         region = self._context.region
         region3D = self._context.space_data.region_3d
-        point = _ext.Vector(world_position)
+        point = _ext.mathutils.Vector(world_position)
         view_location = _ext.view3d_utils.location_3d_to_region_2d(region, region3D, point)
         return _ext.types.as_vector2f(view_location)
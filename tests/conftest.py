@@ -0,0 +1,8 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+"""Unit tests of the pure python parts of the draw path, these run without blender"""
+import os
+import sys
+
+_PYTHON_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python")
+if os.path.isdir(_PYTHON_ROOT):
+    sys.path.insert(0, _PYTHON_ROOT)
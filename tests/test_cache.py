@@ -0,0 +1,56 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+import numpy as np
+
+from met_blender_viewport_utils.impl.cache import LRUCache, digest, freeze
+
+
+def test_lru_cache_evicts_least_recently_used():
+    evicted = []
+    cache = LRUCache(2, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert evicted == [("b", 2)]
+    assert "b" not in cache
+    assert [key for key, _ in cache.items()] == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_cache_counts_hits_and_misses():
+    cache = LRUCache(4)
+    cache.put("a", 1)
+    cache.get("a")
+    assert cache.get("missing", "default") == "default"
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.reset_stats()
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_lru_cache_discard_if_is_not_an_eviction():
+    cache = LRUCache(4)
+    for key in range(4):
+        cache.put(key, key)
+    cache.discard_if(lambda key: key % 2)
+    assert [key for key, _ in cache.items()] == [0, 2]
+    assert cache.evictions == 0
+
+
+def test_freeze():
+    assert freeze(None) is None
+    assert freeze("text") == "text"
+    assert freeze(np.array([[1, 2], [3, 4]])) == (1.0, 2.0, 3.0, 4.0)
+    assert freeze([0.5, 1]) == freeze(np.array([0.5, 1.0]))
+    marker = object()
+    assert freeze(marker) == ("id", id(marker))
+
+
+def test_digest_follows_content():
+    points = np.arange(6, dtype=np.float32).reshape(3, 2)
+    assert digest({"pos": points}) == digest({"pos": points.copy()})
+    changed = points.copy()
+    changed[1, 0] = 10.0
+    assert digest({"pos": points}) != digest({"pos": changed})
+    # The same bytes with another shape or dtype are different vertex data
+    assert digest(points) != digest(points.reshape(2, 3))
+    assert digest(points) != digest(points.view(np.int32))
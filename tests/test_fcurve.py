@@ -0,0 +1,90 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+import numpy as np
+import pytest
+
+from met_blender_viewport_utils.impl.fcurve import FCurveSampler
+
+_INTERPOLATION = {"CONSTANT": 0, "LINEAR": 1, "BEZIER": 2}
+
+
+class _KeyframePoints:
+    """ Stand in for bpy_prop_collection of keyframes, only what the sampler reads """
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def foreach_get(self, name, values):
+        if name == "interpolation":
+            values[:] = [_INTERPOLATION[key[name]] for key in self.keys]
+        else:
+            values[:] = np.ravel([key[name] for key in self.keys])
+
+
+class _FCurve:
+    def __init__(self, keys, extrapolation="CONSTANT"):
+        self.keyframe_points = _KeyframePoints(keys)
+        self.extrapolation = extrapolation
+        self.modifiers = []
+
+
+def _key(frame, value, interpolation="LINEAR", left=None, right=None):
+    return {"co": (frame, value),
+            "handle_left": left or (frame - 1.0, value),
+            "handle_right": right or (frame + 1.0, value),
+            "interpolation": interpolation}
+
+
+def test_linear_and_constant_segments():
+    curve = _FCurve([_key(0, 0.0), _key(10, 10.0, "CONSTANT"), _key(20, 0.0)])
+    values = FCurveSampler(curve).evaluate([0, 5, 10, 15, 19.9])
+    assert values.tolist() == pytest.approx([0.0, 5.0, 10.0, 10.0, 10.0])
+
+
+def test_bezier_with_aligned_handles_is_linear():
+    # Handles a third of the way along a straight segment keep the curve on that line
+    curve = _FCurve([_key(0, 0.0, "BEZIER", right=(10 / 3, 10 / 3)),
+                     _key(10, 10.0, left=(20 / 3, 20 / 3))])
+    frames = np.linspace(0.0, 10.0, 11)
+    assert FCurveSampler(curve).evaluate(frames) == pytest.approx(frames, abs=1e-5)
+
+
+def test_bezier_eases():
+    curve = _FCurve([_key(0, 0.0, "BEZIER", right=(5, 0.0)), _key(10, 10.0, left=(5, 10.0))])
+    values = FCurveSampler(curve).evaluate([0, 2.5, 5, 7.5, 10])
+    assert values[2] == pytest.approx(5.0)
+    assert values[1] < 2.5 and values[3] > 7.5
+    assert values[0] == pytest.approx(0.0) and values[4] == pytest.approx(10.0)
+
+
+def test_constant_extrapolation():
+    curve = _FCurve([_key(0, 1.0), _key(10, 2.0)])
+    assert FCurveSampler(curve).evaluate([-5, 15]).tolist() == [1.0, 2.0]
+
+
+def test_linear_extrapolation_follows_the_end_keys():
+    curve = _FCurve([_key(0, 0.0), _key(10, 10.0)], extrapolation="LINEAR")
+    assert FCurveSampler(curve).evaluate([-5, 15]).tolist() == pytest.approx([-5.0, 15.0])
+
+
+def test_linear_extrapolation_of_bezier_ends_follows_their_handles():
+    curve = _FCurve([_key(0, 0.0, "BEZIER", left=(-1, -2.0)), _key(10, 10.0, "BEZIER", right=(11, 10.0))],
+                    extrapolation="LINEAR")
+    assert FCurveSampler(curve).evaluate([-5, 15]).tolist() == pytest.approx([-10.0, 10.0])
+
+
+def test_linear_extrapolation_of_constant_ends_is_flat():
+    curve = _FCurve([_key(0, 0.0, "CONSTANT"), _key(10, 10.0, "CONSTANT")], extrapolation="LINEAR")
+    assert FCurveSampler(curve).evaluate([-5, 15]).tolist() == [0.0, 10.0]
+
+
+def test_refresh_reports_the_edited_span():
+    keys = [_key(0, 0.0), _key(10, 10.0), _key(20, 0.0), _key(30, 5.0)]
+    curve = _FCurve(keys)
+    sampler = FCurveSampler(curve)
+    assert sampler.refresh() is None
+    keys[1] = _key(12, 8.0)
+    assert sampler.refresh() == (0, 20)
+    keys[-1] = _key(30, 6.0)
+    assert sampler.refresh() == (-np.inf, np.inf)
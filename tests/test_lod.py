@@ -0,0 +1,37 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+import numpy as np
+
+from met_blender_viewport_utils.impl.lod import simplify_screen
+
+
+def test_short_lines_are_kept():
+    assert simplify_screen(np.zeros((2, 2))).tolist() == [0, 1]
+
+
+def test_straight_line_keeps_its_ends():
+    points = np.stack([np.linspace(0.0, 1000.0, 500), np.zeros(500)], axis=1)
+    assert simplify_screen(points).tolist() == [0, 499]
+
+
+def test_corners_are_kept():
+    points = np.array([[0, 0], [50, 0], [100, 0], [100, 50], [100, 100]], dtype=np.float64)
+    assert simplify_screen(points).tolist() == [0, 2, 4]
+
+
+def test_deviation_stays_within_tolerance():
+    x = np.linspace(0.0, 2000.0, 5000)
+    points = np.stack([x, 100.0 * np.sin(x / 50.0)], axis=1)
+    tolerance = 2.0
+    kept = simplify_screen(points, tolerance=tolerance, chunk_size=256)
+    assert kept[0] == 0 and kept[-1] == len(points) - 1
+    assert len(kept) < len(points) // 4
+    # Every dropped point lies close to the line drawn between the points kept either side of it
+    simplified = np.interp(x, x[kept], points[kept, 1])
+    assert np.abs(simplified - points[:, 1]).max() <= tolerance * 2.0
+
+
+def test_unprojected_points_break_the_line():
+    points = np.stack([np.arange(10.0), np.zeros(10)], axis=1)
+    points[4:6] = np.nan
+    kept = simplify_screen(points).tolist()
+    assert kept == [0, 3, 4, 5, 6, 9]
@@ -0,0 +1,59 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+from met_blender_viewport_utils.impl.picking import HudPickIndex
+
+
+class _Rect:
+    def __init__(self, left, bottom, width, height):
+        self._left = left
+        self._bottom = bottom
+        self.width = width
+        self.height = height
+        self.size = (width, height)
+
+    def left(self):
+        return self._left
+
+    def bottom(self):
+        return self._bottom
+
+class _Viewport:
+    def __init__(self, width=800, height=600):
+        self._rect = _Rect(0, 0, width, height)
+
+    def rect(self):
+        return self._rect
+
+class _Item:
+    def __init__(self, *rects):
+        self.rects = list(rects)
+
+    def pick_rects(self, viewport):
+        return self.rects
+
+def test_query_returns_topmost_first():
+    below = _Item(_Rect(0, 0, 100, 100))
+    above = _Item(_Rect(50, 50, 100, 100))
+    index = HudPickIndex(cell_size=64)
+    index.update(_Viewport(), [below, above])
+    assert index.query((75, 75)) == [above, below]
+    assert index.query((10, 10)) == [below]
+    assert index.query((500, 500)) == []
+
+def test_changed_items_are_reinserted():
+    item = _Item(_Rect(0, 0, 10, 10))
+    other = _Item(_Rect(300, 300, 10, 10))
+    viewport = _Viewport()
+    index = HudPickIndex(cell_size=64)
+    index.update(viewport, [item, other])
+    item.rects = [_Rect(200, 200, 10, 10)]
+    index.update(viewport, [item, other], changed=[item])
+    assert (index.rebuilds, index.reinserts) == (1, 1)
+    assert index.query((5, 5)) == []
+    assert index.query((205, 205)) == [item]
+
+def test_resizing_the_region_rebuilds():
+    item = _Item(_Rect(0, 0, 10, 10))
+    index = HudPickIndex()
+    index.update(_Viewport(), [item])
+    index.update(_Viewport(1024, 768), [item], changed=[])
+    assert index.rebuilds == 2
@@ -0,0 +1,48 @@
+# copyright (c) 2024 Alex Telford, http://minimaleffort.tech
+import numpy as np
+import pytest
+
+from met_blender_viewport_utils.impl.uniforms import UniformBlock
+
+
+def test_std140_offsets():
+    block = UniformBlock("Globals", [
+        ("opacity", "float"),
+        ("size", "vec2"),
+        ("color", "vec3"),
+        ("mode", "int"),
+        ("tint", "vec4"),
+    ])
+    # vec2 aligns to 2 floats, vec3 and vec4 to 4 and an int packs into the vec3's spare float
+    offsets = {field: offset for field, (offset, _, _) in block._offsets.items()}
+    assert offsets == {"opacity": 0, "size": 2, "color": 4, "mode": 7, "tint": 8}
+    assert block.data.shape == (12,)
+
+
+def test_size_is_padded_to_a_vec4():
+    block = UniformBlock("Small", [("size", "vec2"), ("opacity", "float")])
+    assert block.data.shape == (4,)
+    assert block.typedef() == (
+        "struct Small {\n"
+        "  vec2 size;\n"
+        "  float opacity;\n"
+        "  float _pad0;\n"
+        "};\n")
+
+
+def test_update_only_reports_changes():
+    block = UniformBlock("Globals", [("size", "vec2"), ("mode", "int")], defaults={"mode": 2})
+    assert block.get("mode") == 2
+    assert block.update(size=(1920, 1080))
+    version = block.version
+    assert not block.update(size=(1920, 1080), mode=2)
+    assert block.version == version
+    assert block.get("size") == (1920.0, 1080.0)
+    # Ints keep their bit pattern in the float32 buffer
+    assert block.update(mode=7)
+    assert block.data[2:3].view(np.int32)[0] == 7
+
+
+def test_unsupported_types_raise():
+    with pytest.raises(ValueError):
+        UniformBlock("Bad", [("matrix", "mat4")])